@@ -18,6 +18,7 @@ setup(
     license="MIT",
     packages=find_packages(),
     install_requires=[],
+    extras_require={"numpy": ["numpy"]},
     keywords=["graph", "svg", "base64", "svg simple graph"],
     classifiers=[
         "Development Status :: 3 - Alpha",
@@ -1,4 +1,10 @@
+from .base import RenderContext
 from .ribbon import RibbonGraph
 from .categorical import CategoricalGraph
 from .bubble_and_arrow import BubbleAndArrowGraph
 from .toggle import ToggleGraph
+from .grid import GraphGrid
+from .layout import RingLayout
+from .layout import ForceDirectedLayout
+from .layout import PackLayout
+from .series import RingSeries
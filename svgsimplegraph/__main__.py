@@ -0,0 +1,207 @@
+"""
+Command line entry point. Renders a file of graph specs, one JSON spec per line,
+into a directory:
+
+    python -m svgsimplegraph render specs.jsonl --out DIR --jobs 8 --format svgz
+
+A spec line may carry a "name" used for its output file; otherwise files are
+named after their line number. A line whose file name is already taken by an
+earlier line fails instead of overwriting it. Use - to read specs from stdin.
+"""
+
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import wait
+from concurrent.futures.process import BrokenProcessPool
+
+from .spec import render_spec
+from .utils import to_snake_case
+
+EXTENSIONS = {"svg": ".svg", "svgz": ".svgz", "b64": ".txt"}
+
+
+def render_batch(batch, out, output_format):
+    """
+    Render (line_number, name, spec) triples into out. Returns the failures as
+    (line_number, message) pairs and the number of bytes written.
+    """
+    failures = []
+    written = 0
+    for line_number, name, spec in batch:
+        try:
+            data = render_spec(spec, output_format)
+            with open(os.path.join(out, name + EXTENSIONS[output_format]), "wb") as f:
+                f.write(data)
+            written += len(data)
+        except Exception as e:
+            failures.append((line_number, repr(e)))
+    return failures, written
+
+
+def read_batches(lines, batch_size):
+    numbered = (
+        (line_number, line)
+        for line_number, line in enumerate(lines, start=1)
+        if line.strip()
+    )
+    while True:
+        batch = list(itertools.islice(numbered, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def name_batch(batch, names):
+    """
+    Parse the (line_number, line) pairs of a batch and pick their file names.
+    names maps the names taken so far to their line numbers. Returns the
+    (line_number, name, spec) triples to render and the failures.
+    """
+    specs = []
+    failures = []
+    for line_number, line in batch:
+        try:
+            spec = json.loads(line)
+            name = spec.get("name")
+        except Exception as e:
+            failures.append((line_number, repr(e)))
+            continue
+        # Names with nothing to keep, like "..", fall back to the line number
+        name = (to_snake_case(str(name)) if name else "") or f"{line_number:08d}"
+        if name in names:
+            failures.append(
+                (line_number, f"{name} is already the name of line {names[name]}")
+            )
+            continue
+        names[name] = line_number
+        specs.append((line_number, name, spec))
+    return specs, failures
+
+
+def render_file(lines, out, jobs=None, output_format="svg", batch_size=64, log=None):
+    """
+    Render an iterable of spec lines on a pool of jobs processes. Lines are
+    read lazily and at most two batches per process are in flight, so memory
+    only grows with the output names kept to catch collisions. If a process
+    dies, the rows of its batch are retried one at a time on a new pool, so
+    only the row that killed it fails. Returns a dict of statistics.
+    """
+    log = log or sys.stderr
+    os.makedirs(out, exist_ok=True)
+    jobs = jobs or os.cpu_count() or 1
+    max_in_flight = 2 * jobs
+    stats = {"rendered": 0, "failed": 0, "bytes": 0}
+    start = time.perf_counter()
+
+    names = {}
+    batches = {}
+    lost = []
+
+    def record(num_specs, failures, written):
+        stats["rendered"] += num_specs - len(failures)
+        stats["failed"] += len(failures)
+        stats["bytes"] += written
+        for line_number, message in failures:
+            print(f"line {line_number}: {message}", file=log)
+
+    def collect(done):
+        for future in done:
+            batch = batches.pop(future)
+            try:
+                record(len(batch), *future.result())
+            except BrokenProcessPool:
+                lost.extend(batch)
+
+    def retry_lost(executor):
+        # A pool with a dead process can't be used anymore
+        executor.shutdown()
+        executor = ProcessPoolExecutor(max_workers=jobs)
+        for row in lost:
+            try:
+                record(
+                    1,
+                    *executor.submit(render_batch, [row], out, output_format).result(),
+                )
+            except BrokenProcessPool as e:
+                record(1, [(row[0], repr(e))], 0)
+                executor.shutdown()
+                executor = ProcessPoolExecutor(max_workers=jobs)
+        lost.clear()
+        return executor
+
+    executor = ProcessPoolExecutor(max_workers=jobs)
+    try:
+        in_flight = set()
+        for batch in read_batches(lines, batch_size):
+            specs, failures = name_batch(batch, names)
+            record(len(failures), failures, 0)
+            if len(in_flight) >= max_in_flight:
+                # Wait for a batch to finish before reading any further
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(done)
+            if lost:
+                collect(wait(in_flight).done)
+                in_flight = set()
+                executor = retry_lost(executor)
+            try:
+                future = executor.submit(render_batch, specs, out, output_format)
+            except BrokenProcessPool:
+                lost.extend(specs)
+                continue
+            batches[future] = specs
+            in_flight.add(future)
+        collect(wait(in_flight).done)
+        if lost:
+            executor = retry_lost(executor)
+    finally:
+        executor.shutdown()
+
+    stats["seconds"] = time.perf_counter() - start
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m svgsimplegraph")
+    commands = parser.add_subparsers(dest="command", required=True)
+    render = commands.add_parser(
+        "render", help="render a JSONL file of graph specs into a directory"
+    )
+    render.add_argument("specs", help="JSONL file with one graph spec per line")
+    render.add_argument("--out", required=True, help="output directory")
+    render.add_argument(
+        "--jobs", type=int, default=None, help="render processes (default: CPUs)"
+    )
+    render.add_argument("--format", choices=list(EXTENSIONS), default="svg")
+    render.add_argument(
+        "--batch-size", type=int, default=64, help="specs sent to a process at once"
+    )
+    args = parser.parse_args(argv)
+
+    if args.specs == "-":
+        stats = render_file(
+            sys.stdin, args.out, args.jobs, args.format, args.batch_size
+        )
+    else:
+        with open(args.specs, "r") as lines:
+            stats = render_file(
+                lines, args.out, args.jobs, args.format, args.batch_size
+            )
+
+    rate = stats["rendered"] / stats["seconds"] if stats["seconds"] else 0
+    print(
+        f"Rendered {stats['rendered']} graphs ({stats['failed']} failed, "
+        + f"{stats['bytes']} bytes) in {stats['seconds']:.2f}s, "
+        + f"{rate:.0f} graphs/s",
+        file=sys.stderr,
+    )
+    return 1 if stats["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
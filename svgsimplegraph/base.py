@@ -1,13 +1,199 @@
-import base64
+import asyncio
+import functools
 import urllib.request
 import json
 import time
 import math
+import os
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
 
 from .utils import DEFAULT_COLOR_PALETTE
 from .utils import is_dark
 from .utils import estimate_text_dimensions
 from .utils import human_readable_number
+from .utils import hoist_styles
+from .utils import svg_to_base64_src
+from .utils import is_packed_array
+from .utils import is_packed_sparse
+from .utils import unpack_array
+from .series import SparseSeries
+
+# Bumped whenever to_spec output changes in a way older from_spec can't read
+SPEC_VERSION = 1
+
+# Spec keys holding lists of keyword arguments for a graph's add_ methods
+SPEC_METHODS = {
+    "series": "add_series",
+    "horizontal_lines": "add_horizontal_line",
+    "vertical_lines": "add_vertical_line",
+    "bubbles": "add_bubble",
+    "arrows": "add_arrow",
+}
+
+
+def check_spec(spec, graph_type):
+    # Specs come from outside the program, so they are checked with real
+    # exceptions rather than asserts, which python -O leaves out
+    if not isinstance(spec, dict):
+        raise ValueError("A graph spec must be a JSON object")
+    version = spec.get("version", SPEC_VERSION)
+    if not isinstance(version, int):
+        raise ValueError(f"Invalid spec version: {version!r}")
+    if version > SPEC_VERSION:
+        raise ValueError(
+            f"Spec version {version} is newer than supported ({SPEC_VERSION})"
+        )
+    if spec.get("type", graph_type) != graph_type:
+        raise ValueError(f"Expected a {graph_type} spec, got {spec.get('type')}")
+
+
+@functools.lru_cache(maxsize=None)
+def _default_instance(cls):
+    # Read only: options are compared against it, never changed
+    return cls()
+
+
+def spec_options(obj, names):
+    # The named attributes that differ from those of an object built with the
+    # constructor defaults, which the constructor may have resolved (such as
+    # paddings that fall back to padding)
+    defaults = _default_instance(type(obj))
+    return {
+        name: getattr(obj, name)
+        for name in names
+        if getattr(obj, name) != getattr(defaults, name)
+    }
+
+
+def unpack_value(value):
+    # Packed arrays become lists and packed sparse series SparseSeries
+    if is_packed_array(value):
+        return unpack_array(value)
+    if is_packed_sparse(value):
+        return SparseSeries(
+            unpack_array(value["indices"]),
+            unpack_array(value["values"]),
+            value["length"],
+        )
+    return value
+
+
+def spec_rows(entries):
+    """
+    Turn a spec list of keyword argument dicts, or a dict of equally long
+    columns, into keyword argument dicts with any packed arrays unpacked.
+    """
+    if isinstance(entries, dict):
+        columns = {key: unpack_value(value) for key, value in entries.items()}
+        return [dict(zip(columns, row)) for row in zip(*columns.values())]
+    return [
+        {key: unpack_value(value) for key, value in entry.items()} for entry in entries
+    ]
+
+
+# Renders running at once per event loop when render_async gets no semaphore
+MAX_CONCURRENT_RENDERS = os.cpu_count() or 1
+
+_render_semaphores = weakref.WeakKeyDictionary()
+_default_executor = None
+
+
+def _render_graph(graph):
+    # Module level so that process pools can pickle it
+    return graph.render()
+
+
+def _render_graph_spec(graph_class, spec):
+    return graph_class.from_spec(spec).render()
+
+
+def _spec_or_none(graph):
+    # Graphs with parts a spec can't describe are pickled whole instead
+    try:
+        return graph.to_spec()
+    except TypeError:
+        return None
+
+
+def _release_soon(loop, semaphore):
+    try:
+        loop.call_soon_threadsafe(semaphore.release)
+    except RuntimeError:
+        pass  # The loop is closed, nobody is waiting on the semaphore anymore
+
+
+async def render_in_executor(graph, executor=None, timeout=None, semaphore=None):
+    """
+    Render graph on executor without blocking the event loop. Without an
+    executor a shared thread pool is used; pass a ProcessPoolExecutor to render
+    on several cores. At most MAX_CONCURRENT_RENDERS renders run at once per
+    event loop unless a semaphore is given. The timeout covers waiting for a
+    semaphore slot and building the spec for a process pool as well as the
+    render. A render that is cancelled or times
+    out before it starts is dropped. One already running finishes in the
+    background and keeps its semaphore slot until it is done.
+    """
+    global _default_executor
+    loop = asyncio.get_running_loop()
+    if semaphore is None:
+        semaphore = _render_semaphores.get(loop)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(MAX_CONCURRENT_RENDERS)
+            _render_semaphores[loop] = semaphore
+    if executor is None:
+        if _default_executor is None:
+            _default_executor = ThreadPoolExecutor(thread_name_prefix="svgsimplegraph")
+        executor = _default_executor
+
+    deadline = None if timeout is None else loop.time() + timeout
+
+    def remaining():
+        return None if deadline is None else max(0, deadline - loop.time())
+
+    await asyncio.wait_for(semaphore.acquire(), timeout)
+    try:
+        spec = None
+        if isinstance(executor, ProcessPoolExecutor):
+            # Specs are much cheaper to send to another process than graphs,
+            # but building one copies every value, so it happens off the loop
+            spec = await asyncio.wait_for(
+                loop.run_in_executor(None, _spec_or_none, graph), remaining()
+            )
+        if spec is not None:
+            future = executor.submit(_render_graph_spec, type(graph), spec)
+        else:
+            future = executor.submit(_render_graph, graph)
+    except BaseException:
+        semaphore.release()
+        raise
+    future.add_done_callback(lambda _: _release_soon(loop, semaphore))
+    return await asyncio.wait_for(asyncio.wrap_future(future), remaining())
+
+
+class RenderContext:
+    """
+    Holds the scratch state of a single render: the elements and defs drawn so
+    far, the bounding box they cover and counters such as how many elements
+    were culled. A new context is created for every call to render(), so
+    graphs never store intermediate drawing state. sections maps the name of
+    a part of the drawing (such as "frame" or "legend") to the index in
+    svg_elements where it starts, for containers that reuse parts of it.
+    """
+
+    def __init__(self, width, height):
+        self.most_extreme_dimensions = {
+            "left": width,
+            "right": 0,
+            "top": height,
+            "bottom": 0,
+        }
+        self.defs = []
+        self.svg_elements = []
+        self.stats = {}
+        self.sections = {}
+        self.svg = None
 
 
 class BaseGraph:
@@ -16,6 +202,31 @@ class BaseGraph:
     other classes.
     """
 
+    # Constructor arguments stored under the same attribute name, in to_spec
+    spec_options = [
+        "width",
+        "height",
+        "y_top_padding",
+        "y_bottom_padding",
+        "x_left_padding",
+        "x_right_padding",
+        "colors",
+        "num_y_ticks",
+        "x_axis_label",
+        "primary_y_axis_label",
+        "secondary_y_axis_label",
+        "show_legend",
+        "rotate_x_labels",
+        "background_color",
+        "dark_mode",
+        "title",
+        "title_font_size",
+        "element_spacing",
+        "watermark",
+        "font_width_estimate_multiplier",
+        "css_classes",
+    ]
+
     def __init__(
         self,
         width=300,
@@ -41,6 +252,7 @@ class BaseGraph:
         element_spacing=None,
         watermark=None,
         font_width_estimate_multiplier=1,
+        css_classes=False,
     ):
         self.width = width
         self.height = height
@@ -67,11 +279,11 @@ class BaseGraph:
             self.dark_mode = False
         self.title = title
         self.title_font_size = title_font_size or 16
-        self.defs = []
-        self.svg_elements = []
         self.element_spacing = element_spacing or 10
         self.watermark = watermark
         self.font_width_estimate_multiplier = font_width_estimate_multiplier
+        # Move repeated presentation attributes into a <style> block
+        self.css_classes = css_classes
 
         # Use dark colors last if in dark mode and using default color palette
         if self.colors == DEFAULT_COLOR_PALETTE and self.dark_mode:
@@ -79,15 +291,9 @@ class BaseGraph:
 
         self.text_color = "#ffffff" if self.dark_mode else "#000000"
 
-        self.most_extreme_dimensions = {
-            "left": self.width,
-            "right": 0,
-            "top": self.height,
-            "bottom": 0,
-        }
-
     def _generate_text(
         self,
+        ctx,
         text,
         x,
         y,
@@ -167,42 +373,33 @@ class BaseGraph:
             top, bottom = min(ys), max(ys)
 
         # Update the most extreme dimensions
-        self.most_extreme_dimensions["left"] = min(
-            self.most_extreme_dimensions["left"], left
+        ctx.most_extreme_dimensions["left"] = min(
+            ctx.most_extreme_dimensions["left"], left
         )
-        self.most_extreme_dimensions["right"] = max(
-            self.most_extreme_dimensions["right"], right
+        ctx.most_extreme_dimensions["right"] = max(
+            ctx.most_extreme_dimensions["right"], right
         )
-        self.most_extreme_dimensions["top"] = min(
-            self.most_extreme_dimensions["top"], top
+        ctx.most_extreme_dimensions["top"] = min(
+            ctx.most_extreme_dimensions["top"], top
         )
-        self.most_extreme_dimensions["bottom"] = max(
-            self.most_extreme_dimensions["bottom"], bottom
+        ctx.most_extreme_dimensions["bottom"] = max(
+            ctx.most_extreme_dimensions["bottom"], bottom
         )
 
         return text_element
 
-    def _reset_graph(self):
-        self.most_extreme_dimensions = {
-            "left": self.width,
-            "right": 0,
-            "top": self.height,
-            "bottom": 0,
-        }
-        self.defs = []
-        self.svg_elements = []
-
-    def _generate_svg(self):
+    def _generate_svg(self, ctx):
         """
         Generate the SVG string from the styles and elements.
         """
         if self.title:
             title_x_position = self.width / 2
             title_y_position = (
-                min(0, self.most_extreme_dimensions["top"]) - self.element_spacing
+                min(0, ctx.most_extreme_dimensions["top"]) - self.element_spacing
             )
-            self.svg_elements.append(
+            ctx.svg_elements.append(
                 self._generate_text(
+                    ctx,
                     self.title,
                     title_x_position,
                     title_y_position,
@@ -213,22 +410,30 @@ class BaseGraph:
                 )
             )
 
+        return self._assemble_svg(ctx)
+
+    def _assemble_svg(self, ctx):
+        """
+        Wrap the defs and elements of a finished render in an <svg> tag, with
+        a viewBox around its most extreme dimensions plus this graph's padding,
+        and this graph's background, styles and watermark.
+        """
         viewbox_width = (
-            self.most_extreme_dimensions["right"]
-            - self.most_extreme_dimensions["left"]
+            ctx.most_extreme_dimensions["right"]
+            - ctx.most_extreme_dimensions["left"]
             + self.x_left_padding
             + self.x_right_padding
         )
 
         viewbox_height = (
-            self.most_extreme_dimensions["bottom"]
-            - self.most_extreme_dimensions["top"]
+            ctx.most_extreme_dimensions["bottom"]
+            - ctx.most_extreme_dimensions["top"]
             + self.y_top_padding
             + self.y_bottom_padding
         )
 
-        viewbox_left = self.most_extreme_dimensions["left"] - self.x_left_padding
-        viewbox_top = self.most_extreme_dimensions["top"] - self.y_top_padding
+        viewbox_left = ctx.most_extreme_dimensions["left"] - self.x_left_padding
+        viewbox_top = ctx.most_extreme_dimensions["top"] - self.y_top_padding
 
         viewbox_param = (
             f'viewBox="{viewbox_left} {viewbox_top} {viewbox_width} {viewbox_height}"'
@@ -241,17 +446,24 @@ class BaseGraph:
                 + f"rx='10' ry='10' fill='{self.background_color}' />"
             )
 
+        if self.css_classes:
+            elements, style = hoist_styles(ctx.defs + ctx.svg_elements)
+            ctx.defs = elements[: len(ctx.defs)]
+            ctx.svg_elements = elements[len(ctx.defs) :]
+            if style:
+                ctx.defs.append(style)
+
         if self.watermark:
             if not isinstance(self.watermark, str):
                 raise ValueError("Watermark must be a string.")
             if not (self.watermark.startswith("<") and self.watermark.endswith(">")):
                 raise ValueError("Watermark must be a valid SVG snippet.")
-            self.svg_elements.append(self.watermark)
+            ctx.svg_elements.append(self.watermark)
 
         defs_str = ""
-        if self.defs:
-            defs_str = "<defs>" + "\n".join(self.defs) + "</defs>"
-        svg_elements_str = "\n".join(self.svg_elements)
+        if ctx.defs:
+            defs_str = "<defs>" + "\n".join(ctx.defs) + "</defs>"
+        svg_elements_str = "\n".join(ctx.svg_elements)
         svg = (
             f"<svg xmlns='http://www.w3.org/2000/svg' width='{viewbox_width}' height='{viewbox_height}' {viewbox_param}>"
             + defs_str
@@ -261,15 +473,77 @@ class BaseGraph:
         )
         return svg
 
-    def render(self):
+    def _render(self, ctx):
         # Implement the specific rendering for this subclass
         pass
 
+    def render_context(self):
+        """
+        Render the graph into a fresh RenderContext and return it. The graph
+        itself is only read, so several threads can render it at once.
+        """
+        ctx = RenderContext(self.width, self.height)
+        self._render(ctx)
+        ctx.svg = self._generate_svg(ctx)
+        return ctx
+
+    def render(self):
+        return self.render_context().svg
+
+    def _spec_data(self):
+        # Implement the data part of the spec for this subclass
+        return {}
+
+    def to_spec(self):
+        """
+        Describe the graph as a JSON-compatible dict that from_spec turns back
+        into an equal graph. Numeric series are packed as base64 arrays, and
+        options left at their defaults are omitted, so equal graphs give equal
+        specs that can be used as cache keys (e.g. via json.dumps with
+        sort_keys=True). Render state such as warm-started layouts is not
+        included. Every value is copied into the spec, including those of
+        series memory-mapped from a file, so a graph of a large file gives an
+        equally large spec.
+        """
+        options = spec_options(self, self.spec_options)
+        if options.get("colors") == DEFAULT_COLOR_PALETTE:
+            del options["colors"]
+        spec = {
+            "version": SPEC_VERSION,
+            "type": type(self).__name__,
+            "options": options,
+        }
+        # Leave out empty lists to keep small graphs' specs small
+        spec.update((key, value) for key, value in self._spec_data().items() if value)
+        return spec
+
+    @classmethod
+    def _options_from_spec(cls, options):
+        return options
+
+    @classmethod
+    def from_spec(cls, spec):
+        check_spec(spec, cls.__name__)
+        graph = cls(**cls._options_from_spec(dict(spec.get("options", {}))))
+        if "x_labels" in spec:
+            graph.x_labels = list(spec["x_labels"])
+        for key, method in SPEC_METHODS.items():
+            if key not in spec:
+                continue
+            if not hasattr(graph, method):
+                raise ValueError(f"{cls.__name__} does not support {key}")
+            for kwargs in spec_rows(spec[key]):
+                getattr(graph, method)(**kwargs)
+        return graph
+
+    async def render_async(self, executor=None, timeout=None, semaphore=None):
+        return await render_in_executor(self, executor, timeout, semaphore)
+
     def to_base64_src(self):
-        svg_str = self.render()
-        svg_bytes = svg_str.encode("utf-8")
-        encoded_svg = base64.b64encode(svg_bytes).decode("utf-8")
-        return "data:image/svg+xml;base64," + encoded_svg
+        return svg_to_base64_src(self.render())
+
+    async def to_base64_src_async(self, executor=None, timeout=None, semaphore=None):
+        return svg_to_base64_src(await self.render_async(executor, timeout, semaphore))
 
     def upload_to_github_gist(self, access_token, filename=None):
         token = access_token
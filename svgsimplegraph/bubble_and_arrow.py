@@ -1,4 +1,5 @@
 import math
+from array import array
 
 from .base import BaseGraph
 from .utils import hex_to_rgba
@@ -6,6 +7,194 @@ from .utils import is_dark
 from .utils import estimate_text_dimensions
 from .utils import boxes_overlap
 from .utils import polar_to_cartesian
+from .utils import pack_array
+from .layout import RingLayout
+from .layout import sizes_close
+from .layout import layout_from_spec
+
+
+class ArrowIndex:
+    """
+    Compiled adjacency structure for the arrows of a BubbleAndArrowGraph.
+    Arrows are stored as integer bubble ids and sizes in flat arrays. On
+    compile, they are grouped by origin in CSR form: the arrows leaving bubble
+    i are destinations[offsets[i]:offsets[i + 1]], with matching sizes. Within
+    an origin, arrows to later bubbles come first, then arrows wrapping around
+    to earlier ones, each in ascending order. The compiled form is cached
+    until the next arrow is added.
+
+    Arrows can also be added by bubble label, before the bubbles exist. Their
+    ids are looked up in labels the first time the arrays are read.
+    """
+
+    def __init__(self, labels=None):
+        self.labels = {} if labels is None else labels
+        self._origins = array("q")
+        self._destinations = array("q")
+        self.sizes = array("d")
+        self._unresolved = []  # (arrow, origin, destination) added by label
+        self._compiled = None
+
+    def __len__(self):
+        return len(self.sizes)
+
+    @property
+    def origins(self):
+        self._resolve()
+        return self._origins
+
+    @property
+    def destinations(self):
+        self._resolve()
+        return self._destinations
+
+    def add(self, origin, destination, size):
+        if isinstance(origin, str) or isinstance(destination, str):
+            self._unresolved.append((len(self.sizes), origin, destination))
+        self._origins.append(-1 if isinstance(origin, str) else origin)
+        self._destinations.append(-1 if isinstance(destination, str) else destination)
+        self.sizes.append(size)
+        self._compiled = None
+
+    def _resolve(self):
+        # Every label resolves to the same id each time, so renders that get
+        # here at the same time write the same values
+        unresolved = self._unresolved
+        if not unresolved:
+            return
+        for arrow, origin, destination in unresolved:
+            for ids, bubble in [
+                (self._origins, origin),
+                (self._destinations, destination),
+            ]:
+                if isinstance(bubble, str):
+                    assert bubble in self.labels, f"Unknown bubble label: {bubble}"
+                    ids[arrow] = self.labels[bubble]
+        self._unresolved = []
+
+    def edges(self):
+        return zip(self.origins, self.destinations, self.sizes)
+
+    def _counting_sort(self, order, keys, num_keys):
+        # Stable sort of the arrow ids in order by an integer key
+        counts = [0] * (num_keys + 1)
+        for index in order:
+            counts[keys[index] + 1] += 1
+        for key in range(num_keys):
+            counts[key + 1] += counts[key]
+        offsets = counts[:]
+        result = [0] * len(order)
+        for index in order:
+            key = keys[index]
+            result[counts[key]] = index
+            counts[key] += 1
+        return result, offsets
+
+    def compile(self, num_bubbles):
+        """
+        Return (offsets, destinations, sizes, totals) where totals holds the
+        summed size of all arrows leaving each bubble.
+        """
+        compiled = self._compiled
+        if compiled is not None and len(compiled[0]) == num_bubbles + 1:
+            return compiled
+
+        origins = self.origins
+        destinations_by_arrow = self.destinations
+        for ids in (origins, destinations_by_arrow):
+            assert all(
+                0 <= bubble < num_bubbles for bubble in ids
+            ), f"Arrows must point between existing bubbles (0 to {num_bubbles - 1})"
+
+        # Two stable counting sorts give arrows by origin, then destination
+        order, _ = self._counting_sort(
+            range(len(self)), destinations_by_arrow, num_bubbles
+        )
+        order, offsets = self._counting_sort(order, origins, num_bubbles)
+
+        destinations = array("q")
+        sizes = array("d")
+        totals = array("d", [0]) * num_bubbles
+        for origin in range(num_bubbles):
+            row = order[offsets[origin] : offsets[origin + 1]]
+            # Rotate so arrows to later bubbles come before the ones wrapping around
+            split = 0
+            while split < len(row) and destinations_by_arrow[row[split]] < origin:
+                split += 1
+            for index in row[split:] + row[:split]:
+                destinations.append(destinations_by_arrow[index])
+                sizes.append(self.sizes[index])
+                totals[origin] += self.sizes[index]
+
+        compiled = (array("q", offsets), destinations, sizes, totals)
+        self._compiled = compiled
+        return compiled
+
+
+def reduce_arrows(
+    offsets, destinations, sizes, merge_parallel=False, merge_reciprocal=False
+):
+    """
+    Turn compiled arrows into one list of [destination, size] per origin.
+    Parallel arrows (same origin and destination) are summed. Reciprocal
+    arrows (A to B and B to A) are replaced by a single arrow carrying the net
+    flow, in the direction of the larger one.
+    """
+    rows = []
+    for origin in range(len(offsets) - 1):
+        row = []
+        for arrow in range(offsets[origin], offsets[origin + 1]):
+            if (
+                (merge_parallel or merge_reciprocal)
+                and row
+                and row[-1][0] == destinations[arrow]
+            ):
+                row[-1][1] += sizes[arrow]
+            else:
+                row.append([destinations[arrow], sizes[arrow]])
+        rows.append(row)
+
+    if merge_reciprocal:
+        flows = {
+            (origin, arrow[0]): arrow
+            for origin, row in enumerate(rows)
+            for arrow in row
+        }
+        for (origin, destination), arrow in flows.items():
+            if origin < destination and (destination, origin) in flows:
+                reverse_arrow = flows[(destination, origin)]
+                net = arrow[1] - reverse_arrow[1]
+                arrow[1] = max(net, 0)
+                reverse_arrow[1] = max(-net, 0)
+        rows = [[arrow for arrow in row if arrow[1] > 0] for row in rows]
+
+    return rows
+
+
+class LayoutState:
+    """
+    Layout results a BubbleAndArrowGraph keeps between renders. Label offsets
+    are only reused while the bubble texts and the arrows between them stay
+    the same, and no bubble or arrow changed size by more than a quarter. This
+    is the only state a render writes back to the graph, and each update
+    replaces the (topology, sizes, label_offsets) triple in one step so
+    concurrent renders never see half of an update.
+    """
+
+    def __init__(self):
+        self.labels = (None, None, [])
+
+    @property
+    def topology(self):
+        return self.labels[0]
+
+    @property
+    def sizes(self):
+        return self.labels[1]
+
+    @property
+    def label_offsets(self):
+        return self.labels[2]
 
 
 class BubbleAndArrowGraph(BaseGraph):
@@ -16,6 +205,15 @@ class BubbleAndArrowGraph(BaseGraph):
     data provided.
     """
 
+    spec_options = BaseGraph.spec_options + [
+        "merge_parallel_arrows",
+        "merge_reciprocal_arrows",
+        "min_arrow_width",
+        "other_bubble",
+        "bundle_angle",
+        "incremental",
+    ]
+
     def __init__(
         self,
         width=300,
@@ -41,6 +239,14 @@ class BubbleAndArrowGraph(BaseGraph):
         element_spacing=None,
         watermark=None,
         font_width_estimate_multiplier=1,
+        layout=None,
+        merge_parallel_arrows=False,
+        merge_reciprocal_arrows=False,
+        min_arrow_width=0,
+        other_bubble=None,
+        bundle_angle=None,
+        incremental=False,
+        css_classes=False,
     ):
         super().__init__(
             width=width,
@@ -66,17 +272,74 @@ class BubbleAndArrowGraph(BaseGraph):
             element_spacing=element_spacing,
             watermark=watermark,
             font_width_estimate_multiplier=font_width_estimate_multiplier,
+            css_classes=css_classes,
         )
         self.bubbles = []
-        self.arrows = []
-        self.total_arrow_width_from_origin = {}
+        self.dot_labels = {}
+        self.arrow_index = ArrowIndex(self.dot_labels)
         self.cx = self.width / 2
         self.cy = self.height / 2
-        self.dot_labels = {}
-        self.text_buffer = []
         self.inner_fill = (
             self.background_color or "#000000" if self.dark_mode else "#ffffff"
         )
+        # Any object with a place(radii, edges, width, height, center) method
+        # returning the canvas centers and the radius scaling factor
+        self.layout = layout or RingLayout()
+        # Edge reduction for dense graphs. Arrows narrower than min_arrow_width
+        # are folded into one arrow to other_bubble (or left out if it is
+        # None). Arrows from one bubble whose directions are within
+        # bundle_angle radians share a trunk before splitting up.
+        self.merge_parallel_arrows = merge_parallel_arrows
+        self.merge_reciprocal_arrows = merge_reciprocal_arrows
+        self.min_arrow_width = min_arrow_width
+        self.other_bubble = other_bubble
+        self.bundle_angle = bundle_angle
+        # Start label placement from the previous render's result, for graphs
+        # that are re-rendered with slightly different sizes
+        self.incremental = incremental
+        self.layout_state = LayoutState()
+
+    def to_spec(self):
+        spec = super().to_spec()
+        if not hasattr(self.layout, "to_spec"):
+            raise TypeError(
+                "Only layouts with a to_spec method can be described in a spec"
+            )
+        layout_spec = self.layout.to_spec()
+        if layout_spec != RingLayout().to_spec():
+            spec["options"]["layout"] = layout_spec
+        return spec
+
+    @classmethod
+    def _options_from_spec(cls, options):
+        if isinstance(options.get("layout"), dict):
+            options["layout"] = layout_from_spec(options["layout"])
+        return options
+
+    def _spec_data(self):
+        labels = [None] * len(self.bubbles)
+        for label, index in self.dot_labels.items():
+            labels[index] = label
+        # Bubbles and arrows are stored column-wise to keep big graphs compact
+        return {
+            "bubbles": {
+                "size": pack_array(bubble[0] for bubble in self.bubbles),
+                "inner_size": pack_array(bubble[1] for bubble in self.bubbles),
+                "text": [bubble[2] for bubble in self.bubbles],
+                "label": labels,
+            },
+            "arrows": {
+                "origin": pack_array(self.arrow_index.origins),
+                "destination": pack_array(self.arrow_index.destinations),
+                "size": pack_array(self.arrow_index.sizes),
+            },
+        }
+
+    @property
+    def arrows(self):
+        # The [origin, destination, size] of each arrow, read from the index,
+        # with bubble labels turned into ids
+        return [list(edge) for edge in self.arrow_index.edges()]
 
     def add_bubble(
         self,
@@ -101,25 +364,31 @@ class BubbleAndArrowGraph(BaseGraph):
     ):
         assert size >= 0, "size cannot be negative"
         if size > 0:
-            self.arrows.append([origin, destination, size])
+            self.arrow_index.add(origin, destination, size)
+
+    def _bubble_id(self, bubble):
+        if isinstance(bubble, str):
+            assert bubble in self.dot_labels, f"Unknown bubble label: {bubble}"
+            return self.dot_labels[bubble]
+        return bubble
 
-    def _draw_dot(self, x, y, fill, radius=5, inner_radius=None, text=None):
+    def _draw_dot(self, ctx, x, y, fill, radius=5, inner_radius=None, text=None):
         text_width, _ = (
             estimate_text_dimensions(text, 10, self.font_width_estimate_multiplier)
             if text
-            else 0
+            else (0, 0)
         )
-        self.most_extreme_dimensions["left"] = min(
-            self.most_extreme_dimensions["left"], x - radius
+        ctx.most_extreme_dimensions["left"] = min(
+            ctx.most_extreme_dimensions["left"], x - radius
         )
-        self.most_extreme_dimensions["right"] = max(
-            self.most_extreme_dimensions["right"], x + radius
+        ctx.most_extreme_dimensions["right"] = max(
+            ctx.most_extreme_dimensions["right"], x + radius
         )
-        self.most_extreme_dimensions["top"] = min(
-            self.most_extreme_dimensions["top"], y - radius
+        ctx.most_extreme_dimensions["top"] = min(
+            ctx.most_extreme_dimensions["top"], y - radius
         )
-        self.most_extreme_dimensions["bottom"] = max(
-            self.most_extreme_dimensions["bottom"], y + radius
+        ctx.most_extreme_dimensions["bottom"] = max(
+            ctx.most_extreme_dimensions["bottom"], y + radius
         )
         dot = f'<circle cx="{x}" cy="{y}" r="{radius}" fill="{fill}" />'
         if inner_radius:
@@ -132,10 +401,12 @@ class BubbleAndArrowGraph(BaseGraph):
                 text_color = "white" if is_dark(self.inner_fill) else "black"
             elif radius > text_width and not inner_radius:
                 text_color = "white" if is_dark(fill) else "black"
-            self.text_buffer.append([x, y, text, text_color])
+            ctx.text_buffer.append([x, y, text, text_color])
         return dot
 
-    def _draw_arrow(self, x1, y1, x2, y2, cx, cy, backoff, width=1, start_offset=0):
+    def _draw_arrow(
+        self, x1, y1, x2, y2, cx, cy, backoff, width=1, start_offset=0, closed=True
+    ):
         circular_arrow = x1 == x2 and y1 == y2
 
         arrow_head_length = max(10, width / 5)
@@ -201,165 +472,272 @@ class BubbleAndArrowGraph(BaseGraph):
         ctrl_x2 = cx - cx_offset
         ctrl_y2 = cy - cy_offset
 
-        return (
-            f"M {x1-x_out_offset-x_out_shift},{y1-y_out_offset-y_out_shift} "
-            + f"Q{ctrl_x1},{ctrl_y1} {x_arrow_head + x_in_offset},{y_arrow_head + y_in_offset} "
+        outline = (
+            f"Q{ctrl_x1},{ctrl_y1} {x_arrow_head + x_in_offset},{y_arrow_head + y_in_offset} "
             + f"L{x_arrow_head + 1.3 * x_in_offset},{y_arrow_head + 1.3 * y_in_offset} "
             + f"L{x2_backoff},{y2_backoff} L{x_arrow_head - 1.3 * x_in_offset},{y_arrow_head - 1.3 * y_in_offset} "
             + f"L{x_arrow_head - x_in_offset},{y_arrow_head - y_in_offset}"
-            + f"Q{ctrl_x2},{ctrl_y2} {x1+x_out_offset-x_out_shift},{y1+y_out_offset-y_out_shift} z "
+            + f"Q{ctrl_x2},{ctrl_y2} {x1+x_out_offset-x_out_shift},{y1+y_out_offset-y_out_shift} "
+        )
+        if not closed:
+            # Continue the current path from wherever it is instead
+            return outline
+        return (
+            f"M {x1-x_out_offset-x_out_shift},{y1-y_out_offset-y_out_shift} "
+            + outline
+            + "z "
         )
 
-    def _draw_arrows(self, arrows, fill):
-        path = ""
-        for arrow in arrows:
-            path += self._draw_arrow(*arrow)
-        return f'<path d="{path}" fill="{hex_to_rgba(fill,0.5)}" />'
+    def _draw_trunk(self, x1, y1, x2, y2, cx, cy, width, start_offset=0):
+        # Like _draw_arrow, but without a head and ending at the split point.
+        # Returns the two sides of the outline, for the branches to go between.
+        direction_out = math.atan2(y1 - cy, x1 - cx)
+        direction_in = math.atan2(y2 - cy, x2 - cx)
+        direction_mid = math.atan2(y2 - y1, x2 - x1)
 
-    def _draw_text(self, x, y, text, fill):
-        return self._generate_text(text, x, y, fill=fill)
+        cx_offset, cy_offset = polar_to_cartesian(
+            direction_mid + math.pi / 2, width / 2
+        )
+        x_out_offset, y_out_offset = polar_to_cartesian(
+            direction_out + math.pi / 2, width / 2
+        )
+        x_out_shift, y_out_shift = polar_to_cartesian(
+            direction_out + math.pi / 2, start_offset
+        )
+        x_in_offset, y_in_offset = polar_to_cartesian(
+            direction_in + math.pi / 2, width / 2
+        )
 
-    def _calculate_positions(self):
-        inter_bubble_space = 0.1  # Proportional gap between bubbles
+        return (
+            f"M {x1-x_out_offset-x_out_shift},{y1-y_out_offset-y_out_shift} "
+            + f"Q{cx + cx_offset},{cy + cy_offset} {x2 + x_in_offset},{y2 + y_in_offset} ",
+            f"Q{cx - cx_offset},{cy - cy_offset} {x1+x_out_offset-x_out_shift},{y1+y_out_offset-y_out_shift} z ",
+        )
+
+    def _draw_bundle(self, origin_position, arrows, positions, start_offset):
+        """
+        Draw arrows leaving one bubble in the same direction as a single trunk
+        that splits up halfway. arrows holds [destination, width] pairs. The
+        trunk and its branches are one outline, so every branch only adds its
+        own curve and head to the path.
+        """
+        x1, y1 = origin_position[0], origin_position[1]
+        total_width = sum(width for _, width in arrows)
+        mean_x = sum(positions[d][0] * width for d, width in arrows) / total_width
+        mean_y = sum(positions[d][1] * width for d, width in arrows) / total_width
+
+        # Split the curve towards the mean destination at its midpoint
+        split_x = 0.25 * x1 + 0.5 * self.cx + 0.25 * mean_x
+        split_y = 0.25 * y1 + 0.5 * self.cy + 0.25 * mean_y
+        trunk_out, trunk_back = self._draw_trunk(
+            x1,
+            y1,
+            split_x,
+            split_y,
+            (x1 + self.cx) / 2,
+            (y1 + self.cy) / 2,
+            total_width,
+            start_offset,
+        )
 
+        direction = math.atan2(split_y - y1, split_x - x1)
+
+        def side(arrow):
+            destination = positions[arrow[0]]
+            angle = math.atan2(destination[1] - split_y, destination[0] - split_x)
+            return (angle - direction + math.pi) % (2 * math.pi) - math.pi
+
+        branches = []
+        width_of_existing_arrows = 0
+        for destination, width in sorted(arrows, key=side):
+            destination_position = positions[destination]
+            branches.append(
+                self._draw_arrow(
+                    split_x,
+                    split_y,
+                    destination_position[0],
+                    destination_position[1],
+                    (self.cx + destination_position[0]) / 2,
+                    (self.cy + destination_position[1]) / 2,
+                    destination_position[2],
+                    width,
+                    width_of_existing_arrows + (width / 2) - (total_width / 2),
+                    closed=False,
+                )
+            )
+            width_of_existing_arrows += width
+        # The branches leave the split point facing back towards the trunk, so
+        # walking them in reverse goes from one side of the trunk to the other
+        return trunk_out + "".join(reversed(branches)) + trunk_back
+
+    def _bundle_arrows(self, origin, origin_position, arrows, positions):
+        """
+        Sort [destination, width] pairs leaving a bubble by direction and group
+        the ones within bundle_angle of each other.
+        """
+        x1, y1 = origin_position[0], origin_position[1]
+        to_center = math.atan2(self.cy - y1, self.cx - x1)
+
+        def direction(arrow):
+            destination = positions[arrow[0]]
+            angle = math.atan2(destination[1] - y1, destination[0] - x1)
+            return (angle - to_center + math.pi) % (2 * math.pi) - math.pi
+
+        # Arrows looping back to their origin are never bundled
+        groups = [[arrow] for arrow in arrows if arrow[0] == origin]
+        group_start = None
+        for arrow in sorted(
+            (arrow for arrow in arrows if arrow[0] != origin), key=direction
+        ):
+            if (
+                group_start is None
+                or direction(arrow) - group_start > self.bundle_angle
+            ):
+                groups.append([])
+                group_start = direction(arrow)
+            groups[-1].append(arrow)
+        return groups
+
+    def _draw_arrows(self, paths, fill):
+        return f'<path d="{"".join(paths)}" fill="{hex_to_rgba(fill,0.5)}" />'
+
+    def _text_dimensions(self, ctx, text):
+        # Measured once per distinct label and render, in the render's context
+        dimensions = ctx.text_dimensions.get(text)
+        if dimensions is None:
+            dimensions = estimate_text_dimensions(
+                text, 10, self.font_width_estimate_multiplier
+            )
+            ctx.text_dimensions[text] = dimensions
+        return dimensions
+
+    def _draw_text(self, ctx, x, y, text, fill):
+        return self._generate_text(ctx, text, x, y, fill=fill)
+
+    def _calculate_positions(self):
         # Calculate radii for all bubbles without scaling
         unscaled_bubbles = [
             (
                 math.sqrt(bubble[0] / math.pi),
                 math.sqrt(bubble[1] / math.pi) if bubble[1] else None,
-                bubble[2],
             )
             for bubble in self.bubbles
         ]
 
-        # Distribute bubbles evenly around a circle
-        num_bubbles = len(unscaled_bubbles)
-
-        # Compute the minimum circle radius to avoid any overlap between bubbles
-        min_circle_radius = (
-            sum((1 + inter_bubble_space) * bubble[0] for bubble in unscaled_bubbles)
-            / num_bubbles
-            / math.sin(math.pi / num_bubbles)
+        centers, scaling_factor = self.layout.place(
+            [bubble[0] for bubble in unscaled_bubbles],
+            list(self.arrow_index.edges()),
+            self.width,
+            self.height,
+            (self.cx, self.cy),
         )
-        largest_radii = sorted(bubble[0] for bubble in unscaled_bubbles)[-2:]
-        min_circle_radius = max(
-            min_circle_radius, sum(largest_radii) * (1 + inter_bubble_space)
-        )
-
-        # With this circle radius, determine the diameter and add some inter-bubble space
-        min_diameter = 2 * min_circle_radius
-
-        # Now compute the scaling factor to fit this minimum circle within the canvas
-        scaling_factor = min(self.width, self.height) / min_diameter
 
-        # Apply the scaling factor to the bubbles
-        scaled_bubbles = [
+        # Append bubble center coordinates and scaled radii
+        return [
             (
+                bx,
+                by,
                 bubble[0] * scaling_factor,
                 bubble[1] * scaling_factor if bubble[1] else None,
-                bubble[2],
             )
-            for bubble in unscaled_bubbles
+            for (bx, by), bubble in zip(centers, unscaled_bubbles)
         ]
 
-        # Also scale the circle radius
-        circle_radius = min_circle_radius * scaling_factor
-
-        positions = []
-        total_size = sum(
-            bubble[0] for bubble in scaled_bubbles
-        )  # Total size of all bubbles
-
-        angle_accumulator = (
-            0  # This will accumulate the angles as we move around the circle
-        )
-
-        for i, bubble in enumerate(scaled_bubbles):
-            bubble_size = bubble[0]  # Size of the current bubble
-            proportion = (
-                bubble_size / total_size
-            )  # Proportion of total size that this bubble represents
-
-            angle_accumulator += proportion / 2  # Move to the middle of the bubble
-
-            angle = (
-                2 * math.pi * angle_accumulator
-            )  # Angle around circle (adjusted by the angle_accumulator)
-            bx = self.cx + circle_radius * math.cos(angle)  # Bubble x position
-            by = self.cy + circle_radius * math.sin(angle)  # Bubble y position
-
-            positions.append(
-                (bx, by, bubble_size, bubble[1])
-            )  # Append bubble center coordinates and radius
-
-            angle_accumulator += (
-                proportion / 2
-            )  # Increase the accumulator by the proportion that this bubble represents
-
-        return positions
-
-    def render(self):
-        self._reset_graph()
+    def _render(self, ctx):
         svg = []
         svg_text = []
-        self.text_buffer = []
-        self.total_arrow_width_from_origin = {}
-        self.defs = []
-        self.svg_elements = []
+        ctx.text_buffer = []
+        ctx.text_dimensions = {}
 
         positions = self._calculate_positions()
+        offsets, destinations, sizes, _ = self.arrow_index.compile(len(self.bubbles))
+        rows = reduce_arrows(
+            offsets,
+            destinations,
+            sizes,
+            merge_parallel=self.merge_parallel_arrows,
+            merge_reciprocal=self.merge_reciprocal_arrows,
+        )
+        other_bubble = (
+            self._bubble_id(self.other_bubble)
+            if self.other_bubble is not None
+            else None
+        )
 
-        for i, arrow in enumerate(self.arrows):
-            if isinstance(arrow[0], str):
-                self.arrows[i][0] = self.dot_labels[arrow[0]]
-            if isinstance(arrow[1], str):
-                self.arrows[i][1] = self.dot_labels[arrow[1]]
-
-            if self.arrows[i][0] not in self.total_arrow_width_from_origin:
-                self.total_arrow_width_from_origin[self.arrows[i][0]] = 0
-            self.total_arrow_width_from_origin[self.arrows[i][0]] += arrow[2]
-
-        self.arrows.sort(key=lambda x: (x[0], x[1] < x[0], x[1]))
-        prev_origin = 0
-        width_of_existing_arrows = 0
         arrows_from_origin = {}
         # Draw Arrows
-        for arrow in self.arrows:
-            origin = arrow[0]
-            origin_position = positions[origin]
-            if arrow[0] != prev_origin:
-                width_of_existing_arrows = 0
-                prev_origin = arrow[0]
+        for origin, origin_position in enumerate(positions):
+            row = rows[origin]
+            if not row:
+                continue
             origin_bubble_diameter = 2 * origin_position[2]
             origin_bubble_size = self.bubbles[origin][0]
-            size_all_arrows = self.total_arrow_width_from_origin[origin]
+            size_all_arrows = 0
+            for _, size in row:
+                size_all_arrows += size
             width_all_arrows = min(
                 origin_bubble_diameter * size_all_arrows / origin_bubble_size,
                 origin_bubble_diameter,
             )
-            size = arrow[2]
-            width = width_all_arrows * size / size_all_arrows
-            start_offset = (
-                width_of_existing_arrows + (width / 2) - (width_all_arrows / 2)
-            )
-            width_of_existing_arrows += width
-            destination_position = positions[arrow[1]]
-            backoff = positions[arrow[1]][2]
-            if origin not in arrows_from_origin:
-                arrows_from_origin[origin] = []
-            arrows_from_origin[origin].append(
-                [
-                    origin_position[0],
-                    origin_position[1],
-                    destination_position[0],
-                    destination_position[1],
-                    self.cx,
-                    self.cy,
-                    backoff,
-                    width,
-                    start_offset,
-                ]
-            )
+
+            # Fold arrows that would be too thin to see into one "other" arrow
+            arrows = []
+            other_size = 0
+            for destination, size in row:
+                width = width_all_arrows * size / size_all_arrows
+                if width < self.min_arrow_width:
+                    other_size += size
+                else:
+                    arrows.append([destination, width])
+            drawn_width = width_all_arrows
+            if other_size and other_bubble is not None:
+                other_width = width_all_arrows * other_size / size_all_arrows
+                for arrow in arrows:
+                    if arrow[0] == other_bubble:
+                        arrow[1] += other_width
+                        break
+                else:
+                    arrows.append([other_bubble, other_width])
+            elif other_size:
+                drawn_width = sum(width for _, width in arrows)
+            if not arrows:
+                continue
+
+            if self.bundle_angle is not None:
+                groups = self._bundle_arrows(origin, origin_position, arrows, positions)
+            else:
+                groups = [[arrow] for arrow in arrows]
+
+            width_of_existing_arrows = 0
+            arrows_from_origin[origin] = []
+            for group in groups:
+                width = sum(width for _, width in group)
+                start_offset = (
+                    width_of_existing_arrows + (width / 2) - (drawn_width / 2)
+                )
+                width_of_existing_arrows += width
+                if len(group) > 1:
+                    arrows_from_origin[origin].append(
+                        self._draw_bundle(
+                            origin_position, group, positions, start_offset
+                        )
+                    )
+                    continue
+                destination_position = positions[group[0][0]]
+                backoff = destination_position[2]
+                arrows_from_origin[origin].append(
+                    self._draw_arrow(
+                        origin_position[0],
+                        origin_position[1],
+                        destination_position[0],
+                        destination_position[1],
+                        self.cx,
+                        self.cy,
+                        backoff,
+                        width,
+                        start_offset,
+                    )
+                )
 
         for origin, arrows in arrows_from_origin.items():
             svg.append(self._draw_arrows(arrows, self.colors[origin]))
@@ -368,6 +746,7 @@ class BubbleAndArrowGraph(BaseGraph):
         for i, bubble in enumerate(self.bubbles):
             position = positions[i]
             dot = self._draw_dot(
+                ctx,
                 position[0],
                 position[1],
                 self.colors[i],
@@ -378,22 +757,39 @@ class BubbleAndArrowGraph(BaseGraph):
 
             svg.append(dot)
 
+        # Pick up where the last render left off if only sizes changed a bit
+        topology = (
+            tuple(bubble[2] for bubble in self.bubbles),
+            self.arrow_index.origins.tobytes(),
+            self.arrow_index.destinations.tobytes(),
+        )
+        sizes = [size for bubble in self.bubbles for size in bubble[:2]]
+        sizes = [size or 0 for size in sizes] + list(self.arrow_index.sizes)
+        initial_ys = [text[1] for text in ctx.text_buffer]
+        previous_topology, previous_sizes, previous_offsets = self.layout_state.labels
+        if (
+            self.incremental
+            and previous_topology == topology
+            and sizes_close(previous_sizes, sizes)
+        ):
+            for text, offset in zip(ctx.text_buffer, previous_offsets):
+                text[1] += offset
+
         # Shift labels to not overlap
+        text_dimensions = [
+            self._text_dimensions(ctx, text[2]) for text in ctx.text_buffer
+        ]
         text_to_check = 0
         num_loops = 0
-        max_loops = len(self.text_buffer) * 10
-        while text_to_check < len(self.text_buffer) and num_loops < max_loops:
-            first_text = self.text_buffer[text_to_check]
+        max_loops = len(ctx.text_buffer) * 10
+        while text_to_check < len(ctx.text_buffer) and num_loops < max_loops:
+            first_text = ctx.text_buffer[text_to_check]
+            first_text_width, first_text_height = text_dimensions[text_to_check]
             any_change = False
             for i in [-2, -1, 1, 2]:
-                other_index = (text_to_check + i) % len(self.text_buffer)
-                other_text = self.text_buffer[other_index]
-                first_text_width, first_text_height = estimate_text_dimensions(
-                    first_text[2], 10, self.font_width_estimate_multiplier
-                )
-                other_text_width, other_text_height = estimate_text_dimensions(
-                    other_text[2], 10, self.font_width_estimate_multiplier
-                )
+                other_index = (text_to_check + i) % len(ctx.text_buffer)
+                other_text = ctx.text_buffer[other_index]
+                other_text_width, other_text_height = text_dimensions[other_index]
                 vertical_overlap = boxes_overlap(
                     first_text[0],
                     first_text[1],
@@ -406,9 +802,9 @@ class BubbleAndArrowGraph(BaseGraph):
                 )
                 if vertical_overlap:
                     if first_text[1] < other_text[1]:
-                        self.text_buffer[text_to_check][1] -= vertical_overlap
+                        ctx.text_buffer[text_to_check][1] -= vertical_overlap
                     else:
-                        self.text_buffer[text_to_check][1] += vertical_overlap
+                        ctx.text_buffer[text_to_check][1] += vertical_overlap
 
                     any_change = True
             if any_change:
@@ -417,10 +813,18 @@ class BubbleAndArrowGraph(BaseGraph):
                 text_to_check += 1
             num_loops += 1
 
-        # Draw Text
-        for text in self.text_buffer:
-            svg_text.append(self._draw_text(*text))
+        if self.incremental:
+            self.layout_state.labels = (
+                topology,
+                sizes,
+                [
+                    text[1] - initial_y
+                    for text, initial_y in zip(ctx.text_buffer, initial_ys)
+                ],
+            )
 
-        self.svg_elements = svg + svg_text
+        # Draw Text
+        for text in ctx.text_buffer:
+            svg_text.append(self._draw_text(ctx, *text))
 
-        return self._generate_svg()
+        ctx.svg_elements = svg + svg_text
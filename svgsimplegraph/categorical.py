@@ -3,11 +3,161 @@ from .utils import human_readable_number
 from .utils import calculate_ticks
 from .utils import match_ticks
 from .utils import estimate_text_dimensions
+from .utils import pack_array
+from .utils import pack_sparse
+from .utils import clip_polyline
+from .utils import LabelGrid
+from .utils import thin_labels
+from .series import ArraySeries
+from .series import bucket_label
+from .series import map_series
+from .series import REDUCERS
+from .series import reduce_buckets
+from .series import RingSeries
+from .series import SeriesPyramid
+from .series import SparseSeries
+from .series import split_columns
+from .series import window
+import copy
+import csv
+import heapq
+import itertools
 import math
 import numbers
+from array import array
+
+# With cull_invisible, bars less than this many pixels tall and dots less than
+# this far from the previous dot of their series are culled as invisible. It is
+# also the tolerance for being inside the plot area, so that values that land
+# on its edge aren't culled because of rounding.
+MIN_VISIBLE_SIZE = 0.5
+
+# Counters _render adds to RenderContext.stats
+CULL_STATS = [
+    "culled_bars",
+    "clipped_bars",
+    "culled_dots",
+    "clipped_lines",
+    "culled_labels",
+    "nudged_labels",
+    "culled_reference_lines",
+]
+
+
+def value_range(values):
+    """
+    Return (min, max) of the values of a series that are not None, or
+    (None, None) if there are none. Series types that track their own range
+    (such as ArraySeries) are asked instead of scanned.
+    """
+    if hasattr(values, "value_range"):
+        return values.value_range()
+    present = [value for value in values if value is not None]
+    if not present:
+        return (None, None)
+    return (min(present), max(present))
+
+
+def present_values(values, index, num_categories):
+    """
+    Yield (category, index, value) for the values of series index that are
+    present, up to num_categories. Series types that know where their values
+    are (such as SparseSeries) are asked instead of scanned.
+    """
+    if hasattr(values, "items"):
+        items = values.items()
+    else:
+        items = (
+            (sub_index, value)
+            for sub_index, value in enumerate(values)
+            if value is not None
+        )
+    for sub_index, value in items:
+        if sub_index >= num_categories:
+            return
+        yield sub_index, index, value
+
+
+def combined_range(series):
+    lows, highs = [], []
+    for values in series:
+        low, high = value_range(values)
+        if low is not None:
+            lows.append(low)
+            highs.append(high)
+    if not lows:
+        return (None, None)
+    return (min(lows), max(highs))
+
+
+def read_csv_series(f, x_column, series_columns, chunk_size, bucket_size, reducer):
+    """
+    Read the x labels and the series_columns of a CSV file with a header row,
+    chunk_size rows at a time, into ArraySeries with precomputed ranges.
+    """
+    reader = csv.reader(f)
+    header = next(reader)
+
+    def column_index(column):
+        return column if isinstance(column, int) else header.index(column)
+
+    def parse(row, index):
+        try:
+            return float(row[index])
+        except (IndexError, ValueError):
+            return math.nan
+
+    x_index = column_index(x_column)
+    indices = [column_index(column) for column in series_columns]
+    if bucket_size:
+        # Chunks hold whole buckets so each can be reduced on its own
+        chunk_size = max(1, chunk_size // bucket_size) * bucket_size
+
+    x_labels = []
+    columns = [array("d") for _ in indices]
+    ranges = [(None, None)] * len(indices)
+    while True:
+        rows = list(itertools.islice(reader, chunk_size))
+        if not rows:
+            break
+        labels = [row[x_index] if len(row) > x_index else None for row in rows]
+        if bucket_size:
+            labels = [
+                bucket_label(
+                    labels[start], labels[min(start + bucket_size, len(labels)) - 1]
+                )
+                for start in range(0, len(labels), bucket_size)
+            ]
+        x_labels.extend(labels)
+
+        for number, index in enumerate(indices):
+            chunk = array("d", (parse(row, index) for row in rows))
+            if bucket_size:
+                chunk = reduce_buckets(chunk, bucket_size, reducer)
+            columns[number].extend(chunk)
+            # Keep a running range so nothing has to be rescanned later
+            low, high = ArraySeries(chunk).value_range()
+            if low is not None:
+                previous_low, previous_high = ranges[number]
+                ranges[number] = (
+                    low if previous_low is None else min(previous_low, low),
+                    high if previous_high is None else max(previous_high, high),
+                )
+
+    return x_labels, [
+        ArraySeries(values, value_range=value_range)
+        for values, value_range in zip(columns, ranges)
+    ]
 
 
-def stacked_bar_range(data, series_types, secondary, maximum, minimum):
+def stacked_bar_range(
+    data, series_types, secondary, maximum, minimum, stacked_sums=None
+):
+    """
+    The range of the non-secondary series when bars are stacked. stacked_sums
+    can be a pair of series holding the positive and negative stacked sum of
+    every category, kept up to date by the caller, so they aren't recomputed.
+    """
     non_secondary_bars_to_use = [
         not secondary[index] and series_types[index][0] == "bar"
         for index in range(len(secondary))
@@ -19,17 +169,13 @@ def stacked_bar_range(data, series_types, secondary, maximum, minimum):
     ]
 
     if any(non_secondary_non_bars_to_use):
-        non_secondary_non_bar_values = [
-            value
+        min_non_secondary_non_bar, max_non_secondary_non_bar = combined_range(
+            values
             for values, non_bar_non_secondary in zip(
                 data, non_secondary_non_bars_to_use
             )
             if non_bar_non_secondary
-            for value in values
-            if value is not None  # Exclude None values
-        ]
-        max_non_secondary_non_bar = max(non_secondary_non_bar_values)
-        min_non_secondary_non_bar = min(non_secondary_non_bar_values)
+        )
         if maximum is not None:
             maximum = max(max_non_secondary_non_bar, maximum)
         else:
@@ -39,23 +185,32 @@ def stacked_bar_range(data, series_types, secondary, maximum, minimum):
         else:
             minimum = min_non_secondary_non_bar
 
-    stacked_positive_data = [
-        sum(
-            max(value or 0, 0)
-            for i, value in enumerate(column)
-            if non_secondary_bars_to_use[i] and value is not None
+    if stacked_sums is not None:
+        stacked_positive_data = [stacked_sums[0].value_range()[1]]
+        stacked_negative_data = [stacked_sums[1].value_range()[0]]
+        if stacked_positive_data[0] is None:
+            stacked_positive_data = stacked_negative_data = []
+    else:
+        # Only categories with a bar value can stack away from zero
+        num_categories = min((len(values) for values in data), default=0)
+        positive_sums = {}
+        negative_sums = {}
+        for index, values in enumerate(data):
+            if not non_secondary_bars_to_use[index]:
+                continue
+            for sub_index, _, value in present_values(values, index, num_categories):
+                positive_sums[sub_index] = positive_sums.get(sub_index, 0) + max(
+                    value, 0
+                )
+                negative_sums[sub_index] = negative_sums.get(sub_index, 0) + min(
+                    value, 0
+                )
+        stacked_positive_data = (
+            [max(positive_sums.values(), default=0)] if num_categories else []
         )
-        for column in zip(*data)
-    ]
-
-    stacked_negative_data = [
-        sum(
-            min(value or 0, 0)
-            for i, value in enumerate(column)
-            if non_secondary_bars_to_use[i] and value is not None
+        stacked_negative_data = (
+            [min(negative_sums.values(), default=0)] if num_categories else []
         )
-        for column in zip(*data)
-    ]
 
     if stacked_positive_data and stacked_negative_data:
         # Only proceed if there are valid (non-None) data points
@@ -72,29 +227,46 @@ def stacked_bar_range(data, series_types, secondary, maximum, minimum):
 
 
 def non_secondary_range(data, secondary, maximum, minimum):
-    # Filter out None values and then compute the range for non-secondary values
-    non_secondary_values = [
-        value
-        for values, is_secondary in zip(data, secondary)
-        if not is_secondary
-        for value in values
-        if value is not None  # Exclude None values
-    ]
+    # Compute the range for non-secondary values, ignoring None values
+    low, high = combined_range(
+        values for values, is_secondary in zip(data, secondary) if not is_secondary
+    )
 
-    if non_secondary_values:
+    if low is not None:
         # Proceed only if there are valid (non-None) data points
         if maximum is None:
-            maximum = max(non_secondary_values)
+            maximum = high
         if minimum is None:
-            minimum = min(non_secondary_values)
-        return (
-            min(non_secondary_values + [minimum]),
-            max(non_secondary_values + [maximum]),
-        )
+            minimum = low
+        return (min(low, minimum), max(high, maximum))
     else:
         return (None, None)
 
 
+def axis_ticks(ranges, target_tick_count):
+    """
+    The primary and secondary ticks for the (min, max) pairs of both axes
+    returned by CategoricalGraph._value_ranges. Without a secondary range the
+    secondary ticks are None, otherwise both are matched so zero lines up.
+    """
+    min_primary, max_primary, min_secondary, max_secondary = ranges
+    primary_ticks = calculate_ticks(
+        min_primary,
+        max_primary,
+        include_zero=True,
+        target_tick_count=target_tick_count,
+    )
+    if min_secondary is None:
+        return primary_ticks, None
+    secondary_ticks = calculate_ticks(
+        min_secondary,
+        max_secondary,
+        include_zero=True,
+        target_tick_count=target_tick_count,
+    )
+    return match_ticks(primary_ticks, secondary_ticks)
+
+
 class CategoricalGraph(BaseGraph):
     """
     The graphs generated by this class should have a categorical x-axis (e.g.
@@ -103,6 +275,27 @@ class CategoricalGraph(BaseGraph):
     or dots.
     """
 
+    spec_options = BaseGraph.spec_options + [
+        "bar_width",
+        "stacked",
+        "scale_max",
+        "scale_min",
+        "secondary_scale_max",
+        "secondary_scale_min",
+        "primary_tick_prefix",
+        "primary_tick_suffix",
+        "secondary_tick_prefix",
+        "secondary_tick_suffix",
+        "legend_position",
+        "line_curvature",
+        "bin_categories",
+        "bin_reducer",
+        "thin_x_labels",
+        "x_label_priority",
+        "avoid_value_overlap",
+        "cull_invisible",
+    ]
+
     def __init__(
         self,
         width=300,
@@ -140,6 +333,13 @@ class CategoricalGraph(BaseGraph):
         secondary_tick_suffix="",
         legend_position="right",
         line_curvature=0,
+        bin_categories=False,
+        bin_reducer="sum",
+        thin_x_labels=False,
+        x_label_priority=None,
+        avoid_value_overlap=False,
+        css_classes=False,
+        cull_invisible=False,
     ):
         super().__init__(
             width=width,
@@ -165,6 +365,7 @@ class CategoricalGraph(BaseGraph):
             element_spacing=element_spacing,
             watermark=watermark,
             font_width_estimate_multiplier=font_width_estimate_multiplier,
+            css_classes=css_classes,
         )
         self.stacked = stacked
         self.bar_width = bar_width
@@ -181,12 +382,35 @@ class CategoricalGraph(BaseGraph):
             line_curvature >= 0 and line_curvature <= 0.5
         ), f"Invalid line_curvature value: {line_curvature}. Must be between 0 and 0.5."
         self.line_curvature = line_curvature
+        for reducer in bin_reducer if isinstance(bin_reducer, list) else [bin_reducer]:
+            assert reducer in REDUCERS, (
+                f"Invalid bin_reducer: {reducer}. "
+                + f"Must be one of {', '.join(REDUCERS)}."
+            )
+        # Combine neighbouring categories when there are more than fit: True
+        # for one per pixel of width, or a maximum number of categories
+        self.bin_categories = bin_categories
+        self.bin_reducer = bin_reducer
+        # Leave out x labels that would overlap, keeping the first, the last
+        # and those in x_label_priority (a list of labels) where possible
+        self.thin_x_labels = thin_x_labels
+        self.x_label_priority = x_label_priority
+        # Nudge or leave out print_values labels that would overlap others
+        self.avoid_value_overlap = avoid_value_overlap
+        # Leave out elements that can't be seen and clip those that stick out
+        # of the plot area, counting them in RenderContext.stats
+        self.cull_invisible = cull_invisible
         self.x_labels = []
         self.series_types = []
         self.secondary = []
         self.horizontal_lines = []
         self.vertical_lines = []
         self.stroke_width = []
+        # Stacked sums of live (RingSeries) bars, keyed by secondary
+        self._live_sums = {}
+        # (primary, secondary) ticks to use instead of those of the data, set
+        # by GraphGrid so all its panels share one scale
+        self._shared_ticks = None
 
     def add_series(
         self,
@@ -197,6 +421,20 @@ class CategoricalGraph(BaseGraph):
         secondary=False,
         stroke_width=1,
     ):
+        if isinstance(series, (RingSeries, SparseSeries)):
+            # Kept as they are: live series so later appends show up, and
+            # sparse ones so only their present values are ever visited
+            if isinstance(series, RingSeries) and not self.x_labels:
+                self.x_labels = series.labels
+            self._append_series(
+                series,
+                legend_label,
+                series_type,
+                print_values,
+                secondary,
+                stroke_width,
+            )
+            return
         # Deal with NaN values besides None (e.g. np.nan)
         cleaned_series = [
             (
@@ -206,12 +444,272 @@ class CategoricalGraph(BaseGraph):
             )
             for value in series
         ]
-        self.data.append(cleaned_series)
+        self._append_series(
+            cleaned_series,
+            legend_label,
+            series_type,
+            print_values,
+            secondary,
+            stroke_width,
+        )
+
+    def add_series_from_file(
+        self,
+        path,
+        dtype="<f8",
+        offset=0,
+        count=None,
+        legend_label=None,
+        series_type="bar",
+        print_values=False,
+        secondary=False,
+        stroke_width=1,
+        bucket_size=None,
+        reducer="mean",
+    ):
+        """
+        Add count values of a raw little-endian binary file (or a .npy file,
+        which brings its own dtype) starting at value offset. The file is
+        memory-mapped and only the charted slice is ever read. NaN values are
+        treated as missing. With bucket_size, every bucket_size values are
+        reduced to one with reducer (sum, mean, min, max, first, last or
+        count) while reading, so the graph gets one category per bucket.
+        """
+        series = map_series(path, dtype, offset, count)
+        if bucket_size:
+            series = ArraySeries(reduce_buckets(series, bucket_size, reducer))
+        self._append_series(
+            series, legend_label, series_type, print_values, secondary, stroke_width
+        )
+
+    def add_series_from_pyramid(
+        self,
+        pyramid,
+        start=0,
+        stop=None,
+        max_categories=None,
+        reducer="mean",
+        x_labels=None,
+        legend_label=None,
+        series_type="bar",
+        print_values=False,
+        secondary=False,
+        stroke_width=1,
+    ):
+        """
+        Add the values start to stop of a long series through its
+        SeriesPyramid, reduced with reducer to at most max_categories
+        categories (by default one per pixel of width). The work depends on
+        the number of categories, not on how many values the range spans.
+        If x_labels (the labels of the full series) are given and the graph
+        has none yet, each category is labelled with the range it covers.
+        """
+        assert isinstance(pyramid, SeriesPyramid), "Expected a SeriesPyramid"
+        stop = len(pyramid) if stop is None else min(stop, len(pyramid))
+        max_categories = max_categories or max(1, int(self.width))
+        bucket_size = max(1, math.ceil((stop - start) / max_categories))
+        if x_labels is not None and not self.x_labels:
+            self.x_labels = [
+                bucket_label(
+                    x_labels[first], x_labels[min(first + bucket_size, stop) - 1]
+                )
+                for first in range(start, stop, bucket_size)
+            ]
+        series = ArraySeries(pyramid.reduce(start, stop, bucket_size, reducer))
+        self._append_series(
+            series, legend_label, series_type, print_values, secondary, stroke_width
+        )
+
+    def add_series_bulk(
+        self,
+        matrix,
+        legend_labels=None,
+        series_types=None,
+        secondary=None,
+        print_values=False,
+        stroke_width=1,
+    ):
+        """
+        Add every column of a 2-D matrix (one row per category, e.g. a numpy
+        array) as a series in one step. NaN or None values are missing. With
+        numpy, the series are views of the matrix that share one validity
+        mask. series_types and secondary can be a single value for all series
+        or a list with one value per column.
+        """
+        series = split_columns(matrix)
+        for index, values in enumerate(series):
+            self._append_series(
+                values,
+                legend_labels[index] if legend_labels else None,
+                (
+                    series_types[index]
+                    if isinstance(series_types, (list, tuple))
+                    else series_types or "bar"
+                ),
+                print_values,
+                (
+                    secondary[index]
+                    if isinstance(secondary, (list, tuple))
+                    else bool(secondary)
+                ),
+                stroke_width,
+            )
+
+    @classmethod
+    def from_dataframe(cls, df, series_types=None, secondary=None, **options):
+        """
+        Build a graph from a pandas DataFrame: the index becomes the x labels
+        and every column a series named after it. Other keyword arguments are
+        passed to the constructor.
+        """
+        graph = cls(**options)
+        graph.x_labels = list(df.index)
+        graph.add_series_bulk(
+            df.to_numpy(dtype=float),
+            legend_labels=[str(column) for column in df.columns],
+            series_types=series_types,
+            secondary=secondary,
+        )
+        return graph
+
+    def append(self, values, label=None):
+        """
+        Append a category to a live graph, whose series were all added as
+        RingSeries, with one value per series. Once the series are full, the
+        oldest category is evicted. The ranges, and the stacked sums of bars,
+        are updated incrementally so rendering never rescans the window.
+        """
+        assert len(values) == len(
+            self.data
+        ), f"Expected {len(self.data)} values, got {len(values)}"
+        assert all(
+            isinstance(series, RingSeries) for series in self.data
+        ), "append needs every series to be a RingSeries"
+        # Sums that are in sync now are updated in place; others are rebuilt.
+        # Only append writes them: renders rebuild stale sums for themselves.
+        in_sync = {
+            is_secondary: sums
+            for is_secondary, sums in self._live_sums.items()
+            if sums[0] == self._live_versions(is_secondary)
+        }
+        for series, value in zip(self.data, values):
+            series.append(value, label)
+        for is_secondary in (False, True):
+            if not self._live_bars(is_secondary):
+                continue
+            if is_secondary not in in_sync:
+                self._live_sums[is_secondary] = self._build_stacked_sums(is_secondary)
+                continue
+            _, positive, negative = in_sync[is_secondary]
+            row = [self.data[i][-1] for i in self._live_bars(is_secondary)]
+            positive.append(sum(max(value, 0) for value in row if value is not None))
+            negative.append(sum(min(value, 0) for value in row if value is not None))
+            self._live_sums[is_secondary] = (
+                self._live_versions(is_secondary),
+                positive,
+                negative,
+            )
+
+    def _live_bars(self, is_secondary):
+        return [
+            index
+            for index, (series_type, _) in enumerate(self.series_types)
+            if series_type == "bar" and bool(self.secondary[index]) == is_secondary
+        ]
+
+    def _live_versions(self, is_secondary):
+        return tuple(
+            (index, self.data[index].appended)
+            for index in self._live_bars(is_secondary)
+        )
+
+    def _stacked_sums(self, is_secondary):
+        """
+        The positive and negative stacked sums of the bars on one axis as
+        RingSeries, or None unless those bars are all live.
+        """
+        indices = self._live_bars(is_secondary)
+        if not indices or not all(
+            isinstance(self.data[index], RingSeries) for index in indices
+        ):
+            return None
+        sums = self._live_sums.get(is_secondary)
+        if sums is None or sums[0] != self._live_versions(is_secondary):
+            # Out of date, for example after appending to a series directly
+            sums = self._build_stacked_sums(is_secondary)
+        return sums[1], sums[2]
+
+    def _build_stacked_sums(self, is_secondary):
+        # (versions, positive sums, negative sums) of the live bars on one axis
+        indices = self._live_bars(is_secondary)
+        capacity = max(self.data[index].capacity for index in indices)
+        positive, negative = RingSeries(capacity), RingSeries(capacity)
+        for row in zip(*(self.data[index] for index in indices)):
+            present = [value for value in row if value is not None]
+            positive.append(sum(max(value, 0) for value in present))
+            negative.append(sum(min(value, 0) for value in present))
+        return (self._live_versions(is_secondary), positive, negative)
+
+    def _append_series(
+        self, series, legend_label, series_type, print_values, secondary, stroke_width
+    ):
+        self.data.append(series)
         self.legend_labels.append(legend_label or None)
         self.series_types.append((series_type, print_values))
         self.secondary.append(secondary)
         self.stroke_width.append(stroke_width)
 
+    @classmethod
+    def from_csv(
+        cls,
+        path_or_file,
+        x_column,
+        series_columns,
+        chunk_size=10000,
+        bucket_size=None,
+        reducer="mean",
+        series_types=None,
+        secondary=None,
+        **options,
+    ):
+        """
+        Build a graph from a CSV file with a header row, taking the x labels
+        from x_column and one series from each of series_columns (names or
+        indices). Rows are parsed chunk_size at a time into compact float
+        arrays and the range of each series is tracked while reading, so
+        memory stays flat however many rows there are. Empty or non-numeric
+        cells are missing values. With bucket_size, every bucket_size rows are
+        reduced to one category with reducer, labelled "first–last". Other
+        keyword arguments are passed to the constructor.
+        """
+        if isinstance(path_or_file, str):
+            with open(path_or_file, "r", newline="") as f:
+                x_labels, series = read_csv_series(
+                    f, x_column, series_columns, chunk_size, bucket_size, reducer
+                )
+        else:
+            x_labels, series = read_csv_series(
+                path_or_file,
+                x_column,
+                series_columns,
+                chunk_size,
+                bucket_size,
+                reducer,
+            )
+
+        graph = cls(**options)
+        graph.x_labels = x_labels
+        for index, (name, values) in enumerate(zip(series_columns, series)):
+            graph._append_series(
+                values,
+                str(name),
+                series_types[index] if series_types else "bar",
+                False,
+                secondary[index] if secondary else False,
+                1,
+            )
+        return graph
+
     def add_horizontal_line(
         self,
         y,
@@ -267,6 +765,160 @@ class CategoricalGraph(BaseGraph):
             )
         )
 
+    def _derived(self, data, x_labels, vertical_lines):
+        # A copy of the graph with other data that doesn't share mutable state
+        graph = copy.copy(self)
+        graph.data = data
+        graph.x_labels = x_labels
+        graph.legend_labels = list(self.legend_labels)
+        graph.series_types = list(self.series_types)
+        graph.secondary = list(self.secondary)
+        graph.stroke_width = list(self.stroke_width)
+        graph.colors = list(self.colors)
+        graph.horizontal_lines = list(self.horizontal_lines)
+        graph.vertical_lines = vertical_lines
+        graph._live_sums = {}
+        return graph
+
+    def binned(self):
+        """
+        Return the graph to draw when bin_categories is set: if there are more
+        categories than fit (one per pixel of width, or bin_categories), runs
+        of neighbouring categories are combined into one with bin_reducer (a
+        reducer or a list with one per series), so the output size is bounded
+        by the width. All series share the same buckets, so stacks and both
+        axes stay consistent, and each bucket is labelled "first–last".
+        """
+        if not self.bin_categories or not self.data:
+            return self
+        max_categories = (
+            max(1, int(self.width))
+            if self.bin_categories is True
+            else self.bin_categories
+        )
+        num_categories = len(self.data[0])
+        if num_categories <= max_categories:
+            return self
+        bucket_size = math.ceil(num_categories / max_categories)
+
+        reducers = (
+            self.bin_reducer
+            if isinstance(self.bin_reducer, list)
+            else [self.bin_reducer] * len(self.data)
+        )
+        assert len(reducers) == len(self.data), "Expected one bin_reducer per series"
+        data = [
+            ArraySeries(reduce_buckets(series, bucket_size, reducer))
+            for series, reducer in zip(self.data, reducers)
+        ]
+        x_labels = list(self.x_labels)
+        if x_labels:
+            x_labels = [
+                bucket_label(
+                    x_labels[first],
+                    x_labels[min(first + bucket_size, len(x_labels)) - 1],
+                )
+                for first in range(0, len(x_labels), bucket_size)
+            ]
+        # Keep vertical lines at the same place within their bucket
+        vertical_lines = [
+            ((x + 0.5) / bucket_size - 0.5, *line) for x, *line in self.vertical_lines
+        ]
+        return self._derived(data, x_labels, vertical_lines)
+
+    def render_context(self):
+        binned = self.binned()
+        if binned is not self:
+            return binned.render_context()
+        return super().render_context()
+
+    def view(self, start, stop):
+        """
+        Return a graph of categories start to stop of this one, with the same
+        options, that shares its series instead of copying them. Axis ranges
+        are computed over the window only, and vertical lines are moved to
+        their place in it, so each page of a long graph can be rendered in
+        time proportional to the page.
+        """
+        num_categories = len(self.data[0]) if self.data else len(self.x_labels)
+        start, stop, _ = slice(start, stop).indices(num_categories)
+        stop = max(start, stop)
+        return self._derived(
+            [window(series, start, stop) for series in self.data],
+            window(self.x_labels, start, stop),
+            [
+                (x - start, *line)
+                for x, *line in self.vertical_lines
+                if start - 0.5 <= x <= stop - 0.5
+            ],
+        )
+
+    def _spec_data(self):
+        return {
+            "x_labels": list(self.x_labels),
+            "series": [
+                {
+                    # Sparse series stay sparse, so their specs stay small
+                    "series": (
+                        pack_sparse(series.indices, series.values, len(series))
+                        if isinstance(series, SparseSeries)
+                        else pack_array(series)
+                    ),
+                    "legend_label": legend_label,
+                    "series_type": series_type,
+                    "print_values": print_values,
+                    "secondary": secondary,
+                    "stroke_width": stroke_width,
+                }
+                for (
+                    series,
+                    legend_label,
+                    (series_type, print_values),
+                    secondary,
+                    stroke_width,
+                ) in zip(
+                    self.data,
+                    self.legend_labels,
+                    self.series_types,
+                    self.secondary,
+                    self.stroke_width,
+                )
+            ],
+            "horizontal_lines": [
+                dict(
+                    zip(
+                        [
+                            "y",
+                            "color",
+                            "stroke_width",
+                            "label",
+                            "label_x_position",
+                            "label_y_position",
+                        ],
+                        line,
+                    )
+                )
+                for line in self.horizontal_lines
+            ],
+            "vertical_lines": [
+                dict(
+                    zip(
+                        [
+                            "x",
+                            "color",
+                            "stroke_width",
+                            "label",
+                            "label_x_position",
+                            "label_y_position",
+                            "rotate_label",
+                        ],
+                        line,
+                    )
+                )
+                for line in self.vertical_lines
+            ],
+        }
+
     def _draw_bar(self, x, y, width, height, fill):
         assert x >= 0, f"Bars cannot start below 0: {x}"
         if height == 0:
@@ -278,37 +930,37 @@ class CategoricalGraph(BaseGraph):
             f'<rect x="{x}" y="{y}" width="{width}" height="{height}" fill="{fill}" />'
         )
 
-    def _draw_dot(self, x, y, fill, radius=5, stroke=None, stroke_width=1):
+    def _draw_dot(self, ctx, x, y, fill, radius=5, stroke=None, stroke_width=1):
         if stroke is None:
             stroke_parameter = ""
         else:
             stroke_parameter = f'stroke="{stroke}" stroke-width="{stroke_width}"'
-        self.most_extreme_dimensions["left"] = min(
-            self.most_extreme_dimensions["left"], x - radius
+        ctx.most_extreme_dimensions["left"] = min(
+            ctx.most_extreme_dimensions["left"], x - radius
         )
-        self.most_extreme_dimensions["right"] = max(
-            self.most_extreme_dimensions["right"], x + radius
+        ctx.most_extreme_dimensions["right"] = max(
+            ctx.most_extreme_dimensions["right"], x + radius
         )
-        self.most_extreme_dimensions["top"] = min(
-            self.most_extreme_dimensions["top"], y - radius
+        ctx.most_extreme_dimensions["top"] = min(
+            ctx.most_extreme_dimensions["top"], y - radius
         )
-        self.most_extreme_dimensions["bottom"] = max(
-            self.most_extreme_dimensions["bottom"], y + radius
+        ctx.most_extreme_dimensions["bottom"] = max(
+            ctx.most_extreme_dimensions["bottom"], y + radius
         )
         return f'<circle cx="{x}" cy="{y}" r="{radius}" fill="{fill}" {stroke_parameter} />'
 
-    def _draw_line(self, x1, y1, x2, y2, stroke="black", stroke_width="1"):
-        self.most_extreme_dimensions["left"] = min(
-            self.most_extreme_dimensions["left"], x1, x2
+    def _draw_line(self, ctx, x1, y1, x2, y2, stroke="black", stroke_width="1"):
+        ctx.most_extreme_dimensions["left"] = min(
+            ctx.most_extreme_dimensions["left"], x1, x2
         )
-        self.most_extreme_dimensions["right"] = max(
-            self.most_extreme_dimensions["right"], x1, x2
+        ctx.most_extreme_dimensions["right"] = max(
+            ctx.most_extreme_dimensions["right"], x1, x2
         )
-        self.most_extreme_dimensions["top"] = min(
-            self.most_extreme_dimensions["top"], y1, y2
+        ctx.most_extreme_dimensions["top"] = min(
+            ctx.most_extreme_dimensions["top"], y1, y2
         )
-        self.most_extreme_dimensions["bottom"] = max(
-            self.most_extreme_dimensions["bottom"], y1, y2
+        ctx.most_extreme_dimensions["bottom"] = max(
+            ctx.most_extreme_dimensions["bottom"], y1, y2
         )
         return f'<line x1="{x1}" y1="{y1}" x2="{x2}" y2="{y2}" stroke="{stroke}" stroke-width="{stroke_width}" />'
 
@@ -323,6 +975,7 @@ class CategoricalGraph(BaseGraph):
 
             path_data += f" M {current_path[0][0]} {current_path[0][1]}"
             if len(current_path) == 1:
+                current_path = []
                 return  # Only one point, nothing more to draw
 
             if curvature == 0:
@@ -409,12 +1062,153 @@ class CategoricalGraph(BaseGraph):
         path_data = self._make_dot_path(dots, radius)
         return f'<path d="{path_data}" fill="{fill}" />'
 
-    def render(self):
-        self._reset_graph()
-        self.line_paths = {}
-        self.bar_paths = {}
-        self.dot_paths = {}
-        graph_width = self.width
+    def _cull_bar(self, ctx, bar):
+        """
+        Clip a bar to the plot area. Returns None for bars that are off the
+        scale or less than MIN_VISIBLE_SIZE tall, and the bar itself if it is
+        entirely visible.
+        """
+        x, y, width, height = bar
+        top, bottom = min(y, y + height), max(y, y + height)
+        if bottom - top < MIN_VISIBLE_SIZE:
+            ctx.stats["culled_bars"] += 1
+            return None
+        if top >= -MIN_VISIBLE_SIZE and bottom <= self.height + MIN_VISIBLE_SIZE:
+            return bar
+        top, bottom = max(top, 0), min(bottom, self.height)
+        if bottom - top < MIN_VISIBLE_SIZE:
+            ctx.stats["culled_bars"] += 1
+            return None
+        ctx.stats["clipped_bars"] += 1
+        if height >= 0:
+            return (x, top, width, bottom - top)
+        return (x, bottom, width, top - bottom)
+
+    def _dot_visible(self, ctx, x, y, dots, radius=5):
+        # Dots entirely off the plot area, or within a pixel of the last dot
+        # drawn for the series, can't be seen
+        if not (
+            -radius < x < self.width + radius and -radius < y < self.height + radius
+        ) or (
+            dots
+            and abs(dots[-1][0] - x) < MIN_VISIBLE_SIZE
+            and abs(dots[-1][1] - y) < MIN_VISIBLE_SIZE
+        ):
+            ctx.stats["culled_dots"] += 1
+            return False
+        return True
+
+    def _place_value_labels(self, ctx, labels):
+        """
+        Choose where to draw the (series index, value, x, y) print_values
+        labels. With avoid_value_overlap, each series' largest and smallest
+        value and its last point are placed first, then the others in order.
+        A label that would overlap one already placed is nudged up by its
+        height, or left out if it still overlaps. Placed boxes are kept in a
+        LabelGrid, so this stays near-linear in the number of labels. Returns
+        the (value, x, y) of the labels to draw, in their original order.
+        """
+        if not self.avoid_value_overlap or len(labels) < 2:
+            return [label[1:] for label in labels]
+
+        important = set()
+        extremes = {}
+        for order, (index, value, _, _) in enumerate(labels):
+            lowest, highest, _ = extremes.get(index, (order, order, order))
+            if value < labels[lowest][1]:
+                lowest = order
+            if value > labels[highest][1]:
+                highest = order
+            extremes[index] = (lowest, highest, order)
+        for orders in extremes.values():
+            important.update(orders)
+
+        grid = LabelGrid()
+        placed = {}
+        for order in sorted(
+            range(len(labels)), key=lambda order: order not in important
+        ):
+            _, value, x, y = labels[order]
+            text = (
+                human_readable_number(value)
+                if isinstance(value, (int, float))
+                else str(value)
+            )
+            width, height = estimate_text_dimensions(
+                text, 10, self.font_width_estimate_multiplier
+            )
+            for nudge in (0, height):
+                box = (
+                    x - width / 2,
+                    y - nudge - height / 2,
+                    x + width / 2,
+                    y - nudge + height / 2,
+                )
+                if not grid.collides(box):
+                    grid.add(box)
+                    placed[order] = (value, x, y - nudge)
+                    if nudge:
+                        ctx.stats["nudged_labels"] += 1
+                    break
+            else:
+                ctx.stats["culled_labels"] += 1
+        return [placed[order] for order in sorted(placed)]
+
+    def _visible_x_labels(
+        self, bar_spacing, total_bars_width, bar_width, bar_series_across
+    ):
+        """
+        The (index, label) pairs of the x labels to draw. With thin_x_labels,
+        labels that would overlap their neighbours are left out: each label's
+        extent along the axis (its height when rotated) is measured once and
+        thin_labels picks the ones to keep in one pass.
+        """
+        labels = [
+            (index, label)
+            for index, label in enumerate(self.x_labels)
+            if label is not None
+        ]
+        if not self.thin_x_labels or len(labels) <= 2:
+            return labels
+
+        offset = (bar_spacing - total_bars_width) / 2 + bar_width * (
+            bar_series_across - 1
+        ) / 2
+        positions = [(index + 0.5) * bar_spacing + offset for index, _ in labels]
+        extents = []
+        for _, label in labels:
+            text = (
+                human_readable_number(label)
+                if isinstance(label, (int, float))
+                else str(label)
+            )
+            if self.rotate_x_labels:
+                extents.append((text.count("\n") + 1) * 10 * 1.2)
+            else:
+                extents.append(
+                    estimate_text_dimensions(
+                        text, 10, self.font_width_estimate_multiplier
+                    )[0]
+                )
+        priority = []
+        if self.x_label_priority:
+            ranks = {label: rank for rank, label in enumerate(self.x_label_priority)}
+            priority = sorted(
+                (
+                    position
+                    for position, (_, label) in enumerate(labels)
+                    if label in ranks
+                ),
+                key=lambda position: ranks[labels[position][1]],
+            )
+        return [labels[i] for i in thin_labels(positions, extents, priority)]
+
+    def _value_ranges(self):
+        """
+        The (min, max) of the primary axis followed by that of the secondary
+        axis (None, None without secondary series), widened to scale_min and
+        scale_max, before they are rounded out to ticks.
+        """
         has_secondary = any(self.secondary)
         max_value_secondary = None
         min_value_secondary = None
@@ -433,6 +1227,7 @@ class CategoricalGraph(BaseGraph):
                 self.secondary,
                 self.scale_max,
                 self.scale_min,
+                self._stacked_sums(False),
             )
             if has_secondary:
                 min_value_secondary, max_value_secondary = stacked_bar_range(
@@ -441,6 +1236,7 @@ class CategoricalGraph(BaseGraph):
                     [not sec for sec in self.secondary],
                     self.secondary_scale_max,
                     self.secondary_scale_min,
+                    self._stacked_sums(True),
                 )
         else:
             min_value_primary, max_value_primary = non_secondary_range(
@@ -453,24 +1249,26 @@ class CategoricalGraph(BaseGraph):
                     self.secondary_scale_max,
                     self.secondary_scale_min,
                 )
-
-        primary_ticks = calculate_ticks(
+        return (
             min_value_primary,
             max_value_primary,
-            include_zero=True,
-            target_tick_count=self.num_y_ticks,
+            min_value_secondary,
+            max_value_secondary,
         )
 
-        if has_secondary:
-            secondary_ticks = calculate_ticks(
-                min_value_secondary,
-                max_value_secondary,
-                include_zero=True,
-                target_tick_count=self.num_y_ticks,
-            )
-
-            primary_ticks, secondary_ticks = match_ticks(primary_ticks, secondary_ticks)
+    def _render(self, ctx):
+        for counter in CULL_STATS:
+            ctx.stats.setdefault(counter, 0)
+        line_paths = {}
+        bar_paths = {}
+        dot_paths = {}
+        graph_width = self.width
+        has_secondary = any(self.secondary)
+        primary_ticks, secondary_ticks = self._shared_ticks or axis_ticks(
+            self._value_ranges(), self.num_y_ticks
+        )
 
+        if has_secondary:
             adjusted_max_value_secondary = secondary_ticks[-1]
             adjusted_min_value_secondary = secondary_ticks[0]
 
@@ -513,126 +1311,153 @@ class CategoricalGraph(BaseGraph):
         total_bars_width = bar_series_across * bar_width
 
         num_categories = len(self.data[0])
-        num_series = len(self.data)
-        positive_bar_heights = [0] * num_categories
-        negative_bar_heights = [0] * num_categories
-
-        for sub_index in range(num_categories):
-            bar_count = 0
-            for index in range(num_series):
-                value = self.data[index][sub_index]
-
-                secondary_value = self.secondary[index]
-
-                series_type, print_values = self.series_types[index]
-
-                if value is None:
-                    if series_type == "line":
-                        if index not in self.line_paths:
-                            self.line_paths[index] = []
-                        self.line_paths[index].append(None)
+        positive_bar_heights = {}
+        negative_bar_heights = {}
+        if num_categories:
+            for index, (series_type, _) in enumerate(self.series_types):
+                if series_type == "line":
+                    line_paths[index] = []
+        # Category of the last point of each line, to break lines at gaps
+        last_line_point = {}
+        # (series index, value, x, y) of the print_values labels to place
+        value_labels = []
+
+        # Visit only the values that are present, category by category and
+        # in series order within a category
+        current_category = None
+        for sub_index, index, value in heapq.merge(
+            *(
+                present_values(values, index, num_categories)
+                for index, values in enumerate(self.data)
+            )
+        ):
+            if sub_index != current_category:
+                current_category = sub_index
+                bar_count = 0
+            secondary_value = self.secondary[index]
 
-                    continue
+            series_type, print_values = self.series_types[index]
 
-                if series_type == "dot" or series_type == "line" or self.stacked:
-                    x = (0.5 + sub_index) * bar_spacing + (bar_spacing - bar_width) / 2
+            if series_type == "dot" or series_type == "line" or self.stacked:
+                x = (0.5 + sub_index) * bar_spacing + (bar_spacing - bar_width) / 2
+            else:
+                # Calculate the starting x-position of the bars in each category
+                start_x = (0.5 + sub_index) * bar_spacing + (
+                    bar_spacing - total_bars_width
+                ) / 2
+                x = (
+                    start_x + bar_count * bar_width - bar_width / 2
+                )  # Adjusting by half of the bar width
+                bar_count += 1
+            scale = scale_secondary if secondary_value else scale_primary
+            min_value = (
+                adjusted_min_value_secondary
+                if secondary_value
+                else adjusted_min_value_primary
+            )
+            y = self.height - (value - min_value) * scale
+
+            if series_type == "bar" and self.stacked:
+                bar_height = value * scale
+                x -= bar_width / 2
+                if value >= 0:
+                    y -= positive_bar_heights.get(sub_index, 0)
+                    positive_bar_heights[sub_index] = (
+                        positive_bar_heights.get(sub_index, 0) + bar_height
+                    )
                 else:
-                    # Calculate the starting x-position of the bars in each category
-                    start_x = (0.5 + sub_index) * bar_spacing + (
-                        bar_spacing - total_bars_width
-                    ) / 2
-                    x = (
-                        start_x + bar_count * bar_width - bar_width / 2
-                    )  # Adjusting by half of the bar width
-                    bar_count += 1
-                scale = scale_secondary if secondary_value else scale_primary
-                min_value = (
-                    adjusted_min_value_secondary
-                    if secondary_value
-                    else adjusted_min_value_primary
-                )
-                y = self.height - (value - min_value) * scale
-
-                if series_type == "bar" and self.stacked:
-                    bar_height = value * scale
-                    x -= bar_width / 2
-                    if value >= 0:
-                        y -= positive_bar_heights[sub_index]
-                        positive_bar_heights[sub_index] += bar_height
-                    else:
-                        y -= negative_bar_heights[sub_index]
-                        negative_bar_heights[sub_index] += bar_height
-                    if index not in self.bar_paths:
-                        self.bar_paths[index] = []
-                    self.bar_paths[index].append((x, y, bar_width, bar_height))
-
-                    # This is how we would draw bars individually
-                    # self.svg_elements.append(
-                    #     self._draw_bar(x, y, bar_width, bar_height, self.colors[index])
-                    # )
-
-                elif series_type == "bar":
-                    bar_height = value * scale
-                    if index not in self.bar_paths:
-                        self.bar_paths[index] = []
-                    self.bar_paths[index].append((x, y, bar_width, bar_height))
-
-                    # self.svg_elements.append(
-                    #     self._draw_bar(
-                    #         x,
-                    #         y,
-                    #         bar_width,
-                    #         value * scale,
-                    #         self.colors[index],
-                    #     )
-                    # )
-
-                elif series_type == "dot":
-                    center_x = (
-                        (sub_index + 0.5) * bar_spacing
-                        + (bar_spacing - total_bars_width) / 2
-                        + bar_width * (bar_series_across - 1) / 2
+                    y -= negative_bar_heights.get(sub_index, 0)
+                    negative_bar_heights[sub_index] = (
+                        negative_bar_heights.get(sub_index, 0) + bar_height
                     )
-                    if index not in self.dot_paths:
-                        self.dot_paths[index] = []
-                    self.dot_paths[index].append((center_x, y))
-
-                    # self.svg_elements.append(
-                    #     self._draw_dot(
-                    #         center_x,
-                    #         y,
-                    #         radius=5,
-                    #         fill=self.colors[index],
-                    #     )
-                    # )
-
+                bar = (x, y, bar_width, bar_height)
+                if self.cull_invisible:
+                    bar = self._cull_bar(ctx, bar)
+                if bar is not None:
+                    bar_paths.setdefault(index, []).append(bar)
+
+                # This is how we would draw bars individually
+                # ctx.svg_elements.append(
+                #     self._draw_bar(x, y, bar_width, bar_height, self.colors[index])
+                # )
+
+            elif series_type == "bar":
+                bar_height = value * scale
+                bar = (x, y, bar_width, bar_height)
+                if self.cull_invisible:
+                    bar = self._cull_bar(ctx, bar)
+                if bar is not None:
+                    bar_paths.setdefault(index, []).append(bar)
+
+                # ctx.svg_elements.append(
+                #     self._draw_bar(
+                #         x,
+                #         y,
+                #         bar_width,
+                #         value * scale,
+                #         self.colors[index],
+                #     )
+                # )
+
+            elif series_type == "dot":
+                center_x = (
+                    (sub_index + 0.5) * bar_spacing
+                    + (bar_spacing - total_bars_width) / 2
+                    + bar_width * (bar_series_across - 1) / 2
+                )
+                dots = dot_paths.setdefault(index, [])
+                if not self.cull_invisible or self._dot_visible(ctx, center_x, y, dots):
+                    dots.append((center_x, y))
+
+                # ctx.svg_elements.append(
+                #     self._draw_dot(ctx,
+                #         center_x,
+                #         y,
+                #         radius=5,
+                #         fill=self.colors[index],
+                #     )
+                # )
+
+            elif series_type == "line":
+                if sub_index - last_line_point.get(index, -1) > 1:
+                    line_paths[index].append(None)
+                last_line_point[index] = sub_index
+                line_paths[index].append((x, y))
+
+            if (
+                print_values
+                and self.cull_invisible
+                and not -MIN_VISIBLE_SIZE <= y <= self.height + MIN_VISIBLE_SIZE
+            ):
+                # The value is off the scale, so its label would be too
+                ctx.stats["culled_labels"] += 1
+            elif print_values:
+                if series_type == "dot":
+                    value_x = center_x
                 elif series_type == "line":
-                    if index not in self.line_paths:
-                        self.line_paths[index] = []
-                    self.line_paths[index].append((x, y))
-
-                if print_values:
-                    if series_type == "dot":
-                        value_x = center_x
-                    elif series_type == "line":
-                        value_x = x
-                    else:
-                        value_x = x + bar_width / 2
+                    value_x = x
+                else:
+                    value_x = x + bar_width / 2
 
-                    value_y = y - 5 if series_type == "bar" else y - 10
-                    self.svg_elements.append(
-                        self._generate_text(
-                            value, value_x, value_y, fill=self.text_color
-                        )
-                    )
+                value_y = y - 5 if series_type == "bar" else y - 10
+                value_labels.append((index, value, value_x, value_y))
+
+        for value, value_x, value_y in self._place_value_labels(ctx, value_labels):
+            ctx.svg_elements.append(
+                self._generate_text(ctx, value, value_x, value_y, fill=self.text_color)
+            )
 
         # Draw bars
-        for index, bars in self.bar_paths.items():
-            self.svg_elements.append(self._draw_bar_path(bars, self.colors[index]))
+        for index, bars in bar_paths.items():
+            ctx.svg_elements.append(self._draw_bar_path(bars, self.colors[index]))
 
         # Draw paths
-        for index, points in self.line_paths.items():
-            self.svg_elements.append(
+        for index, points in line_paths.items():
+            if self.cull_invisible and self.line_curvature == 0:
+                # Curves can't be cut exactly, so only straight lines are clipped
+                points, clipped = clip_polyline(points, self.width, self.height)
+                ctx.stats["clipped_lines"] += clipped
+            ctx.svg_elements.append(
                 self._draw_line_path(
                     points,
                     stroke=self.colors[index],
@@ -642,8 +1467,11 @@ class CategoricalGraph(BaseGraph):
             )
 
         # Draw dots
-        for index, dots in self.dot_paths.items():
-            self.svg_elements.append(self._draw_dot_path(dots, fill=self.colors[index]))
+        for index, dots in dot_paths.items():
+            if dots:
+                ctx.svg_elements.append(
+                    self._draw_dot_path(dots, fill=self.colors[index])
+                )
 
         # Draw horizontal lines
         for (
@@ -655,7 +1483,10 @@ class CategoricalGraph(BaseGraph):
             label_y_position,
         ) in self.horizontal_lines:
             y_svg = self.height - (y - adjusted_min_value_primary) * scale_primary
-            self.svg_elements.append(
+            if self.cull_invisible and not 0 <= y_svg <= self.height:
+                ctx.stats["culled_reference_lines"] += 1
+                continue
+            ctx.svg_elements.append(
                 f'<line x1="0" y1="{y_svg}" x2="{self.width}" y2="{y_svg}" stroke="{color}" stroke-width="{stroke_width}" />'
             )
             if label:
@@ -679,8 +1510,9 @@ class CategoricalGraph(BaseGraph):
                     y_svg - padding if label_y_position == "top" else y_svg + padding
                 )
 
-                self.svg_elements.append(
+                ctx.svg_elements.append(
                     self._generate_text(
+                        ctx,
                         label,
                         x,
                         text_y,
@@ -705,7 +1537,10 @@ class CategoricalGraph(BaseGraph):
                 + (bar_spacing - total_bars_width) / 2
                 + bar_width * (bar_series_across - 1) / 2
             )
-            self.svg_elements.append(
+            if self.cull_invisible and not 0 <= x_svg <= self.width:
+                ctx.stats["culled_reference_lines"] += 1
+                continue
+            ctx.svg_elements.append(
                 f'<line x1="{x_svg}" y1="0" x2="{x_svg}" y2="{self.height}" stroke="{color}" stroke-width="{stroke_width}" />'
             )
             if label:
@@ -732,8 +1567,9 @@ class CategoricalGraph(BaseGraph):
                     rotation = 90 if label_x_position == "right" else -90
 
                     # Apply rotation and adjustments
-                    self.svg_elements.append(
+                    ctx.svg_elements.append(
                         self._generate_text(
+                            ctx,
                             label,
                             x,
                             y,
@@ -753,8 +1589,9 @@ class CategoricalGraph(BaseGraph):
                         else "hanging" if label_y_position == "top" else "baseline"
                     )
 
-                    self.svg_elements.append(
+                    ctx.svg_elements.append(
                         self._generate_text(
+                            ctx,
                             label,
                             x,
                             y,
@@ -765,11 +1602,12 @@ class CategoricalGraph(BaseGraph):
                     )
 
         # Draw axis
-        self.svg_elements.append(
+        ctx.sections["frame"] = len(ctx.svg_elements)
+        ctx.svg_elements.append(
             f'<line x1="0" y1="0" x2="0" y2="{self.height}" stroke="{self.text_color}" stroke-width="1" />'
         )
         zero_line_y = self.height + adjusted_min_value_primary * scale_primary
-        self.svg_elements.append(
+        ctx.svg_elements.append(
             f'<line x1="0" y1="{zero_line_y}" '
             + f'x2="{self.width}" y2="{zero_line_y}" '
             + f'stroke="{self.text_color}" stroke-width="1" />'
@@ -777,7 +1615,7 @@ class CategoricalGraph(BaseGraph):
 
         # Draw secondary y-axis if needed
         if has_secondary:
-            self.svg_elements.append(
+            ctx.svg_elements.append(
                 f'<line x1="{self.width}" y1="0" x2="{self.width}" y2="{self.height}" stroke="{self.text_color}" stroke-width="1" />'
             )
             secondary_zero_line_y = (
@@ -788,7 +1626,9 @@ class CategoricalGraph(BaseGraph):
             ), f"Secondary y-axis not aligned with primary y-axis: {secondary_zero_line_y} != {zero_line_y}"
 
         # Draw x tick labels
-        for index, label in enumerate(self.x_labels):
+        for index, label in self._visible_x_labels(
+            bar_spacing, total_bars_width, bar_width, bar_series_across
+        ):
             x = (
                 (index + 0.5) * bar_spacing
                 + (bar_spacing - total_bars_width) / 2
@@ -796,14 +1636,20 @@ class CategoricalGraph(BaseGraph):
             )
             y = self.height + 5
             if label is not None and self.rotate_x_labels:
-                self.svg_elements.append(
+                ctx.svg_elements.append(
                     self._generate_text(
-                        label, x, y, anchor="end", fill=self.text_color, rotation=-90
+                        ctx,
+                        label,
+                        x,
+                        y,
+                        anchor="end",
+                        fill=self.text_color,
+                        rotation=-90,
                     )
                 )
             elif label is not None and not self.rotate_x_labels:
-                self.svg_elements.append(
-                    self._generate_text(label, x, y + 10, fill=self.text_color)
+                ctx.svg_elements.append(
+                    self._generate_text(ctx, label, x, y + 10, fill=self.text_color)
                 )
 
         # Draw primary y-axis ticks and values
@@ -817,8 +1663,9 @@ class CategoricalGraph(BaseGraph):
                 + self.primary_tick_suffix
             )
 
-            self.svg_elements.append(
+            ctx.svg_elements.append(
                 self._generate_text(
+                    ctx,
                     tick_label,
                     -5,
                     tick_y + 3,
@@ -827,7 +1674,7 @@ class CategoricalGraph(BaseGraph):
                     dominant_baseline="text-bottom",
                 )
             )
-            self.svg_elements.append(
+            ctx.svg_elements.append(
                 f'<line x1="0" y1="{tick_y}" x2="-3" y2="{tick_y}" stroke="{self.text_color}" stroke-width="1" />'
             )
 
@@ -844,8 +1691,9 @@ class CategoricalGraph(BaseGraph):
                     + self.secondary_tick_suffix
                 )
 
-                self.svg_elements.append(
+                ctx.svg_elements.append(
                     self._generate_text(
+                        ctx,
                         tick_label,
                         self.width + 5,
                         tick_y + 3,
@@ -854,7 +1702,7 @@ class CategoricalGraph(BaseGraph):
                         dominant_baseline="text-bottom",
                     )
                 )
-                self.svg_elements.append(
+                ctx.svg_elements.append(
                     f'<line x1="{self.width}" y1="{tick_y}" x2="{self.width + 3}" y2="{tick_y}" stroke="{self.text_color}" stroke-width="1" />'
                 )
 
@@ -862,11 +1710,12 @@ class CategoricalGraph(BaseGraph):
         if self.x_axis_label:
             x_label_x = (self.width) / 2
             x_label_y = (
-                max(self.height, self.most_extreme_dimensions["bottom"])
+                max(self.height, ctx.most_extreme_dimensions["bottom"])
                 + 1.5 * self.element_spacing
             )
-            self.svg_elements.append(
+            ctx.svg_elements.append(
                 self._generate_text(
+                    ctx,
                     self.x_axis_label,
                     x_label_x,
                     x_label_y,
@@ -877,11 +1726,12 @@ class CategoricalGraph(BaseGraph):
 
         if self.primary_y_axis_label:
             y_label_x = (
-                min(0, self.most_extreme_dimensions["left"]) - self.element_spacing
+                min(0, ctx.most_extreme_dimensions["left"]) - self.element_spacing
             )
             y_label_y = (self.height) / 2
-            self.svg_elements.append(
+            ctx.svg_elements.append(
                 self._generate_text(
+                    ctx,
                     self.primary_y_axis_label,
                     y_label_x,
                     y_label_y,
@@ -893,12 +1743,13 @@ class CategoricalGraph(BaseGraph):
 
         if any(self.secondary) and self.secondary_y_axis_label:
             sec_y_label_x = (
-                max(self.width, self.most_extreme_dimensions["right"])
+                max(self.width, ctx.most_extreme_dimensions["right"])
                 + self.element_spacing
             )
             sec_y_label_y = self.height / 2
-            self.svg_elements.append(
+            ctx.svg_elements.append(
                 self._generate_text(
+                    ctx,
                     self.secondary_y_axis_label,
                     sec_y_label_x,
                     sec_y_label_y,
@@ -909,11 +1760,12 @@ class CategoricalGraph(BaseGraph):
             )
 
         # Draw legend
+        ctx.sections["legend"] = len(ctx.svg_elements)
         if self.show_legend:
             legend_rect_size = 10
             if self.legend_position == "right":
                 legend_x = (
-                    max(self.width, self.most_extreme_dimensions["right"])
+                    max(self.width, ctx.most_extreme_dimensions["right"])
                     + self.element_spacing
                 )
                 legend_y = 0
@@ -922,8 +1774,9 @@ class CategoricalGraph(BaseGraph):
                     if label is not None:
                         series_type, _ = self.series_types[index]
                         if series_type == "dot":
-                            self.svg_elements.append(
+                            ctx.svg_elements.append(
                                 self._draw_dot(
+                                    ctx,
                                     legend_x + legend_rect_size / 2,
                                     legend_y + legend_rect_size / 2,
                                     radius=5,
@@ -931,8 +1784,9 @@ class CategoricalGraph(BaseGraph):
                                 )
                             )
                         elif series_type == "line":
-                            self.svg_elements.append(
+                            ctx.svg_elements.append(
                                 self._draw_line(
+                                    ctx,
                                     legend_x,
                                     legend_y + legend_rect_size / 2,
                                     legend_x + legend_rect_size,
@@ -942,12 +1796,13 @@ class CategoricalGraph(BaseGraph):
                                 )
                             )
                         else:  # series_type == "bar"
-                            self.svg_elements.append(
+                            ctx.svg_elements.append(
                                 f'<rect x="{legend_x}" y="{legend_y}" width="{legend_rect_size}" '
                                 + f'height="{legend_rect_size}" fill="{self.colors[index]}" />'
                             )
-                        self.svg_elements.append(
+                        ctx.svg_elements.append(
                             self._generate_text(
+                                ctx,
                                 label,
                                 legend_x + legend_rect_size + self.element_spacing / 2,
                                 legend_y + (2 / 3) * legend_rect_size,
@@ -959,7 +1814,7 @@ class CategoricalGraph(BaseGraph):
                         if legend_y + legend_rect_size > self.height:
                             legend_y = 0
                             legend_x = (
-                                max(self.width, self.most_extreme_dimensions["right"])
+                                max(self.width, ctx.most_extreme_dimensions["right"])
                                 + (2 * self.element_spacing) / 3
                             )
 
@@ -974,7 +1829,7 @@ class CategoricalGraph(BaseGraph):
                 )[0]
 
                 legend_x = (
-                    min(0, self.most_extreme_dimensions["left"])
+                    min(0, ctx.most_extreme_dimensions["left"])
                     - self.element_spacing
                     - max_legend_label_width
                     - legend_rect_size
@@ -985,8 +1840,9 @@ class CategoricalGraph(BaseGraph):
                     if label is not None:
                         series_type, _ = self.series_types[index]
                         if series_type == "dot":
-                            self.svg_elements.append(
+                            ctx.svg_elements.append(
                                 self._draw_dot(
+                                    ctx,
                                     legend_x + legend_rect_size / 2,
                                     legend_y + legend_rect_size / 2,
                                     radius=5,
@@ -994,8 +1850,9 @@ class CategoricalGraph(BaseGraph):
                                 )
                             )
                         elif series_type == "line":
-                            self.svg_elements.append(
+                            ctx.svg_elements.append(
                                 self._draw_line(
+                                    ctx,
                                     legend_x,
                                     legend_y + legend_rect_size / 2,
                                     legend_x + legend_rect_size,
@@ -1005,16 +1862,17 @@ class CategoricalGraph(BaseGraph):
                                 )
                             )
                         else:  # series_type == "bar"
-                            self.most_extreme_dimensions["left"] = min(
-                                self.most_extreme_dimensions["left"],
+                            ctx.most_extreme_dimensions["left"] = min(
+                                ctx.most_extreme_dimensions["left"],
                                 legend_x,
                             )
-                            self.svg_elements.append(
+                            ctx.svg_elements.append(
                                 f'<rect x="{legend_x}" y="{legend_y}" width="{legend_rect_size}" '
                                 + f'height="{legend_rect_size}" fill="{self.colors[index]}" />'
                             )
-                        self.svg_elements.append(
+                        ctx.svg_elements.append(
                             self._generate_text(
+                                ctx,
                                 label,
                                 legend_x + legend_rect_size + self.element_spacing / 2,
                                 legend_y + (2 / 3) * legend_rect_size,
@@ -1026,7 +1884,7 @@ class CategoricalGraph(BaseGraph):
                         if legend_y + legend_rect_size > self.height:
                             legend_y = 0
                             legend_x = (
-                                min(0, self.most_extreme_dimensions["left"])
+                                min(0, ctx.most_extreme_dimensions["left"])
                                 - (2 * self.element_spacing) / 3
                                 - max_legend_label_width
                                 - legend_rect_size
@@ -1035,7 +1893,7 @@ class CategoricalGraph(BaseGraph):
             elif self.legend_position == "top":
                 legend_x = 0
                 legend_y = (
-                    min(0, self.most_extreme_dimensions["top"])
+                    min(0, ctx.most_extreme_dimensions["top"])
                     - self.element_spacing
                     - legend_rect_size
                 )
@@ -1044,8 +1902,9 @@ class CategoricalGraph(BaseGraph):
                     if label is not None:
                         series_type, _ = self.series_types[index]
                         if series_type == "dot":
-                            self.svg_elements.append(
+                            ctx.svg_elements.append(
                                 self._draw_dot(
+                                    ctx,
                                     legend_x + legend_rect_size / 2,
                                     legend_y + legend_rect_size / 2,
                                     radius=5,
@@ -1053,8 +1912,9 @@ class CategoricalGraph(BaseGraph):
                                 )
                             )
                         elif series_type == "line":
-                            self.svg_elements.append(
+                            ctx.svg_elements.append(
                                 self._draw_line(
+                                    ctx,
                                     legend_x,
                                     legend_y + legend_rect_size / 2,
                                     legend_x + legend_rect_size,
@@ -1064,16 +1924,17 @@ class CategoricalGraph(BaseGraph):
                                 )
                             )
                         else:  # series_type == "bar"
-                            self.most_extreme_dimensions["top"] = min(
-                                self.most_extreme_dimensions["top"],
+                            ctx.most_extreme_dimensions["top"] = min(
+                                ctx.most_extreme_dimensions["top"],
                                 legend_y,
                             )
-                            self.svg_elements.append(
+                            ctx.svg_elements.append(
                                 f'<rect x="{legend_x}" y="{legend_y}" width="{legend_rect_size}" '
                                 + f'height="{legend_rect_size}" fill="{self.colors[index]}" />'
                             )
-                        self.svg_elements.append(
+                        ctx.svg_elements.append(
                             self._generate_text(
+                                ctx,
                                 label,
                                 legend_x + legend_rect_size + self.element_spacing / 2,
                                 legend_y + (2 / 3) * legend_rect_size,
@@ -1109,7 +1970,7 @@ class CategoricalGraph(BaseGraph):
                             > self.width
                         ):
                             legend_y = (
-                                min(0, self.most_extreme_dimensions["top"])
+                                min(0, ctx.most_extreme_dimensions["top"])
                                 - self.element_spacing
                                 - legend_rect_size
                             )
@@ -1118,7 +1979,7 @@ class CategoricalGraph(BaseGraph):
             elif self.legend_position == "bottom":
                 legend_x = 0
                 legend_y = (
-                    max(self.height, self.most_extreme_dimensions["bottom"])
+                    max(self.height, ctx.most_extreme_dimensions["bottom"])
                     + self.element_spacing
                 )
 
@@ -1126,8 +1987,9 @@ class CategoricalGraph(BaseGraph):
                     if label is not None:
                         series_type, _ = self.series_types[index]
                         if series_type == "dot":
-                            self.svg_elements.append(
+                            ctx.svg_elements.append(
                                 self._draw_dot(
+                                    ctx,
                                     legend_x + legend_rect_size / 2,
                                     legend_y + legend_rect_size / 2,
                                     radius=5,
@@ -1135,8 +1997,9 @@ class CategoricalGraph(BaseGraph):
                                 )
                             )
                         elif series_type == "line":
-                            self.svg_elements.append(
+                            ctx.svg_elements.append(
                                 self._draw_line(
+                                    ctx,
                                     legend_x,
                                     legend_y + legend_rect_size / 2,
                                     legend_x + legend_rect_size,
@@ -1146,16 +2009,17 @@ class CategoricalGraph(BaseGraph):
                                 )
                             )
                         else:  # series_type == "bar"
-                            self.most_extreme_dimensions["bottom"] = max(
-                                self.most_extreme_dimensions["bottom"],
+                            ctx.most_extreme_dimensions["bottom"] = max(
+                                ctx.most_extreme_dimensions["bottom"],
                                 legend_y + legend_rect_size,
                             )
-                            self.svg_elements.append(
+                            ctx.svg_elements.append(
                                 f'<rect x="{legend_x}" y="{legend_y}" width="{legend_rect_size}" '
                                 + f'height="{legend_rect_size}" fill="{self.colors[index]}" />'
                             )
-                        self.svg_elements.append(
+                        ctx.svg_elements.append(
                             self._generate_text(
+                                ctx,
                                 label,
                                 legend_x + legend_rect_size + self.element_spacing / 2,
                                 legend_y + (2 / 3) * legend_rect_size,
@@ -1191,7 +2055,7 @@ class CategoricalGraph(BaseGraph):
                             > self.width
                         ):
                             legend_y = (
-                                max(self.height, self.most_extreme_dimensions["bottom"])
+                                max(self.height, ctx.most_extreme_dimensions["bottom"])
                                 + self.element_spacing
                             )
                             legend_x = 0
@@ -1201,5 +2065,3 @@ class CategoricalGraph(BaseGraph):
                     f"Invalid legend position: {self.legend_position}. "
                     + "Must be 'right', 'left', 'top', or 'bottom'."
                 )
-
-        return self._generate_svg()
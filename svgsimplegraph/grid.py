@@ -0,0 +1,261 @@
+from .base import RenderContext
+from .base import SPEC_VERSION
+from .base import check_spec
+from .base import spec_options
+from .base import render_in_executor
+from .categorical import CategoricalGraph
+from .categorical import axis_ticks
+from .utils import svg_to_base64_src
+import math
+import zlib
+
+
+def shared_range(ranges):
+    # The (min, max) covering all the (min, max) pairs that aren't empty
+    lows = [low for low, _ in ranges if low is not None]
+    highs = [high for _, high in ranges if high is not None]
+    if not lows:
+        return (None, None)
+    return (min(lows), max(highs))
+
+
+class GraphGrid:
+    """
+    The graphs generated by this class lay out CategoricalGraph objects as
+    small multiples: a grid of panels in one SVG that share the same y-axis
+    scales and x labels, so they can be compared at a glance. The axes, ticks
+    and labels are written once and reused by every panel that looks the same,
+    and the legend is drawn once for the whole grid.
+    """
+
+    def __init__(self, columns=3, title=None, title_font_size=20, label_font_size=12):
+        assert columns >= 1, f"Invalid columns: {columns}"
+        self.graphs = []
+        self.labels = []
+        self.columns = columns
+        self.title = title
+        self.title_font_size = title_font_size
+        self.label_font_size = label_font_size
+
+    def add_graph(self, graph: CategoricalGraph, label: str = None):
+        # Enforce type hint
+        if not isinstance(graph, CategoricalGraph):
+            raise TypeError("Expected 'graph' to be an instance of CategoricalGraph.")
+
+        self.graphs.append(graph)
+        self.labels.append(graph.title if label is None else label)
+
+    def to_spec(self):
+        return {
+            "version": SPEC_VERSION,
+            "type": "GraphGrid",
+            "options": spec_options(
+                self, ["columns", "title", "title_font_size", "label_font_size"]
+            ),
+            "graphs": [
+                {"label": label, "graph": graph.to_spec()}
+                for graph, label in zip(self.graphs, self.labels)
+            ],
+        }
+
+    @classmethod
+    def from_spec(cls, spec):
+        check_spec(spec, "GraphGrid")
+        grid = cls(**spec.get("options", {}))
+        for entry in spec.get("graphs", []):
+            grid.add_graph(
+                CategoricalGraph.from_spec(entry["graph"]), entry.get("label")
+            )
+        return grid
+
+    def panels(self):
+        """
+        Return the graphs as they are drawn in the grid: binned as they would
+        be on their own, with the x labels of the first graph that has any,
+        without a legend, and with the ticks of both axes worked out once for
+        the values of all graphs, so every panel has the same scale.
+        """
+        graphs = [graph.binned() for graph in self.graphs]
+        num_categories = {len(graph.data[0]) for graph in graphs if graph.data}
+        assert (
+            len(num_categories) <= 1
+        ), "All graphs in a grid must have the same number of categories"
+        x_labels = next((graph.x_labels for graph in graphs if len(graph.x_labels)), [])
+
+        ranges = [graph._value_ranges() for graph in graphs]
+        primary = shared_range([r[:2] for r in ranges])
+        secondary = shared_range([r[2:] for r in ranges])
+        # Panels with and without secondary series get the same primary ticks
+        ticks = axis_ticks(primary + secondary, graphs[0].num_y_ticks)
+
+        panels = []
+        for graph in graphs:
+            panel = graph._derived(graph.data, x_labels, graph.vertical_lines)
+            panel._shared_ticks = ticks
+            panel.show_legend = False
+            panels.append(panel)
+        return panels
+
+    def render(self):
+        assert self.graphs, "Add at least one graph to the grid"
+        panels = self.panels()
+        # Spacing, padding, background and styles follow the first graph
+        first_graph = panels[0]
+        element_spacing = first_graph.element_spacing
+
+        panel_contexts = []
+        frames = {}
+        for panel, label in zip(panels, self.labels):
+            panel_ctx = RenderContext(panel.width, panel.height)
+            panel._render(panel_ctx)
+            plot_dimensions = dict(panel_ctx.most_extreme_dimensions)
+
+            # Everything from the axes on is the frame, shared between panels
+            frame_start = panel_ctx.sections["frame"]
+            frame = "\n".join(
+                panel_ctx.svg_elements[frame_start : panel_ctx.sections["legend"]]
+            )
+            frames.setdefault(frame, len(frames))
+
+            labels = []
+            if label:
+                labels.append(
+                    panel._generate_text(
+                        panel_ctx,
+                        label,
+                        panel.width / 2,
+                        min(0, panel_ctx.most_extreme_dimensions["top"])
+                        - element_spacing / 2,
+                        font_size=self.label_font_size,
+                        fill=panel.text_color,
+                        anchor="middle",
+                        dominant_baseline="text-top",
+                    )
+                )
+            panel_contexts.append(
+                (
+                    panel_ctx.svg_elements[:frame_start],
+                    frame,
+                    labels,
+                    plot_dimensions,
+                    panel_ctx,
+                )
+            )
+
+        # Ids are derived from the frames, so identical grids render to
+        # identical SVG and grids with the same ids define the same frames
+        grid_id = format(zlib.crc32("\n".join(frames).encode("utf-8")), "08x")
+        frame_ids = {
+            frame: f"grid_{grid_id}_frame_{index}" for frame, index in frames.items()
+        }
+        frame_defs = [f"<g id='{frame_ids[frame]}'>{frame}</g>" for frame in frames]
+
+        # Every cell is as big as the biggest panel
+        cell = {
+            "left": min(c.most_extreme_dimensions["left"] for *_, c in panel_contexts),
+            "top": min(c.most_extreme_dimensions["top"] for *_, c in panel_contexts),
+            "right": max(
+                max(c.most_extreme_dimensions["right"], p.width)
+                for p, (*_, c) in zip(panels, panel_contexts)
+            ),
+            "bottom": max(
+                max(c.most_extreme_dimensions["bottom"], p.height)
+                for p, (*_, c) in zip(panels, panel_contexts)
+            ),
+        }
+        cell_width = cell["right"] - cell["left"] + 2 * element_spacing
+        cell_height = cell["bottom"] - cell["top"] + 2 * element_spacing
+        columns = min(self.columns, len(panels))
+        rows = math.ceil(len(panels) / columns)
+
+        ctx = RenderContext(0, 0)
+        ctx.most_extreme_dimensions = {
+            "left": cell["left"],
+            "top": cell["top"],
+            "right": (columns - 1) * cell_width + cell["right"],
+            "bottom": (rows - 1) * cell_height + cell["bottom"],
+        }
+        for index, (elements, frame, labels, *_) in enumerate(panel_contexts):
+            x_offset = (index % columns) * cell_width
+            y_offset = (index // columns) * cell_height
+            elements = elements + [f"<use href='#{frame_ids[frame]}' />"] + labels
+            ctx.svg_elements.append(
+                f"<g transform='translate({x_offset} {y_offset})'>"
+                + "\n".join(elements)
+                + "</g>"
+            )
+
+        # Draw the legend of the first graph that has one once, outside the grid
+        for index, graph in enumerate(self.graphs):
+            if graph.show_legend and any(
+                label is not None for label in graph.legend_labels
+            ):
+                panel = panels[index]
+                plot_dimensions = panel_contexts[index][3]
+                legend_panel = panel._derived(
+                    panel.data, panel.x_labels, panel.vertical_lines
+                )
+                legend_panel.show_legend = True
+                legend_ctx = RenderContext(legend_panel.width, legend_panel.height)
+                legend_panel._render(legend_ctx)
+
+                # Move the legend from beside its panel to beside the grid
+                x_offset = 0
+                y_offset = 0
+                if legend_panel.legend_position == "right":
+                    x_offset = (
+                        (columns - 1) * cell_width
+                        + cell["right"]
+                        - plot_dimensions["right"]
+                    )
+                elif legend_panel.legend_position == "left":
+                    x_offset = cell["left"] - plot_dimensions["left"]
+                elif legend_panel.legend_position == "top":
+                    y_offset = cell["top"] - plot_dimensions["top"]
+                elif legend_panel.legend_position == "bottom":
+                    y_offset = (
+                        (rows - 1) * cell_height
+                        + cell["bottom"]
+                        - plot_dimensions["bottom"]
+                    )
+                ctx.svg_elements.append(
+                    f"<g transform='translate({x_offset} {y_offset})'>"
+                    + "\n".join(
+                        legend_ctx.svg_elements[legend_ctx.sections["legend"] :]
+                    )
+                    + "</g>"
+                )
+                for side, offset, extreme in [
+                    ("left", x_offset, min),
+                    ("right", x_offset, max),
+                    ("top", y_offset, min),
+                    ("bottom", y_offset, max),
+                ]:
+                    ctx.most_extreme_dimensions[side] = extreme(
+                        ctx.most_extreme_dimensions[side],
+                        legend_ctx.most_extreme_dimensions[side] + offset,
+                    )
+                break
+
+        if self.title:
+            ctx.svg_elements.append(
+                first_graph._generate_text(
+                    ctx,
+                    self.title,
+                    ((columns - 1) * cell_width + first_graph.width) / 2,
+                    min(0, ctx.most_extreme_dimensions["top"]) - element_spacing,
+                    font_size=self.title_font_size,
+                    fill=first_graph.text_color,
+                    anchor="middle",
+                    dominant_baseline="text-top",
+                )
+            )
+
+        ctx.defs = frame_defs
+        return first_graph._assemble_svg(ctx)
+
+    async def render_async(self, executor=None, timeout=None, semaphore=None):
+        return await render_in_executor(self, executor, timeout, semaphore)
+
+    def to_base64_src(self):
+        return svg_to_base64_src(self.render())
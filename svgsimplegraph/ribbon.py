@@ -5,6 +5,109 @@ from .utils import get_adjusted_min
 from .utils import get_color
 from .utils import is_dark
 from .utils import calculate_ticks
+from .utils import hex_to_rgb
+from .utils import pack_array
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, everything works without it
+    np = None
+
+
+def _use_numpy(use_numpy):
+    if use_numpy is None:
+        return np is not None
+    assert not use_numpy or np is not None, "numpy is not installed"
+    return use_numpy
+
+
+def series_range(*series, use_numpy=None):
+    """
+    Return the (min, max) over all values of the given series without
+    concatenating them.
+    """
+    if _use_numpy(use_numpy):
+        return (
+            min(np.min(np.asarray(values)).item() for values in series),
+            max(np.max(np.asarray(values)).item() for values in series),
+        )
+    return min(min(values) for values in series), max(max(values) for values in series)
+
+
+def ribbon_geometry(
+    first, second, bar_spacing, height, min_value, scale, use_numpy=None
+):
+    """
+    Compute the x position and the two y positions of every ribbon in bulk.
+    Returns three lists of floats.
+    """
+    if _use_numpy(use_numpy):
+        first = np.asarray(first, dtype=float)
+        second = np.asarray(second, dtype=float)
+        xs = (np.arange(len(first)) + 1 / 2) * bar_spacing
+        y1s = height - (first - min_value) * scale
+        y2s = height - (second - min_value) * scale
+        return xs.tolist(), y1s.tolist(), y2s.tolist()
+
+    xs = [(index + 1 / 2) * bar_spacing for index in range(len(first))]
+    y1s = [height - (value - min_value) * scale for value in first]
+    y2s = [height - (value - min_value) * scale for value in second]
+    return xs, y1s, y2s
+
+
+def ribbon_colors(
+    values, min_color_range, max_color_range, colors, buckets=None, use_numpy=None
+):
+    """
+    Map every value of the color series onto the gradient defined by colors.
+    With buckets, the gradient is first quantized into that many colors (each
+    the middle of its bucket). Returns a list of hex colors.
+    """
+    color_range = max_color_range - min_color_range
+
+    if buckets:
+        palette = [
+            get_color((bucket + 0.5) / buckets, colors) for bucket in range(buckets)
+        ]
+        if _use_numpy(use_numpy):
+            percents = (np.asarray(values, dtype=float) - min_color_range) / color_range
+            indices = np.clip(np.trunc(percents * buckets), 0, buckets - 1).astype(int)
+            return [palette[index] for index in indices.tolist()]
+        return [
+            palette[
+                min(
+                    max(int((value - min_color_range) / color_range * buckets), 0),
+                    buckets - 1,
+                )
+            ]
+            for value in values
+        ]
+
+    if not _use_numpy(use_numpy):
+        return [
+            get_color((value - min_color_range) / color_range, colors)
+            for value in values
+        ]
+
+    # Same interpolation as get_color, done for all values at once
+    percents = (np.asarray(values, dtype=float) - min_color_range) / color_range
+    rgbs = np.array([hex_to_rgb(color) for color in colors])
+    ranges = np.array([i / (len(colors) - 1) for i in range(len(colors))])
+    lower = np.clip(
+        np.searchsorted(ranges, percents, side="right") - 1, 0, len(colors) - 2
+    )
+    t = (percents - ranges[lower]) / (ranges[lower + 1] - ranges[lower])
+    mixed = rgbs[lower] * (1 - t)[:, None] + rgbs[lower + 1] * t[:, None]
+    channels = (mixed * 255).astype(int).tolist()
+    result = []
+    for percent, (r, g, b) in zip(percents.tolist(), channels):
+        if percent <= 0:
+            result.append(colors[0])
+        elif percent >= 1:
+            result.append(colors[-1])
+        else:
+            result.append(f"#{r:02x}{g:02x}{b:02x}")
+    return result
 
 
 class RibbonGraph(BaseGraph):
@@ -13,6 +116,10 @@ class RibbonGraph(BaseGraph):
     series with a different scale is represented by a heatmap.
     """
 
+    spec_options = [
+        name for name in BaseGraph.spec_options if name != "secondary_y_axis_label"
+    ] + ["bar_width", "color_range", "num_colors", "color_buckets"]
+
     def __init__(
         self,
         width=300,
@@ -40,6 +147,8 @@ class RibbonGraph(BaseGraph):
         watermark=None,
         font_width_estimate_multiplier=1,
         num_colors=2,
+        color_buckets=None,
+        css_classes=False,
     ):
         super().__init__(
             width=width,
@@ -64,6 +173,7 @@ class RibbonGraph(BaseGraph):
             element_spacing=element_spacing,
             watermark=watermark,
             font_width_estimate_multiplier=font_width_estimate_multiplier,
+            css_classes=css_classes,
         )
         self.bar_width = bar_width
         self.x_labels = []
@@ -71,6 +181,28 @@ class RibbonGraph(BaseGraph):
         self.num_series = 0
         self.color_range = color_range
         self.num_colors = min(num_colors, len(self.colors))
+        # Quantize the color series into this many buckets and draw each
+        # bucket as a single path. The color of a ribbon is then off by at
+        # most half a bucket, i.e. 1 / (2 * color_buckets) of the color range.
+        assert (
+            color_buckets is None or color_buckets >= 1
+        ), f"Invalid color_buckets value: {color_buckets}. Must be at least 1."
+        self.color_buckets = color_buckets
+
+    def _spec_data(self):
+        return {
+            "x_labels": list(self.x_labels),
+            "series": [
+                {
+                    "series": pack_array(series),
+                    "legend_label": legend_label,
+                    "print_values": print_values,
+                }
+                for series, legend_label, print_values in zip(
+                    self.data, self.legend_labels, self.print_values
+                )
+            ],
+        }
 
     def add_series(
         self,
@@ -84,29 +216,30 @@ class RibbonGraph(BaseGraph):
         assert self.num_series < 3, "Only three series are allowed"
         self.num_series += 1
 
-    def _draw_ribbon(self, x, y1, y2, width, fill):
+    def _make_ribbon_path(self, x, y1, y2, width):
         half_width = width / 2
         if y1 < y2:
             diff = y2 - y1
             return (
-                f'<path d="M{x} {y1} v{diff} l{half_width} {half_width} '
+                f"M{x} {y1} v{diff} l{half_width} {half_width} "
                 + f"l{half_width} -{half_width} v-{diff} l-{half_width} "
-                + f'{half_width}" fill="{fill}" />'
+                + f"{half_width}"
             )
         else:
             diff = y1 - y2
             return (
-                f'<path d="M{x} {y2} v{diff} l{half_width} -{half_width} '
+                f"M{x} {y2} v{diff} l{half_width} -{half_width} "
                 + f"l{half_width} {half_width} v-{diff} l-{half_width} "
-                + f'-{half_width}" fill="{fill}" />'
+                + f"-{half_width}"
             )
 
-    def render(self):
-        self._reset_graph()
+    def _draw_ribbon(self, x, y1, y2, width, fill):
+        return f'<path d="{self._make_ribbon_path(x, y1, y2, width)}" fill="{fill}" />'
+
+    def _render(self, ctx):
         assert self.num_series in [2, 3], "Two or three series are required"
 
-        max_value = max(self.data[0] + self.data[1])
-        min_value = min(self.data[0] + self.data[1])
+        min_value, max_value = series_range(self.data[0], self.data[1])
 
         color_series_present = (
             True if self.num_series == 3 and self.num_colors > 1 else False
@@ -116,8 +249,7 @@ class RibbonGraph(BaseGraph):
             max_color_range = self.color_range[1]
             min_color_range = self.color_range[0]
         elif color_series_present:
-            max_range = max(self.data[2])
-            min_range = min(self.data[2])
+            min_range, max_range = series_range(self.data[2])
             # Adjust max and min range to be round numbers
             if max_range >= 0:
                 max_color_range = get_adjusted_max(max_range)
@@ -141,14 +273,14 @@ class RibbonGraph(BaseGraph):
         scale_primary = (self.height) / (adjusted_max_value - adjusted_min_value)
 
         if color_series_present:
-            self.defs.append(
+            ctx.defs.append(
                 "<linearGradient id='legend_grad' x1='0%' y1='0%' x2='0%' y2='100%'>"
             )
             for i in range(self.num_colors):
-                self.defs.append(
+                ctx.defs.append(
                     f"<stop offset='{(i/(self.num_colors-1))*100}%' style='stop-color:{self.colors[self.num_colors-1-i]}' />"
                 )
-            self.defs.append("</linearGradient>")
+            ctx.defs.append("</linearGradient>")
 
         # Draw legend
         if self.show_legend:
@@ -161,16 +293,17 @@ class RibbonGraph(BaseGraph):
             if color_series_present:
                 legend_ribbon_color = self.colors[int(self.num_colors / 2)]
 
-            self.svg_elements.append(
+            ctx.svg_elements.append(
                 f'<path d="M{top_legend_x} {top_legend_y} h{third_graph_width} '
                 + f"l{half_bar_width} {half_bar_width} l-{half_bar_width} {half_bar_width} "
                 + f'h-{third_graph_width} l{half_bar_width} -{half_bar_width}" fill="{legend_ribbon_color}" />'
             )
-            self.most_extreme_dimensions["top"] = min(
-                top_legend_y - half_bar_width, self.most_extreme_dimensions["top"]
+            ctx.most_extreme_dimensions["top"] = min(
+                top_legend_y - half_bar_width, ctx.most_extreme_dimensions["top"]
             )
-            self.svg_elements.append(
+            ctx.svg_elements.append(
                 self._generate_text(
+                    ctx,
                     self.legend_labels[0],
                     top_legend_x,
                     top_legend_y + half_bar_width,
@@ -178,8 +311,9 @@ class RibbonGraph(BaseGraph):
                     anchor="end",
                 )
             )
-            self.svg_elements.append(
+            ctx.svg_elements.append(
                 self._generate_text(
+                    ctx,
                     self.legend_labels[1],
                     top_legend_x + third_graph_width + half_bar_width + 5,
                     top_legend_y + half_bar_width,
@@ -190,17 +324,18 @@ class RibbonGraph(BaseGraph):
 
             if color_series_present:
                 right_legend_x = (
-                    max(self.width, self.most_extreme_dimensions["right"])
+                    max(self.width, ctx.most_extreme_dimensions["right"])
                     + self.element_spacing
                 )
                 right_legend_y = 0
                 right_legend_y_middle = right_legend_y + self.height / 2
 
-                self.svg_elements.append(
+                ctx.svg_elements.append(
                     f'<rect x="{right_legend_x}" y="{right_legend_y}" width="{self.bar_width}" height="{self.height}" fill="url(#legend_grad)" />'
                 )
-                self.svg_elements.append(
+                ctx.svg_elements.append(
                     self._generate_text(
+                        ctx,
                         self.legend_labels[2],
                         right_legend_x - 5,
                         right_legend_y_middle,
@@ -209,8 +344,9 @@ class RibbonGraph(BaseGraph):
                         rotation=-90,
                     )
                 )
-                self.svg_elements.append(
+                ctx.svg_elements.append(
                     self._generate_text(
+                        ctx,
                         human_readable_number(max_color_range),
                         right_legend_x + self.bar_width + 5,
                         right_legend_y,
@@ -218,8 +354,9 @@ class RibbonGraph(BaseGraph):
                         anchor="start",
                     )
                 )
-                self.svg_elements.append(
+                ctx.svg_elements.append(
                     self._generate_text(
+                        ctx,
                         human_readable_number(min_color_range),
                         right_legend_x + self.bar_width + 5,
                         right_legend_y + self.height,
@@ -232,27 +369,47 @@ class RibbonGraph(BaseGraph):
         num_ribbons = len(self.data[0])
         bar_spacing = (self.width) / (num_ribbons + 1 / 2)
 
-        for index in range(num_ribbons):
-            x = (index + 1 / 2) * bar_spacing
-            y1 = (
-                self.height - (self.data[0][index] - adjusted_min_value) * scale_primary
-            )
-            y2 = (
-                self.height - (self.data[1][index] - adjusted_min_value) * scale_primary
-            )
-            color = self.colors[0]
-            if color_series_present:
-                color_val = self.data[2][index]
-                color_range = max_color_range - min_color_range
-                color_percent = (color_val - min_color_range) / color_range
-                color = get_color(color_percent, self.colors[: self.num_colors])
-            self.svg_elements.append(
-                self._draw_ribbon(x, y1, y2, self.bar_width, color)
+        # Ribbons grouped by color when color_buckets is set; their labels are
+        # held back so they are drawn on top of the merged paths
+        ribbon_paths = {}
+        value_labels = []
+        svg_elements = ctx.svg_elements
+        if self.color_buckets:
+            svg_elements = value_labels
+
+        xs, y1s, y2s = ribbon_geometry(
+            self.data[0],
+            self.data[1],
+            bar_spacing,
+            self.height,
+            adjusted_min_value,
+            scale_primary,
+        )
+        if color_series_present:
+            colors = ribbon_colors(
+                self.data[2],
+                min_color_range,
+                max_color_range,
+                self.colors[: self.num_colors],
+                buckets=self.color_buckets,
             )
+        else:
+            colors = [self.colors[0]] * num_ribbons
+
+        for index, (x, y1, y2, color) in enumerate(zip(xs, y1s, y2s, colors)):
+            if self.color_buckets:
+                ribbon_paths.setdefault(color, []).append(
+                    self._make_ribbon_path(x, y1, y2, self.bar_width)
+                )
+            else:
+                ctx.svg_elements.append(
+                    self._draw_ribbon(x, y1, y2, self.bar_width, color)
+                )
             if self.print_values[0]:
                 if y1 < y2:
-                    self.svg_elements.append(
+                    svg_elements.append(
                         self._generate_text(
+                            ctx,
                             human_readable_number(self.data[0][index]),
                             x + self.bar_width / 2,
                             y1,
@@ -261,8 +418,9 @@ class RibbonGraph(BaseGraph):
                         )
                     )
                 else:
-                    self.svg_elements.append(
+                    svg_elements.append(
                         self._generate_text(
+                            ctx,
                             human_readable_number(self.data[0][index]),
                             x + self.bar_width / 2,
                             y1,
@@ -272,8 +430,9 @@ class RibbonGraph(BaseGraph):
                     )
             if self.print_values[1]:
                 if y2 < y1:
-                    self.svg_elements.append(
+                    svg_elements.append(
                         self._generate_text(
+                            ctx,
                             human_readable_number(self.data[1][index]),
                             x + self.bar_width / 2,
                             y2 - self.bar_width / 2 - 7,
@@ -282,8 +441,9 @@ class RibbonGraph(BaseGraph):
                         )
                     )
                 else:
-                    self.svg_elements.append(
+                    svg_elements.append(
                         self._generate_text(
+                            ctx,
                             human_readable_number(self.data[1][index]),
                             x + self.bar_width / 2,
                             y2 + self.bar_width / 2 + 5,
@@ -297,8 +457,9 @@ class RibbonGraph(BaseGraph):
                 else:
                     y_adjustment = -self.bar_width / 4
                 text_color = "#ffffff" if is_dark(color) else "#000000"
-                self.svg_elements.append(
+                svg_elements.append(
                     self._generate_text(
+                        ctx,
                         human_readable_number(self.data[2][index]),
                         x + self.bar_width / 2,
                         (y1 + y2) / 2 + y_adjustment,
@@ -307,17 +468,21 @@ class RibbonGraph(BaseGraph):
                     )
                 )
 
+        for color, paths in ribbon_paths.items():
+            ctx.svg_elements.append(f'<path d="{" ".join(paths)}" fill="{color}" />')
+        ctx.svg_elements.extend(value_labels)
+
         # Draw axis
-        self.svg_elements.append(
+        ctx.svg_elements.append(
             f'<line x1="0" y1="0" x2="0" y2="{self.height}" stroke="{self.text_color}" stroke-width="1" />'
         )
         if adjusted_min_value < 0 and adjusted_max_value > 0:
             zero_line = self.height - (0 - adjusted_min_value) * scale_primary
-            self.svg_elements.append(
+            ctx.svg_elements.append(
                 f'<line x1="0" y1="{zero_line}" x2="{self.width}" y2="{zero_line}" stroke="{self.text_color}" stroke-width="1" />'
             )
         else:
-            self.svg_elements.append(
+            ctx.svg_elements.append(
                 f'<line x1="0" y1="{self.height}" x2="{self.width}" y2="{self.height}" stroke="{self.text_color}" stroke-width="1" />'
             )
 
@@ -326,15 +491,21 @@ class RibbonGraph(BaseGraph):
             x = (index + 1 / 2) * bar_spacing + self.bar_width / 2
             y = self.height + 5
             if label is not None and self.rotate_x_labels:
-                self.svg_elements.append(
+                ctx.svg_elements.append(
                     self._generate_text(
-                        label, x, y, fill=self.text_color, anchor="end", rotation=-90
+                        ctx,
+                        label,
+                        x,
+                        y,
+                        fill=self.text_color,
+                        anchor="end",
+                        rotation=-90,
                     )
                 )
             elif label is not None and not self.rotate_x_labels:
-                self.svg_elements.append(
+                ctx.svg_elements.append(
                     self._generate_text(
-                        label, x, y + 10, fill=self.text_color, anchor="middle"
+                        ctx, label, x, y + 10, fill=self.text_color, anchor="middle"
                     )
                 )
 
@@ -343,8 +514,9 @@ class RibbonGraph(BaseGraph):
             tick_y = self.height - (tick_value - adjusted_min_value) * scale_primary
             tick_label = f"{human_readable_number(tick_value)}"
 
-            self.svg_elements.append(
+            ctx.svg_elements.append(
                 self._generate_text(
+                    ctx,
                     tick_label,
                     -5,
                     tick_y + 3,
@@ -353,7 +525,7 @@ class RibbonGraph(BaseGraph):
                     dominant_baseline="text-bottom",
                 )
             )
-            self.svg_elements.append(
+            ctx.svg_elements.append(
                 f'<line x1="0" y1="{tick_y}" x2="-3" y2="{tick_y}" stroke="{self.text_color}" stroke-width="1" />'
             )
 
@@ -361,11 +533,12 @@ class RibbonGraph(BaseGraph):
         if self.x_axis_label:
             x_label_x = (self.width) / 2
             x_label_y = (
-                max(self.height, self.most_extreme_dimensions["bottom"])
+                max(self.height, ctx.most_extreme_dimensions["bottom"])
                 + 1.5 * self.element_spacing
             )
-            self.svg_elements.append(
+            ctx.svg_elements.append(
                 self._generate_text(
+                    ctx,
                     self.x_axis_label,
                     x_label_x,
                     x_label_y,
@@ -377,11 +550,12 @@ class RibbonGraph(BaseGraph):
 
         if self.primary_y_axis_label:
             y_label_x = (
-                min(0, self.most_extreme_dimensions["left"]) - self.element_spacing
+                min(0, ctx.most_extreme_dimensions["left"]) - self.element_spacing
             )
             y_label_y = (self.height) / 2
-            self.svg_elements.append(
+            ctx.svg_elements.append(
                 self._generate_text(
+                    ctx,
                     self.primary_y_axis_label,
                     y_label_x,
                     y_label_y,
@@ -391,5 +565,3 @@ class RibbonGraph(BaseGraph):
                     rotation=-90,
                 )
             )
-
-        return self._generate_svg()
@@ -0,0 +1,708 @@
+import ast
+import bisect
+import itertools
+import json
+import math
+import mmap
+import struct
+import sys
+from array import array
+from collections import deque
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, everything works without it
+    np = None
+
+# Element formats of the binary files add_series_from_file can read, keyed by
+# numpy style dtype strings
+FILE_DTYPES = {
+    "<f8": "d",
+    "<f4": "f",
+    "<i8": "q",
+    "<i4": "i",
+    "<i2": "h",
+    "|i1": "b",
+    "<u8": "Q",
+    "<u4": "I",
+    "<u2": "H",
+    "|u1": "B",
+}
+FILE_DTYPES.update(
+    {
+        "float64": "d",
+        "float32": "f",
+        "int64": "q",
+        "int32": "i",
+        "int16": "h",
+        "int8": "b",
+        "uint64": "Q",
+        "uint32": "I",
+        "uint16": "H",
+        "uint8": "B",
+    }
+)
+
+REDUCERS = ["sum", "mean", "min", "max", "first", "last", "count"]
+
+# Statistics a SeriesPyramid keeps for every bucket, in storage order
+PYRAMID_STATS = ["count", "sum", "min", "max", "first", "last"]
+PYRAMID_MAGIC = b"SSGLOD1\n"
+
+# Values processed at once by the numpy code paths, to bound their memory use
+CHUNK_SIZE = 1 << 20
+
+
+def _use_numpy(use_numpy):
+    if use_numpy is None:
+        return np is not None
+    assert not use_numpy or np is not None, "numpy is not installed"
+    return use_numpy
+
+
+def _chunks(values, chunk_size):
+    # Float arrays of at most chunk_size values, without copying values first
+    values = np.asarray(values)
+    for start in range(0, len(values), chunk_size):
+        yield values[start : start + chunk_size].astype(float, copy=False)
+
+
+class ArraySeries:
+    """
+    A read-only numeric series backed by a flat buffer (an array, a memoryview
+    of a memory-mapped file or a numpy array) in which NaN marks a missing
+    value. Indexing and iterating give None for those, like the lists that
+    add_series stores, so CategoricalGraph handles both the same way. Slicing
+    returns another ArraySeries over the same buffer without copying.
+    """
+
+    def __init__(self, values, source=None, value_range=None, mask=None):
+        if isinstance(values, (bytes, bytearray)) or hasattr(values, "typecode"):
+            values = memoryview(values)
+        self.values = values
+        self.source = source  # Keeps a memory-mapped file open
+        self._value_range = value_range
+        self.mask = mask  # Optional numpy array, True where a value is present
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            mask = None if self.mask is None else self.mask[index]
+            return ArraySeries(self.values[index], self.source, mask=mask)
+        value = self.values[index]
+        return None if value != value else float(value)
+
+    def __iter__(self):
+        for value in self.values:
+            yield None if value != value else float(value)
+
+    def items(self):
+        """Yield (index, value) for the values that are present."""
+        if self.mask is not None:
+            for index in np.flatnonzero(self.mask).tolist():
+                yield index, float(self.values[index])
+            return
+        for index, value in enumerate(self.values):
+            if value == value:
+                yield index, float(value)
+
+    def value_range(self, use_numpy=None):
+        """
+        Return (min, max) of the present values, or (None, None) if there are
+        none. The result is cached, as the buffer is read-only.
+        """
+        if self._value_range is None:
+            if _use_numpy(use_numpy):
+                minimum = maximum = None
+                for chunk in _chunks(self.values, CHUNK_SIZE):
+                    present = chunk[~np.isnan(chunk)]
+                    if len(present):
+                        low, high = float(present.min()), float(present.max())
+                        minimum = low if minimum is None else min(minimum, low)
+                        maximum = high if maximum is None else max(maximum, high)
+                self._value_range = (minimum, maximum)
+            else:
+                minimum = maximum = None
+                for value in self.values:
+                    if value != value:
+                        continue
+                    if minimum is None or value < minimum:
+                        minimum = value
+                    if maximum is None or value > maximum:
+                        maximum = value
+                self._value_range = (
+                    (None, None)
+                    if minimum is None
+                    else (float(minimum), float(maximum))
+                )
+        return self._value_range
+
+
+class RingSeries:
+    """
+    A fixed-capacity series for live graphs. append adds a value (and its x
+    label) at the end and, once capacity values are held, evicts the oldest.
+    The window's minimum and maximum are kept in monotonic deques, so
+    value_range is O(1) however long the window is. Missing values (None or
+    NaN) read back as None, like the lists that add_series stores.
+    """
+
+    def __init__(self, capacity):
+        assert capacity >= 1, f"Invalid capacity: {capacity}"
+        self.capacity = capacity
+        self.buffer = array("d", bytes(8 * capacity))
+        self.labels = deque(maxlen=capacity)
+        self.start = 0
+        self.count = 0
+        self.appended = 0  # Values appended so far, including evicted ones
+        # (sequence number, value) pairs, increasing and decreasing in value
+        self._minima = deque()
+        self._maxima = deque()
+
+    def append(self, value, label=None):
+        if value is None or value != value:
+            value = math.nan
+        else:
+            value = float(value)
+        if self.count == self.capacity:
+            self.buffer[self.start] = value
+            self.start = (self.start + 1) % self.capacity
+        else:
+            self.buffer[(self.start + self.count) % self.capacity] = value
+            self.count += 1
+        self.labels.append(label)
+
+        sequence = self.appended
+        self.appended += 1
+        oldest = self.appended - self.count
+        for extrema in (self._minima, self._maxima):
+            while extrema and extrema[0][0] < oldest:
+                extrema.popleft()
+        if value == value:
+            while self._minima and self._minima[-1][1] >= value:
+                self._minima.pop()
+            self._minima.append((sequence, value))
+            while self._maxima and self._maxima[-1][1] <= value:
+                self._maxima.pop()
+            self._maxima.append((sequence, value))
+
+    def extend(self, values, labels=None):
+        labels = labels if labels is not None else itertools.repeat(None)
+        for value, label in zip(values, labels):
+            self.append(value, label)
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self.count))]
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError("RingSeries index out of range")
+        value = self.buffer[(self.start + index) % self.capacity]
+        return None if value != value else value
+
+    def __iter__(self):
+        for index in range(self.count):
+            value = self.buffer[(self.start + index) % self.capacity]
+            yield None if value != value else value
+
+    def items(self):
+        """Yield (index, value) for the values that are present."""
+        for index, value in enumerate(self):
+            if value is not None:
+                yield index, value
+
+    def value_range(self):
+        """Return (min, max) of the present values, or (None, None)."""
+        if not self._minima:
+            return (None, None)
+        return (self._minima[0][1], self._maxima[0][1])
+
+
+class SparseSeries:
+    """
+    A series of length values that stores only the present ones, as a sorted
+    array of indices and an array of values, for data that is mostly missing
+    (e.g. events on a few days out of years). Indexing and iterating give None
+    for the gaps, but items and value_range only visit the present values,
+    which is all CategoricalGraph needs to draw it.
+    """
+
+    def __init__(self, indices, values, length=None):
+        self.indices = array("q")
+        self.values = array("d")
+        for index, value in zip(indices, values):
+            if value is None or value != value:
+                continue
+            assert (
+                not self.indices or index > self.indices[-1]
+            ), "SparseSeries indices must be increasing"
+            assert index >= 0, f"Invalid index: {index}"
+            self.indices.append(index)
+            self.values.append(value)
+        last = self.indices[-1] + 1 if self.indices else 0
+        self.length = last if length is None else length
+        assert self.length >= last, f"Index {last - 1} is past length {self.length}"
+
+    @classmethod
+    def from_dict(cls, values, length=None):
+        """Build a SparseSeries from a {index: value} dict."""
+        indices = sorted(values)
+        return cls(indices, [values[index] for index in indices], length)
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self.length)
+            assert step == 1, "SparseSeries slices can't have a step"
+            stop = max(start, stop)
+            low = bisect.bisect_left(self.indices, start)
+            high = bisect.bisect_left(self.indices, stop)
+            return SparseSeries(
+                [i - start for i in self.indices[low:high]],
+                self.values[low:high],
+                stop - start,
+            )
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError("SparseSeries index out of range")
+        position = bisect.bisect_left(self.indices, index)
+        if position < len(self.indices) and self.indices[position] == index:
+            return self.values[position]
+        return None
+
+    def __iter__(self):
+        previous = 0
+        for index, value in zip(self.indices, self.values):
+            yield from itertools.repeat(None, index - previous)
+            yield value
+            previous = index + 1
+        yield from itertools.repeat(None, self.length - previous)
+
+    def items(self):
+        """Yield (index, value) for the values that are present."""
+        return zip(self.indices, self.values)
+
+    def value_range(self):
+        """Return (min, max) of the present values, or (None, None)."""
+        if not self.values:
+            return (None, None)
+        return (min(self.values), max(self.values))
+
+
+class SeriesWindow:
+    """
+    A read-only window onto values start to stop of another series (or list
+    of labels), without copying it. Ranges are computed over the window.
+    """
+
+    def __init__(self, series, start, stop):
+        self.series = series
+        self.start, self.stop, _ = slice(start, stop).indices(len(series))
+        self.stop = max(self.start, self.stop)
+
+    def __len__(self):
+        return self.stop - self.start
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            assert step == 1, "SeriesWindow slices can't have a step"
+            return SeriesWindow(self.series, self.start + start, self.start + stop)
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("SeriesWindow index out of range")
+        return self.series[self.start + index]
+
+    def __iter__(self):
+        for index in range(self.start, self.stop):
+            yield self.series[index]
+
+    def items(self):
+        """Yield (index, value) for the values that are present."""
+        for index, value in enumerate(self):
+            if value is not None:
+                yield index, value
+
+    def value_range(self):
+        """Return (min, max) of the present values, or (None, None)."""
+        present = [value for _, value in self.items()]
+        if not present:
+            return (None, None)
+        return (min(present), max(present))
+
+
+def window(series, start, stop):
+    """
+    Values start to stop of a series without copying them: buffer-backed and
+    sparse series slice themselves, anything else gets a SeriesWindow.
+    """
+    if isinstance(series, (ArraySeries, SparseSeries)):
+        return series[start:stop]
+    return SeriesWindow(series, start, stop)
+
+
+def split_columns(matrix, use_numpy=None):
+    """
+    Split a 2-D matrix with one row per category and one column per series
+    into ArraySeries. With numpy, each series is a view of the matrix (no copy
+    if it already holds floats), and the validity mask and the ranges of all
+    series are computed in one vectorized pass.
+    """
+    if not _use_numpy(use_numpy):
+        columns = [
+            array("d", (math.nan if value is None else value for value in column))
+            for column in zip(*matrix)
+        ]
+        return [ArraySeries(column) for column in columns]
+
+    values = np.asarray(matrix, dtype=float)
+    assert values.ndim == 2, f"Expected a 2-D matrix, got {values.ndim} dimensions"
+    mask = ~np.isnan(values)
+    present = mask.any(axis=0)
+    lows = np.where(mask, values, np.inf).min(axis=0)
+    highs = np.where(mask, values, -np.inf).max(axis=0)
+    return [
+        ArraySeries(
+            values[:, column],
+            mask=mask[:, column],
+            value_range=(
+                (float(lows[column]), float(highs[column]))
+                if present[column]
+                else (None, None)
+            ),
+        )
+        for column in range(values.shape[1])
+    ]
+
+
+def reduce_buckets(values, bucket_size, reducer="mean", use_numpy=None):
+    """
+    Reduce every run of bucket_size consecutive values (the last one may be
+    shorter) to one value with reducer, which is one of REDUCERS. Missing
+    values (None or NaN) are skipped; a bucket without any becomes NaN (or 0
+    when counting).
+    Returns an array('d') of ceil(len(values) / bucket_size) values.
+    """
+    assert reducer in REDUCERS, (
+        f"Invalid reducer: {reducer}. " + f"Must be one of {', '.join(REDUCERS)}."
+    )
+    assert bucket_size >= 1, f"Invalid bucket_size: {bucket_size}"
+    if isinstance(values, ArraySeries):
+        values = values.values
+
+    buffered = isinstance(values, (memoryview, array)) or (
+        np is not None and isinstance(values, np.ndarray)
+    )
+    if _use_numpy(use_numpy) and buffered:
+        result = array("d")
+        chunk_size = max(1, CHUNK_SIZE // bucket_size) * bucket_size
+        for chunk in _chunks(values, chunk_size):
+            result.extend(_reduce_chunk(chunk, bucket_size, reducer).tolist())
+        return result
+
+    result = array("d")
+    bucket = []
+    count = 0
+    for value in values:
+        if value is not None and value == value:
+            bucket.append(value)
+        count += 1
+        if count == bucket_size:
+            result.append(_reduce(bucket, reducer))
+            bucket = []
+            count = 0
+    if count:
+        result.append(_reduce(bucket, reducer))
+    return result
+
+
+def bucket_label(first, last):
+    """The x label of a bucket of categories running from first to last."""
+    if first == last:
+        return first
+    return f"{first}–{last}"
+
+
+def _reduce_chunk(chunk, bucket_size, reducer):
+    num_buckets = math.ceil(len(chunk) / bucket_size)
+    padded = np.full(num_buckets * bucket_size, np.nan)
+    padded[: len(chunk)] = chunk
+    buckets = padded.reshape(num_buckets, bucket_size)
+    present = ~np.isnan(buckets)
+    counts = present.sum(axis=1)
+    if reducer == "count":
+        return counts.astype(float)
+    if reducer in ("sum", "mean"):
+        result = np.where(present, buckets, 0).sum(axis=1)
+        if reducer == "mean":
+            result = result / np.maximum(counts, 1)
+    elif reducer == "min":
+        result = np.where(present, buckets, np.inf).min(axis=1)
+    elif reducer == "max":
+        result = np.where(present, buckets, -np.inf).max(axis=1)
+    else:
+        columns = np.argmax(present if reducer == "first" else present[:, ::-1], 1)
+        if reducer == "last":
+            columns = bucket_size - 1 - columns
+        result = buckets[np.arange(num_buckets), columns]
+    return np.where(counts > 0, result, np.nan)
+
+
+def _reduce(bucket, reducer):
+    if reducer == "count":
+        return float(len(bucket))
+    if not bucket:
+        return math.nan
+    if reducer == "sum":
+        return float(sum(bucket))
+    if reducer == "mean":
+        return sum(bucket) / len(bucket)
+    if reducer == "min":
+        return float(min(bucket))
+    if reducer == "max":
+        return float(max(bucket))
+    if reducer == "first":
+        return float(bucket[0])
+    return float(bucket[-1])
+
+
+class SeriesPyramid:
+    """
+    A level-of-detail index over a long series, for rendering many windows
+    of it at screen resolution. Level k holds the count, sum, min, max, first
+    and last present value of every bucket of base_size * 2**k values, so any
+    range is covered by O(log n) buckets plus fewer than 2 * base_size raw
+    values at its edges. Build one with build, save it with save and map it
+    back with load.
+    """
+
+    def __init__(self, levels, length, base_size, series=None, source=None):
+        self.levels = levels  # One {stat: array of values} dict per level
+        self.length = length
+        self.base_size = base_size
+        self.series = series  # The raw values, for unaligned range edges
+        self.source = source  # Keeps a memory-mapped file open
+
+    @classmethod
+    def build(cls, series, base_size=64, use_numpy=None):
+        assert (
+            base_size >= 1 and base_size & (base_size - 1) == 0
+        ), f"Invalid base_size: {base_size}. Must be a power of two."
+        level = {
+            stat: reduce_buckets(series, base_size, stat, use_numpy)
+            for stat in PYRAMID_STATS
+        }
+        levels = [level]
+        while len(level["count"]) > 1:
+            level = _merge_pairs(level)
+            levels.append(level)
+        return cls(levels, len(series), base_size, series)
+
+    def __len__(self):
+        return self.length
+
+    def _pieces(self, start, stop):
+        # Stats of consecutive pieces that exactly cover start to stop
+        position = start
+        while position < stop:
+            size = self.base_size
+            if position % size or position + size > stop:
+                assert (
+                    self.series is not None
+                ), "Ranges that aren't aligned to base_size need the raw series"
+                value = self.series[position]
+                if value is None or value != value:
+                    yield (0.0,) + (math.nan,) * 5
+                else:
+                    yield (1.0,) + (float(value),) * 5
+                position += 1
+                continue
+            level = 0
+            while (
+                level + 1 < len(self.levels)
+                and position % (size * 2) == 0
+                and position + size * 2 <= stop
+            ):
+                level += 1
+                size *= 2
+            yield _pyramid_cell(self.levels[level], position // size)
+            position += size
+
+    def reduce(self, start=0, stop=None, bucket_size=1, reducer="mean"):
+        """
+        The same as reduce_buckets over the values start to stop, but reading
+        whole buckets from the pyramid, so the cost grows with the number of
+        buckets returned rather than the number of values.
+        """
+        assert reducer in REDUCERS, (
+            f"Invalid reducer: {reducer}. " + f"Must be one of {', '.join(REDUCERS)}."
+        )
+        assert bucket_size >= 1, f"Invalid bucket_size: {bucket_size}"
+        stop = self.length if stop is None else min(stop, self.length)
+        assert 0 <= start <= stop, f"Invalid range: {start} to {stop}"
+        result = array("d")
+        for bucket_start in range(start, stop, bucket_size):
+            bucket_stop = min(bucket_start + bucket_size, stop)
+            count, total, low, high, first, last = _merge_cells(
+                self._pieces(bucket_start, bucket_stop)
+            )
+            if reducer == "count":
+                result.append(count)
+            elif not count:
+                result.append(math.nan)
+            elif reducer == "mean":
+                result.append(total / count)
+            else:
+                result.append(
+                    {"sum": total, "min": low, "max": high, "first": first}.get(
+                        reducer, last
+                    )
+                )
+        return result
+
+    def save(self, path):
+        header = json.dumps(
+            {
+                "length": self.length,
+                "base_size": self.base_size,
+                "levels": [len(level["count"]) for level in self.levels],
+            }
+        ).encode("utf-8")
+        # Pad so the arrays start on an 8 byte boundary
+        header += b" " * (-(len(PYRAMID_MAGIC) + 4 + len(header)) % 8)
+        with open(path, "wb") as f:
+            f.write(PYRAMID_MAGIC)
+            f.write(struct.pack("<I", len(header)))
+            f.write(header)
+            for level in self.levels:
+                for stat in PYRAMID_STATS:
+                    values = level[stat]
+                    if sys.byteorder == "big":
+                        values = array("d", values)
+                        values.byteswap()
+                    f.write(values.tobytes())
+
+    @classmethod
+    def load(cls, path, series=None):
+        """
+        Memory-map a pyramid written by save. series, the raw values it was
+        built from, is only needed to reduce ranges whose buckets don't start
+        and end on multiples of base_size.
+        """
+        with open(path, "rb") as f:
+            assert f.read(len(PYRAMID_MAGIC)) == PYRAMID_MAGIC, "Not a pyramid file"
+            (header_length,) = struct.unpack("<I", f.read(4))
+            header = json.loads(f.read(header_length).decode("utf-8"))
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        assert series is None or len(series) == header["length"], (
+            f"The series has {len(series)} values, "
+            + f"but the pyramid was built from {header['length']}"
+        )
+
+        view = memoryview(mapped)
+        offset = len(PYRAMID_MAGIC) + 4 + header_length
+        levels = []
+        for size in header["levels"]:
+            level = {}
+            for stat in PYRAMID_STATS:
+                chunk = view[offset : offset + 8 * size]
+                if sys.byteorder == "big":
+                    level[stat] = array("d", chunk.tobytes())
+                    level[stat].byteswap()
+                else:
+                    level[stat] = chunk.cast("d")
+                offset += 8 * size
+            levels.append(level)
+        return cls(levels, header["length"], header["base_size"], series, mapped)
+
+
+def _pyramid_cell(level, index):
+    return tuple(level[stat][index] for stat in PYRAMID_STATS)
+
+
+def _merge_cells(cells):
+    # Combine consecutive (count, sum, min, max, first, last) cells into one
+    count = total = 0.0
+    low = high = first = last = math.nan
+    for cell in cells:
+        if not cell[0]:
+            continue
+        if not count:
+            low, high, first = cell[2], cell[3], cell[4]
+        else:
+            low = min(low, cell[2])
+            high = max(high, cell[3])
+        count += cell[0]
+        total += cell[1]
+        last = cell[5]
+    return (count, total if count else math.nan, low, high, first, last)
+
+
+def _merge_pairs(level):
+    merged = {stat: array("d") for stat in PYRAMID_STATS}
+    size = len(level["count"])
+    for index in range(0, size, 2):
+        cells = [_pyramid_cell(level, i) for i in range(index, min(index + 2, size))]
+        for stat, value in zip(PYRAMID_STATS, _merge_cells(cells)):
+            merged[stat].append(value)
+    return merged
+
+
+def read_npy_header(f):
+    """
+    Parse the header of a .npy file opened in binary mode. Returns the dtype
+    string, the shape and the offset of the data in bytes.
+    """
+    magic = f.read(6)
+    assert magic == b"\x93NUMPY", "Not a .npy file"
+    major, _ = f.read(2)
+    if major == 1:
+        (header_length,) = struct.unpack("<H", f.read(2))
+        offset = 10 + header_length
+    else:
+        (header_length,) = struct.unpack("<I", f.read(4))
+        offset = 12 + header_length
+    header = ast.literal_eval(f.read(header_length).decode("latin1"))
+    assert (
+        not header["fortran_order"] or len(header["shape"]) <= 1
+    ), "Fortran ordered .npy files are not supported"
+    return header["descr"], header["shape"], offset
+
+
+def map_series(path, dtype="<f8", offset=0, count=None):
+    """
+    Memory-map count values of a raw binary or .npy file, starting at element
+    offset, as an ArraySeries. Files ending in .npy take their dtype from the
+    header. Nothing is read until the values are used.
+    """
+    with open(path, "rb") as f:
+        data_offset = 0
+        if str(path).endswith(".npy"):
+            dtype, shape, data_offset = read_npy_header(f)
+            assert len(shape) <= 1, "Only one-dimensional .npy arrays are supported"
+        assert dtype in FILE_DTYPES, f"Unsupported dtype: {dtype}"
+        typecode = FILE_DTYPES[dtype]
+        itemsize = struct.calcsize(typecode)
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    available = (len(mapped) - data_offset) // itemsize - offset
+    assert 0 <= offset and available >= 0, f"Offset {offset} is past the end of {path}"
+    count = available if count is None else min(count, available)
+    start = data_offset + offset * itemsize
+    view = memoryview(mapped)[start : start + count * itemsize]
+    if sys.byteorder == "big" and itemsize > 1:
+        # Big-endian machines need a swapped copy of the little-endian data
+        swapped = array(typecode, view.tobytes())
+        swapped.byteswap()
+        return ArraySeries(swapped, mapped)
+    return ArraySeries(view.cast(typecode), mapped)
@@ -0,0 +1,258 @@
+"""
+A small HTTP service that renders graph specs, so programs in other languages
+can share one renderer:
+
+    python -m svgsimplegraph.serve --port 8000 --workers 4
+
+POST /render?format=svg|svgz|b64 with a JSON graph spec (see
+svgsimplegraph.spec.graph_from_spec) as the body returns the rendered graph.
+Invalid specs get a 400 response, and bodies bigger than --max-body-size
+bytes (16 MiB by default) a 413 without being read. GET /metrics returns
+request, cache and render counters in the Prometheus text format.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from urllib.parse import parse_qs
+from urllib.parse import urlparse
+
+from .spec import render_spec
+
+CONTENT_TYPES = {
+    "svg": "image/svg+xml",
+    "svgz": "image/svg+xml",
+    "b64": "text/plain; charset=utf-8",
+}
+
+# Biggest request body accepted by default, in bytes
+MAX_BODY_SIZE = 16 * 1024 * 1024
+
+# Errors caused by a bad spec rather than by the service. Specs themselves
+# are checked with ValueError, the constructors check their options with
+# asserts.
+SPEC_ERRORS = (AssertionError, KeyError, TypeError, ValueError)
+
+
+def _warm_up():
+    # Import and exercise the renderers once so the first request isn't slow
+    render_spec({"type": "CategoricalGraph", "series": [{"series": [1]}]})
+
+
+def spec_key(spec, output_format):
+    canonical = json.dumps(spec, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest() + "." + output_format
+
+
+class RenderService:
+    """
+    Renders specs on a pool of worker processes. Results are kept in an LRU
+    cache of cache_size entries, and identical specs requested while one is
+    already rendering wait for that render instead of starting another.
+    When a worker process dies, the pool is replaced and only the requests
+    that were rendering on it fail.
+    """
+
+    def __init__(self, workers=None, cache_size=256, executor=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.executor = executor or self._new_executor()
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.in_flight = {}
+        # Reentrant because a done callback can run inside submit's caller
+        self.lock = threading.RLock()
+        self.counters = {
+            "requests_total": 0,
+            "cache_hits_total": 0,
+            "cache_misses_total": 0,
+            "coalesced_total": 0,
+            "renders_total": 0,
+            "errors_total": 0,
+            "render_seconds_total": 0.0,
+        }
+
+    def _new_executor(self):
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=_warm_up)
+
+    def _replace_executor(self, broken):
+        # A pool with a dead process can't be used anymore. Several requests
+        # can find out at once, so only the first replaces it
+        with self.lock:
+            if self.executor is broken:
+                self.executor = self._new_executor()
+                broken.shutdown(wait=False)
+
+    def warm_up(self):
+        # Start every worker process now rather than on the first requests
+        futures = [self.executor.submit(int) for _ in range(self.workers)]
+        for future in futures:
+            future.result()
+
+    def _finish(self, key, future, start):
+        with self.lock:
+            self.in_flight.pop(key, None)
+            self.counters["render_seconds_total"] += time.perf_counter() - start
+            if future.cancelled() or future.exception() is not None:
+                self.counters["errors_total"] += 1
+                return
+            self.counters["renders_total"] += 1
+            if self.cache_size > 0:
+                self.cache[key] = future.result()
+                while len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+
+    def render(self, spec, output_format="svg"):
+        if output_format not in CONTENT_TYPES:
+            raise ValueError(
+                f"Invalid output format: {output_format}. "
+                + "Must be 'svg', 'svgz', or 'b64'."
+            )
+        key = spec_key(spec, output_format)
+        with self.lock:
+            self.counters["requests_total"] += 1
+            if key in self.cache:
+                self.counters["cache_hits_total"] += 1
+                self.cache.move_to_end(key)
+                return self.cache[key]
+            if key in self.in_flight:
+                self.counters["coalesced_total"] += 1
+                future, executor = self.in_flight[key]
+            else:
+                self.counters["cache_misses_total"] += 1
+                start = time.perf_counter()
+                executor = self.executor
+                try:
+                    future = executor.submit(render_spec, spec, output_format)
+                except BrokenProcessPool:
+                    # Broken by an earlier request, so this one gets a new pool
+                    self._replace_executor(executor)
+                    executor = self.executor
+                    future = executor.submit(render_spec, spec, output_format)
+                self.in_flight[key] = (future, executor)
+                future.add_done_callback(lambda done: self._finish(key, done, start))
+        try:
+            return future.result()
+        except BrokenProcessPool:
+            self._replace_executor(executor)
+            raise
+
+    def metrics(self):
+        with self.lock:
+            values = dict(self.counters)
+            values["cache_entries"] = len(self.cache)
+            values["in_flight"] = len(self.in_flight)
+        return "".join(
+            f"svgsimplegraph_{name} {value}\n" for name, value in values.items()
+        )
+
+    def close(self):
+        self.executor.shutdown()
+
+
+class RenderRequestHandler(BaseHTTPRequestHandler):
+    def _respond(self, status, body, content_type, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, status, message):
+        self._respond(status, message.encode("utf-8"), "text/plain; charset=utf-8")
+
+    def do_GET(self):
+        if urlparse(self.path).path != "/metrics":
+            return self._error(404, "Not found")
+        body = self.server.service.metrics().encode("utf-8")
+        self._respond(200, body, "text/plain; version=0.0.4")
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != "/render":
+            return self._error(404, "Not found")
+        output_format = parse_qs(url.query).get("format", ["svg"])[0]
+        if output_format not in CONTENT_TYPES:
+            return self._error(400, f"Invalid output format: {output_format}")
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+        except ValueError:
+            return self._error(400, "Invalid Content-Length")
+        if length < 0:
+            return self._error(400, "Invalid Content-Length")
+        if length > self.server.max_body_size:
+            # The body is never read, so don't keep the connection around
+            self.close_connection = True
+            return self._error(
+                413, f"Spec larger than {self.server.max_body_size} bytes"
+            )
+        try:
+            spec = json.loads(self.rfile.read(length))
+        except ValueError as e:
+            return self._error(400, f"Invalid JSON: {e}")
+
+        try:
+            body = self.server.service.render(spec, output_format)
+        except SPEC_ERRORS as e:
+            return self._error(400, f"Invalid graph spec: {e!r}")
+        except Exception as e:
+            return self._error(500, f"Render failed: {e!r}")
+
+        headers = {"Content-Encoding": "gzip"} if output_format == "svgz" else None
+        self._respond(200, body, CONTENT_TYPES[output_format], headers)
+
+
+def make_server(service, host="127.0.0.1", port=8000, max_body_size=MAX_BODY_SIZE):
+    server = ThreadingHTTPServer((host, port), RenderRequestHandler)
+    server.daemon_threads = True
+    server.service = service
+    server.max_body_size = max_body_size
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m svgsimplegraph.serve",
+        description="Render svgsimplegraph specs over HTTP.",
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument(
+        "--workers", type=int, default=None, help="render processes (default: CPUs)"
+    )
+    parser.add_argument(
+        "--cache-size", type=int, default=256, help="rendered results to keep"
+    )
+    parser.add_argument(
+        "--max-body-size",
+        type=int,
+        default=MAX_BODY_SIZE,
+        help="biggest spec to accept, in bytes",
+    )
+    args = parser.parse_args(argv)
+
+    service = RenderService(workers=args.workers, cache_size=args.cache_size)
+    service.warm_up()
+    server = make_server(service, args.host, args.port, args.max_body_size)
+    print(f"Serving svgsimplegraph on http://{args.host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+from .categorical import CategoricalGraph
+from .ribbon import RibbonGraph
+from .bubble_and_arrow import BubbleAndArrowGraph
+from .toggle import ToggleGraph
+from .grid import GraphGrid
+from .utils import encode_svg
+
+GRAPH_TYPES = {
+    "CategoricalGraph": CategoricalGraph,
+    "RibbonGraph": RibbonGraph,
+    "BubbleAndArrowGraph": BubbleAndArrowGraph,
+    "ToggleGraph": ToggleGraph,
+    "GraphGrid": GraphGrid,
+}
+
+
+def graph_from_spec(spec):
+    """
+    Build a graph from a JSON-compatible dict such as
+
+        {
+            "type": "CategoricalGraph",
+            "options": {"width": 600, "title": "Sales"},
+            "x_labels": ["Q1", "Q2"],
+            "series": [{"series": [3, 5], "legend_label": "2024"}],
+        }
+
+    options are passed to the constructor and every entry of series,
+    horizontal_lines, vertical_lines, bubbles and arrows to the matching add_
+    method. Those lists can also be given as a dict of columns, and any numeric
+    list as a packed array, which is what to_spec produces. A
+    BubbleAndArrowGraph layout is given as {"type": "PackLayout", ...}. A
+    ToggleGraph and a GraphGrid list their graphs as
+    {"label": ..., "graph": spec}.
+    """
+    if not isinstance(spec, dict):
+        raise ValueError("A graph spec must be a JSON object")
+    graph_type = spec.get("type")
+    if graph_type not in GRAPH_TYPES:
+        raise ValueError(f"Unknown graph type: {graph_type}")
+    return GRAPH_TYPES[graph_type].from_spec(spec)
+
+
+def render_spec(spec, output_format="svg"):
+    return encode_svg(graph_from_spec(spec).render(), output_format)
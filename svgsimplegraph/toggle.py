@@ -1,8 +1,13 @@
+from .base import RenderContext
+from .base import SPEC_VERSION
+from .base import check_spec
+from .base import spec_options
+from .base import render_in_executor
 from .categorical import CategoricalGraph
 from .utils import estimate_text_dimensions
 from .utils import to_snake_case
+from .utils import svg_to_base64_src
 import uuid
-import base64
 
 
 class ToggleGraph:
@@ -16,24 +21,7 @@ class ToggleGraph:
         self.labels = []
         self.label_ids = []
         self.default = 0
-        self.most_extreme_dimensions = {
-            "left": 0,
-            "right": 0,
-            "top": 0,
-            "bottom": 0,
-        }
-        self.defs = []
-        self.svg_elements = []
-        self.background_color = None
-        self.element_spacing = None
-        self.font_width_estimate_multiplier = None
-        self.widest_label = 0
-        self.tallest_label = 0
         self.colors = ["#73bed3", "#c7cfcc"]
-        self.x_left_padding = 0
-        self.x_right_padding = 0
-        self.y_top_padding = 0
-        self.y_bottom_padding = 0
         self.button_position = button_position
         assert button_position in [
             "left",
@@ -53,76 +41,89 @@ class ToggleGraph:
         self.label_ids.append(to_snake_case(f"{label}_{uuid.uuid4()}"))
 
         if is_default:
-            self.default = len(graph) - 1
-
-    def _reset_graph(self):
-        self.most_extreme_dimensions = {
-            "left": 0,
-            "right": 0,
-            "top": 0,
-            "bottom": 0,
+            self.default = len(self.graphs) - 1
+
+    def to_spec(self):
+        return {
+            "version": SPEC_VERSION,
+            "type": "ToggleGraph",
+            "options": spec_options(self, ["button_position", "button_font_size"]),
+            "graphs": [
+                dict(
+                    {"label": label, "graph": graph.to_spec()},
+                    **({"is_default": True} if index == self.default else {}),
+                )
+                for index, (graph, label) in enumerate(zip(self.graphs, self.labels))
+            ],
         }
-        self.defs = set()
-        self.svg_elements = []
-        self.widest_label = 0
+
+    @classmethod
+    def from_spec(cls, spec):
+        check_spec(spec, "ToggleGraph")
+        toggle = cls(**spec.get("options", {}))
+        for entry in spec.get("graphs", []):
+            toggle.add_graph(
+                CategoricalGraph.from_spec(entry["graph"]),
+                entry["label"],
+                is_default=entry.get("is_default", False),
+            )
+        return toggle
 
     def render(self):
-        self._reset_graph()
+        ctx = RenderContext(0, 0)
+        defs = {}
 
-        for index, graph in enumerate(self.graphs):
-            # Render the graph to generate its SVG elements
-            graph.render()
-            self.defs.update(graph.defs)
-            self.svg_elements.append(graph.svg_elements)
+        for graph in self.graphs:
+            # Render the graph into its own context to collect its SVG elements
+            graph_ctx = graph.render_context()
+            defs.update(dict.fromkeys(graph_ctx.defs))
+            ctx.svg_elements.append(graph_ctx.svg_elements)
 
             # Track the biggest dimensions of all graphs
-            self.most_extreme_dimensions["left"] = min(
-                self.most_extreme_dimensions["left"],
-                graph.most_extreme_dimensions["left"],
+            ctx.most_extreme_dimensions["left"] = min(
+                ctx.most_extreme_dimensions["left"],
+                graph_ctx.most_extreme_dimensions["left"],
             )
-            self.most_extreme_dimensions["right"] = max(
-                self.most_extreme_dimensions["right"],
-                graph.most_extreme_dimensions["right"],
+            ctx.most_extreme_dimensions["right"] = max(
+                ctx.most_extreme_dimensions["right"],
+                graph_ctx.most_extreme_dimensions["right"],
                 graph.width,
             )
-            self.most_extreme_dimensions["top"] = min(
-                self.most_extreme_dimensions["top"],
-                graph.most_extreme_dimensions["top"],
+            ctx.most_extreme_dimensions["top"] = min(
+                ctx.most_extreme_dimensions["top"],
+                graph_ctx.most_extreme_dimensions["top"],
             )
-            self.most_extreme_dimensions["bottom"] = max(
-                self.most_extreme_dimensions["bottom"],
-                graph.most_extreme_dimensions["bottom"],
+            ctx.most_extreme_dimensions["bottom"] = max(
+                ctx.most_extreme_dimensions["bottom"],
+                graph_ctx.most_extreme_dimensions["bottom"],
                 graph.height,
             )
 
-            if index == self.default:
-                self.background_color = graph.background_color
-                self.element_spacing = graph.element_spacing
-                self.font_width_estimate_multiplier = (
-                    graph.font_width_estimate_multiplier
-                )
-                self.x_left_padding = graph.x_left_padding
-                self.x_right_padding = graph.x_right_padding
-                self.y_top_padding = graph.y_top_padding
-                self.y_bottom_padding = graph.y_bottom_padding
+        # Spacing, padding and background follow the default graph
+        default_graph = self.graphs[self.default]
+        element_spacing = default_graph.element_spacing
 
+        widest_label = 0
+        tallest_label = 0
         for label in self.labels:
             # Track the widest label for button width
             estimated_x, estimated_y = estimate_text_dimensions(
-                label, self.button_font_size, self.font_width_estimate_multiplier
+                label,
+                self.button_font_size,
+                default_graph.font_width_estimate_multiplier,
             )
-            self.widest_label = max(
+            widest_label = max(
                 estimated_x,
-                self.widest_label,
+                widest_label,
             )
-            self.tallest_label = max(estimated_y, self.tallest_label)
+            tallest_label = max(estimated_y, tallest_label)
 
         defs_str = ""
-        if self.defs:
-            defs_str = "<defs>" + "\n".join(self.defs) + "</defs>"
+        if defs:
+            defs_str = "<defs>" + "\n".join(defs) + "</defs>"
 
         svg_elements_str = ""
-        for index, this_svg_elements in enumerate(self.svg_elements):
+        for index, this_svg_elements in enumerate(ctx.svg_elements):
             visibility = "visible" if self.default == index else "hidden"
             svg_elements_str += f"<g visibility ='{visibility}' >"
             svg_elements_str += "\n".join(this_svg_elements)
@@ -134,35 +135,27 @@ class ToggleGraph:
                     label_ids_that_deactivate += f"{label_id}.click;"
             svg_elements_str += f"<set attributeName='visibility' to='hidden' begin='{label_ids_that_deactivate}' /></g>"
 
-        button_width = 2 * self.element_spacing + self.widest_label
-        button_height = self.element_spacing + self.tallest_label
+        button_width = 2 * element_spacing + widest_label
+        button_height = element_spacing + tallest_label
 
         button_x_position = 0
         button_y_position = 0
         if self.button_position == "right":
-            button_x_position = (
-                self.most_extreme_dimensions["right"] + self.element_spacing
-            )
+            button_x_position = ctx.most_extreme_dimensions["right"] + element_spacing
             button_y_position = 0
         elif self.button_position == "left":
             button_x_position = (
-                self.most_extreme_dimensions["left"]
-                - self.element_spacing
-                - button_width
+                ctx.most_extreme_dimensions["left"] - element_spacing - button_width
             )
             button_y_position = 0
         elif self.button_position == "top":
             button_x_position = 0
             button_y_position = (
-                self.most_extreme_dimensions["top"]
-                - button_height
-                - 2 * self.element_spacing
+                ctx.most_extreme_dimensions["top"] - button_height - 2 * element_spacing
             )
         elif self.button_position == "bottom":
             button_x_position = 0
-            button_y_position = (
-                self.most_extreme_dimensions["bottom"] + self.element_spacing
-            )
+            button_y_position = ctx.most_extreme_dimensions["bottom"] + element_spacing
 
         for index, (label, label_id) in enumerate(zip(self.labels, self.label_ids)):
             # Draw buttons
@@ -180,52 +173,54 @@ class ToggleGraph:
             )
 
             # Update most extreme dimensions
-            self.most_extreme_dimensions["left"] = min(
-                self.most_extreme_dimensions["left"], button_x_position
+            ctx.most_extreme_dimensions["left"] = min(
+                ctx.most_extreme_dimensions["left"], button_x_position
             )
-            self.most_extreme_dimensions["top"] = min(
-                self.most_extreme_dimensions["top"], button_y_position
+            ctx.most_extreme_dimensions["top"] = min(
+                ctx.most_extreme_dimensions["top"], button_y_position
             )
-            self.most_extreme_dimensions["right"] = max(
-                self.most_extreme_dimensions["right"], button_x_position + button_width
+            ctx.most_extreme_dimensions["right"] = max(
+                ctx.most_extreme_dimensions["right"], button_x_position + button_width
             )
-            self.most_extreme_dimensions["bottom"] = max(
-                self.most_extreme_dimensions["bottom"],
+            ctx.most_extreme_dimensions["bottom"] = max(
+                ctx.most_extreme_dimensions["bottom"],
                 button_y_position + button_height,
             )
 
             # Move the position for the next button
             if self.button_position in ["right", "left"]:
-                button_y_position += self.tallest_label + 1.5 * self.element_spacing
+                button_y_position += tallest_label + 1.5 * element_spacing
             elif self.button_position in ["top", "bottom"]:
-                button_x_position += button_width + 1.5 * self.element_spacing
+                button_x_position += button_width + 1.5 * element_spacing
 
         viewbox_width = (
-            self.most_extreme_dimensions["right"]
-            - self.most_extreme_dimensions["left"]
-            + self.x_left_padding
-            + self.x_right_padding
+            ctx.most_extreme_dimensions["right"]
+            - ctx.most_extreme_dimensions["left"]
+            + default_graph.x_left_padding
+            + default_graph.x_right_padding
         )
 
         viewbox_height = (
-            self.most_extreme_dimensions["bottom"]
-            - self.most_extreme_dimensions["top"]
-            + self.y_top_padding
-            + self.y_bottom_padding
+            ctx.most_extreme_dimensions["bottom"]
+            - ctx.most_extreme_dimensions["top"]
+            + default_graph.y_top_padding
+            + default_graph.y_bottom_padding
         )
 
-        viewbox_left = self.most_extreme_dimensions["left"] - self.x_left_padding
-        viewbox_top = self.most_extreme_dimensions["top"] - self.y_top_padding
+        viewbox_left = (
+            ctx.most_extreme_dimensions["left"] - default_graph.x_left_padding
+        )
+        viewbox_top = ctx.most_extreme_dimensions["top"] - default_graph.y_top_padding
 
         viewbox_param = (
             f'viewBox="{viewbox_left} {viewbox_top} {viewbox_width} {viewbox_height}"'
         )
 
         background_rect = ""
-        if self.background_color:
+        if default_graph.background_color:
             background_rect = (
                 f"<rect x='{viewbox_left}' y='{viewbox_top}' width='{viewbox_width}' height='{viewbox_height}' "
-                + f"rx='10' ry='10' fill='{self.background_color}' />"
+                + f"rx='10' ry='10' fill='{default_graph.background_color}' />"
             )
 
         svg = (
@@ -237,8 +232,11 @@ class ToggleGraph:
         )
         return svg
 
+    async def render_async(self, executor=None, timeout=None, semaphore=None):
+        return await render_in_executor(self, executor, timeout, semaphore)
+
     def to_base64_src(self):
-        svg_str = self.render()
-        svg_bytes = svg_str.encode("utf-8")
-        encoded_svg = base64.b64encode(svg_bytes).decode("utf-8")
-        return "data:image/svg+xml;base64," + encoded_svg
+        return svg_to_base64_src(self.render())
+
+    async def to_base64_src_async(self, executor=None, timeout=None, semaphore=None):
+        return svg_to_base64_src(await self.render_async(executor, timeout, semaphore))
@@ -1,5 +1,12 @@
+import base64
+import bisect
+import gzip
 import math
+import numbers
 import re
+import sys
+import zlib
+from array import array
 
 
 def to_snake_case(text):
@@ -84,6 +91,214 @@ def boxes_overlap(x1, y1, width1, height1, x2, y2, width2, height2):
         return bottom2 - top1
 
 
+def clip_segment(x0, y0, x1, y1, width, height):
+    """
+    Clip the segment from (x0, y0) to (x1, y1) to the rectangle from (0, 0) to
+    (width, height) with the Liang–Barsky algorithm. Returns the clipped end
+    points, or None if the segment is entirely outside. End points that are
+    inside are returned unchanged.
+    """
+    dx = x1 - x0
+    dy = y1 - y0
+    t0, t1 = 0.0, 1.0
+    for p, q in ((-dx, x0), (dx, width - x0), (-dy, y0), (dy, height - y0)):
+        if p == 0:
+            if q < 0:
+                return None  # Parallel to this edge and outside it
+            continue
+        t = q / p
+        if p < 0:
+            if t > t1:
+                return None
+            t0 = max(t0, t)
+        else:
+            if t < t0:
+                return None
+            t1 = min(t1, t)
+    start = (x0, y0) if t0 == 0 else (x0 + t0 * dx, y0 + t0 * dy)
+    end = (x1, y1) if t1 == 1 else (x0 + t1 * dx, y0 + t1 * dy)
+    return start, end
+
+
+def clip_polyline(points, width, height):
+    """
+    Clip a list of (x, y) points, with None marking gaps, to the rectangle from
+    (0, 0) to (width, height). Returns the clipped points, with a gap wherever
+    the line leaves the rectangle, and the number of segments (or lone
+    points) that were cut or dropped.
+    """
+    clipped = []
+    changed = 0
+    run = []
+    for point in points + [None]:
+        if point is not None:
+            run.append(point)
+            continue
+        if len(run) == 1:
+            x, y = run[0]
+            if 0 <= x <= width and 0 <= y <= height:
+                clipped.extend([None, run[0]])
+            else:
+                changed += 1
+        tail = None
+        for start, end in zip(run, run[1:]):
+            segment = clip_segment(*start, *end, width, height)
+            if segment != (start, end):
+                changed += 1
+            if segment is None:
+                tail = None
+                continue
+            if segment[0] != tail:
+                clipped.extend([None, segment[0]])
+            clipped.append(segment[1])
+            tail = segment[1]
+        run = []
+    return clipped[1:], changed
+
+
+def thin_labels(positions, extents, priority=(), gap=2):
+    """
+    Choose labels to draw along an axis so that none overlap. Label i is
+    centred at positions[i] (in increasing order) and extents[i] wide along
+    the axis. The first and last labels are always kept, then the indices in
+    priority (in order) wherever they fit, then as many others as fit from
+    left to right. Returns the sorted indices of the labels to keep.
+    """
+    count = len(positions)
+    if count <= 2:
+        return list(range(count))
+
+    def clear(a, b):
+        distance = abs(positions[b] - positions[a])
+        return distance >= (extents[a] + extents[b]) / 2 + gap
+
+    anchors = [0, count - 1]
+    for index in priority:
+        if not 0 < index < count - 1 or index in anchors:
+            continue
+        position = bisect.bisect(anchors, index)
+        if clear(anchors[position - 1], index) and clear(index, anchors[position]):
+            anchors.insert(position, index)
+
+    kept = [0]
+    next_anchor = 1
+    for index in range(1, count):
+        if index == anchors[next_anchor]:
+            kept.append(index)
+            next_anchor = min(next_anchor + 1, len(anchors) - 1)
+        elif clear(kept[-1], index) and clear(index, anchors[next_anchor]):
+            kept.append(index)
+    return kept
+
+
+class LabelGrid:
+    """
+    A uniform grid spatial hash of placed (left, top, right, bottom) label
+    boxes, so a new box is only checked against the boxes in the cells it
+    covers. Boxes that merely touch don't collide.
+    """
+
+    def __init__(self, cell_size=20):
+        self.cell_size = cell_size
+        self.cells = {}
+
+    def _cells(self, box):
+        left, top, right, bottom = box
+        size = self.cell_size
+        for column in range(math.floor(left / size), math.floor(right / size) + 1):
+            for row in range(math.floor(top / size), math.floor(bottom / size) + 1):
+                yield column, row
+
+    def collides(self, box):
+        left, top, right, bottom = box
+        for cell in self._cells(box):
+            for other in self.cells.get(cell, ()):
+                if (
+                    left < other[2]
+                    and other[0] < right
+                    and top < other[3]
+                    and other[1] < bottom
+                ):
+                    return True
+        return False
+
+    def add(self, box):
+        for cell in self._cells(box):
+            self.cells.setdefault(cell, []).append(box)
+
+
+# Presentation attributes hoist_styles moves into CSS classes, and the ones
+# whose plain numbers need a unit in CSS
+STYLE_ATTRIBUTES = [
+    "font-size",
+    "fill",
+    "stroke",
+    "stroke-width",
+    "text-anchor",
+    "dominant-baseline",
+]
+STYLE_LENGTHS = ["font-size", "stroke-width"]
+STYLED_TAG_PATTERN = re.compile(r"<(text|line|path|rect)\b([^>]*?)(\s*/?)>")
+STYLE_ATTRIBUTE_PATTERN = re.compile(r'\s([a-z-]+)="([^"]*)"')
+
+
+def hoist_styles(elements):
+    """
+    Replace the presentation attributes of the text, line, path and rect tags
+    in a list of SVG element strings with CSS classes, one per distinct set of
+    values. Class names are a 32-bit hash of the rule they stand for, so
+    styles of graphs rendered separately can be merged. The rare rule whose
+    name is already taken by another rule gets a numbered suffix. Returns the
+    new elements and a <style> element with the rules (or None if nothing was
+    hoisted).
+    """
+    rules = {}
+    names = set()
+
+    def hoist(match):
+        tag, attributes, closing = match.groups()
+        if " class=" in attributes:
+            return match.group(0)
+        style = []
+
+        def remove(attribute):
+            if attribute.group(1) not in STYLE_ATTRIBUTES:
+                return attribute.group(0)
+            style.append(attribute.groups())
+            return ""
+
+        attributes = STYLE_ATTRIBUTE_PATTERN.sub(remove, attributes)
+        if not style:
+            return match.group(0)
+        rule = ";".join(
+            (
+                f"{name}:{value}px"
+                if name in STYLE_LENGTHS and re.fullmatch(r"[\d.]+", value)
+                else f"{name}:{value}"
+            )
+            for name, value in sorted(style)
+        )
+        name = rules.get(rule)
+        if name is None:
+            name = base = "s" + format(zlib.crc32(rule.encode("utf-8")), "x")
+            suffix = 1
+            while name in names:
+                name = f"{base}_{suffix}"
+                suffix += 1
+            rules[rule] = name
+            names.add(name)
+        return f'<{tag} class="{name}"{attributes}{closing}>'
+
+    elements = [
+        STYLED_TAG_PATTERN.sub(hoist, element) if isinstance(element, str) else element
+        for element in elements
+    ]
+    if not rules:
+        return elements, None
+    css = "".join(f".{name}{{{rule}}}" for rule, name in rules.items())
+    return elements, f"<style>{css}</style>"
+
+
 def hex_to_rgb(color):
     """Convert a hex color to an RGB tuple."""
     color = color.lstrip("#")
@@ -359,3 +574,82 @@ DEFAULT_COLOR_PALETTE = [
     "#ebede9",
     "#253a5e",
 ]
+
+
+def svg_to_base64_src(svg_str):
+    svg_bytes = svg_str.encode("utf-8")
+    encoded_svg = base64.b64encode(svg_bytes).decode("utf-8")
+    return "data:image/svg+xml;base64," + encoded_svg
+
+
+def encode_svg(svg_str, output_format="svg"):
+    """
+    Encode a rendered SVG as bytes: "svg" for the plain document, "svgz" for
+    gzip (with a fixed timestamp so equal graphs give equal bytes) and "b64"
+    for a base64 data URI.
+    """
+    if output_format == "svg":
+        return svg_str.encode("utf-8")
+    if output_format == "svgz":
+        return gzip.compress(svg_str.encode("utf-8"), mtime=0)
+    if output_format == "b64":
+        return svg_to_base64_src(svg_str).encode("ascii")
+    raise ValueError(
+        f"Invalid output format: {output_format}. Must be 'svg', 'svgz', or 'b64'."
+    )
+
+
+def pack_array(values):
+    """
+    Pack a numeric sequence into a JSON-compatible dict holding the base64 of
+    its little-endian machine representation. Integers are kept as 64-bit
+    integers, anything else becomes doubles with None stored as NaN. Integers
+    too big for 64 bits are returned as a plain list.
+    """
+    values = list(values)
+    if all(
+        isinstance(value, numbers.Integral) and not isinstance(value, bool)
+        for value in values
+    ):
+        try:
+            packed = array("q", values)
+        except OverflowError:
+            return [int(value) for value in values]
+    else:
+        packed = array("d", (math.nan if value is None else value for value in values))
+    if sys.byteorder == "big":
+        packed.byteswap()
+    return {
+        "typecode": packed.typecode,
+        "data": base64.b64encode(packed.tobytes()).decode("ascii"),
+    }
+
+
+def is_packed_array(value):
+    return isinstance(value, dict) and set(value) == {"typecode", "data"}
+
+
+def pack_sparse(indices, values, length):
+    """
+    Pack the present values of a sparse series with their indices and the
+    series length, so the packed form grows with the present values only.
+    """
+    return {
+        "length": length,
+        "indices": pack_array(indices),
+        "values": pack_array(values),
+    }
+
+
+def is_packed_sparse(value):
+    return isinstance(value, dict) and set(value) == {"length", "indices", "values"}
+
+
+def unpack_array(packed):
+    values = array(packed["typecode"])
+    values.frombytes(base64.b64decode(packed["data"]))
+    if sys.byteorder == "big":
+        values.byteswap()
+    if values.typecode == "d":
+        return [None if math.isnan(value) else value for value in values]
+    return values.tolist()
@@ -1,6 +1,18 @@
+import math
+import random
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import pytest
 
 from svgsimplegraph.bubble_and_arrow import BubbleAndArrowGraph
+from svgsimplegraph.layout import ForceDirectedLayout
+from svgsimplegraph.layout import PackLayout
+from svgsimplegraph.layout import _QuadTree
+from svgsimplegraph.layout import pack_circles
+from svgsimplegraph.utils import DEFAULT_COLOR_PALETTE
+from svgsimplegraph.utils import svg_to_base64_src
 
 
 def test_bubble_and_arrow_graph():
@@ -112,3 +124,342 @@ def test_bubble_and_arrow_graph():
     svg_base64 = graph.to_base64_src()
 
     print(f"\n<img src='{svg_base64}' />")
+
+
+def test_bubbles_without_text():
+    graph = BubbleAndArrowGraph(width=200, height=200)
+    graph.add_bubble(30, None, "Named")
+    graph.add_bubble(20, 10, None)
+    graph.add_bubble(10, None, "")
+    graph.add_arrow(0, 1, 2)
+    graph.add_arrow(1, 2, 1)
+
+    svg = graph.render()
+    assert svg.count("<circle ") == 4
+    assert ">Named<" in svg
+
+
+def test_force_directed_layout(monkeypatch):
+    def make_graph(layout):
+        graph = BubbleAndArrowGraph(
+            width=400,
+            height=400,
+            title="Force Directed Bubble and Arrow Graph",
+            colors=DEFAULT_COLOR_PALETTE * 3,
+            layout=layout,
+        )
+        for i in range(100):
+            graph.add_bubble(1 + (i * 37) % 50, None, f"B{i}" if i % 10 == 0 else None)
+        for i in range(100):
+            graph.add_arrow(i, (i * 7 + 1) % 100, 1 + i % 5)
+            graph.add_arrow(i, (i + 1) % 100, 10)
+        return graph
+
+    # The same seed gives the same picture
+    svg = make_graph(ForceDirectedLayout(seed=3)).render()
+    assert svg == make_graph(ForceDirectedLayout(seed=3)).render()
+
+    graph = make_graph(ForceDirectedLayout(seed=3, warm_start=True))
+    positions = graph._calculate_positions()
+
+    # No two bubbles overlap and all of them stay on the canvas
+    for i, (x1, y1, r1, _) in enumerate(positions):
+        assert -1e-6 <= x1 - r1 and x1 + r1 <= 400 + 1e-6
+        assert -1e-6 <= y1 - r1 and y1 + r1 <= 400 + 1e-6
+        for x2, y2, r2, _ in positions[i + 1 :]:
+            assert math.hypot(x2 - x1, y2 - y1) >= r1 + r2 - 1e-6
+
+    # Identical inputs give identical positions
+    radii = [radius for _, _, radius, _ in positions]
+    edges = list(graph.arrow_index.edges())
+    assert ForceDirectedLayout(seed=3).place(
+        radii, edges, 400, 400, (200, 200)
+    ) == ForceDirectedLayout(seed=3).place(radii, edges, 400, 400, (200, 200))
+
+    # Warm start continues from the previous positions, with fewer iterations
+    iterations = []
+
+    def counting_quad_tree(*args):
+        # One tree is built per iteration
+        iterations.append(1)
+        return _QuadTree(*args)
+
+    monkeypatch.setattr("svgsimplegraph.layout._QuadTree", counting_quad_tree)
+    layout = ForceDirectedLayout(seed=3, warm_start=True)
+    layout.place(radii, edges, 400, 400, (200, 200))
+    cold_iterations = len(iterations)
+    first = layout.positions
+
+    iterations.clear()
+    layout.place(radii, edges, 400, 400, (200, 200))
+    assert 0 < len(iterations) < cold_iterations
+
+    # and ends up much closer to them than a layout from scratch
+    def distance(positions):
+        return sum(math.dist(a, b) for a, b in zip(first, positions))
+
+    fresh = ForceDirectedLayout(seed=4, warm_start=True)
+    fresh.place(radii, edges, 400, 400, (200, 200))
+    assert distance(layout.positions) < distance(fresh.positions) / 10
+
+    # Without any warm start iterations the layout stays where it was
+    layout.warm_start_iterations = 0
+    previous = layout.positions
+    layout.place(radii, edges, 400, 400, (200, 200))
+    assert layout.positions == previous
+
+    graph.bubbles[0] = (80, None, "B0")
+    svg_base64 = graph.to_base64_src()
+
+    print(f"\n<img src='{svg_base64}' />")
+
+
+def test_pack_layout():
+    graph = BubbleAndArrowGraph(
+        width=400,
+        height=400,
+        title="Packed Bubble and Arrow Graph",
+        colors=DEFAULT_COLOR_PALETTE * 10,
+        layout=PackLayout(),
+    )
+    for i in range(300):
+        size = 1000 if i % 50 == 0 else 1 + i % 20
+        graph.add_bubble(size, size / 2, f"B{i}" if i % 50 == 0 else None)
+    for i in range(0, 300, 50):
+        graph.add_arrow(i, (i + 50) % 300, 100)
+        graph.add_arrow(i, i + 1, 5)
+
+    positions = graph._calculate_positions()
+
+    # No two bubbles overlap and the pack fills the canvas
+    for i, (x1, y1, r1, _) in enumerate(positions):
+        for x2, y2, r2, _ in positions[i + 1 :]:
+            assert math.hypot(x2 - x1, y2 - y1) >= r1 + r2 - 1e-6
+    pack_width = max(x + r for x, _, r, _ in positions) - min(
+        x - r for x, _, r, _ in positions
+    )
+    pack_height = max(y + r for _, y, r, _ in positions) - min(
+        y - r for _, y, r, _ in positions
+    )
+    assert max(pack_width, pack_height) == pytest.approx(400)
+
+    svg_base64 = graph.to_base64_src()
+
+    print(f"\n<img src='{svg_base64}' />")
+
+
+def test_arrow_index():
+    graph = BubbleAndArrowGraph(width=400, height=400)
+    graph.add_bubble(100, None, "Bubble 0", label="first")
+    graph.add_bubble(50, None, "Bubble 1")
+    graph.add_bubble(25, None, "Bubble 2", label="last")
+
+    graph.add_arrow("last", "first", 5)
+    graph.add_arrow(1, 0, 3)
+    graph.add_arrow(1, "last", 4)
+    graph.add_arrow("first", 1, 2)
+    graph.add_arrow(1, 1, 1)
+
+    offsets, destinations, sizes, totals = graph.arrow_index.compile(3)
+    assert list(offsets) == [0, 1, 4, 5]
+    # Arrows to the origin itself and later bubbles come before earlier ones
+    assert list(destinations) == [1, 1, 2, 0, 0]
+    assert list(sizes) == [2, 1, 4, 3, 5]
+    assert list(totals) == [2, 8, 5]
+
+    # Rendering leaves the arrows as they were given, and arrows is only a
+    # view of the index
+    svg = graph.render()
+    assert list(graph.arrow_index.sizes) == [5, 3, 4, 2, 1]
+    assert graph.arrows[0] == [2, 0, 5]
+    with pytest.raises(AttributeError):
+        graph.arrows = []
+    assert svg == graph.render()
+
+    # Arrows can be added by label before their bubbles
+    early = BubbleAndArrowGraph(width=400, height=400)
+    early.add_arrow("last", "first", 5)
+    early.add_bubble(100, None, "Bubble 0", label="first")
+    early.add_arrow(1, 0, 3)
+    early.add_arrow(1, "last", 4)
+    early.add_arrow("first", 1, 2)
+    early.add_bubble(50, None, "Bubble 1")
+    early.add_bubble(25, None, "Bubble 2", label="last")
+    early.add_arrow(1, 1, 1)
+    assert early.render() == svg
+    assert early.to_spec() == graph.to_spec()
+
+    early.add_arrow("missing", 0, 1)
+    with pytest.raises(AssertionError):
+        early.render()
+
+
+def test_arrow_reduction():
+    def make_graph(**kwargs):
+        graph = BubbleAndArrowGraph(
+            width=400,
+            height=400,
+            title="Reduced Bubble and Arrow Graph",
+            colors=DEFAULT_COLOR_PALETTE,
+            **kwargs,
+        )
+        for i in range(10):
+            graph.add_bubble(100, None, f"Bubble {i}", label=f"bubble_{i}")
+        graph.add_bubble(100, None, "Other", label="other")
+        for repeat in range(50):
+            for i in range(10):
+                graph.add_arrow(i, (i + 1) % 10, 2)
+                graph.add_arrow((i + 1) % 10, i, 1)
+                graph.add_arrow(i, (i + 3) % 10, 0.02)
+        return graph
+
+    svg = make_graph().render()
+    assert svg.count(" z ") == 50 * 10 * 3
+
+    svg = make_graph(merge_parallel_arrows=True).render()
+    assert svg.count(" z ") == 10 * 3
+
+    svg = make_graph(merge_reciprocal_arrows=True).render()
+    assert svg.count(" z ") == 10 * 2
+
+    svg = make_graph(merge_reciprocal_arrows=True, min_arrow_width=5).render()
+    assert svg.count(" z ") == 10
+
+    svg = make_graph(
+        merge_reciprocal_arrows=True, min_arrow_width=5, other_bubble="other"
+    ).render()
+    assert svg.count(" z ") == 10 * 2
+
+    graph = make_graph(merge_parallel_arrows=True, bundle_angle=math.pi / 4)
+    svg_base64 = graph.to_base64_src()
+
+    print(f"\n<img src='{svg_base64}' />")
+
+    # Every bubble fans out to its three neighbours, which bundle into one
+    # outline per bubble, using fewer path commands than separate arrows
+    def make_fan(**kwargs):
+        graph = BubbleAndArrowGraph(**kwargs)
+        for i in range(10):
+            graph.add_bubble(100, None, f"Bubble {i}", label=f"bubble_{i}")
+        for i in range(10):
+            for step in range(1, 4):
+                graph.add_arrow(i, (i + step) % 10, step)
+        return graph
+
+    def count_commands(svg):
+        paths = re.findall(r'<path d="([^"]*)"', svg)
+        return sum(len(re.findall("[MQLCz]", path)) for path in paths)
+
+    unbundled = make_fan().render()
+    bundled = make_fan(bundle_angle=math.pi / 4).render()
+    print(f"\n<img src='{svg_to_base64_src(bundled)}' />")
+    assert unbundled.count(" z ") == 10 * 3
+    assert bundled.count(" z ") == 10
+    assert count_commands(bundled) < count_commands(unbundled)
+
+
+def test_incremental_layout():
+    def make_graph(scale=1, shift=0):
+        graph = BubbleAndArrowGraph(
+            width=400,
+            height=400,
+            title="Incremental Bubble and Arrow Graph",
+            colors=DEFAULT_COLOR_PALETTE,
+            incremental=True,
+        )
+        for i in range(30):
+            graph.add_bubble((1 + i % 4) * scale, None, f"Bubble {i}")
+            graph.add_arrow(i // 2, (i + shift) % 30, 1)
+        return graph
+
+    graph = make_graph()
+    first_svg = graph.render()
+    label_offsets = graph.layout_state.label_offsets
+    assert any(label_offsets)
+    assert graph.render() == first_svg
+
+    # Slightly different sizes keep the label offsets
+    graph.bubbles = [(size * 1.05, inner, text) for size, inner, text in graph.bubbles]
+    graph.render()
+    assert graph.layout_state.label_offsets == pytest.approx(label_offsets, abs=5)
+
+    # Arrows between other bubbles, or much bigger changes in size, start over
+    for scale, shift in [(1, 1), (3, 0)]:
+        graph = make_graph()
+        graph.render()
+        changed = make_graph(scale, shift)
+        changed.layout_state = graph.layout_state
+        assert changed.render() == make_graph(scale, shift).render()
+
+    # New bubbles start over
+    graph.add_bubble(1, None, "New bubble")
+    svg_base64 = graph.to_base64_src()
+    assert len(graph.layout_state.label_offsets) == 31
+
+    print(f"\n<img src='{svg_base64}' />")
+
+    # The pack layout keeps its order while the sizes stay about the same
+    layout = PackLayout(warm_start=True)
+    layout.place([1, 2, 3], [], 100, 100, (50, 50))
+    order = layout.order
+    layout.place([1.2, 2, 2.9], [], 100, 100, (50, 50))
+    assert layout.order is order == [2, 1, 0]
+    layout.place([3, 2, 1], [], 100, 100, (50, 50))
+    assert layout.order == [0, 1, 2]
+
+    # The force-directed layout only starts from positions for the same arrows
+    radii = [1, 2, 3, 4]
+    edges = [(0, 1, 1), (1, 2, 1), (2, 3, 1)]
+    other_edges = [(0, 2, 1), (1, 3, 1), (3, 0, 1)]
+    layout = ForceDirectedLayout(warm_start=True)
+    layout.place(radii, edges, 100, 100, (50, 50))
+    assert layout.place(
+        radii, other_edges, 100, 100, (50, 50)
+    ) == ForceDirectedLayout().place(radii, other_edges, 100, 100, (50, 50))
+    assert layout.place(
+        radii, other_edges, 100, 100, (50, 50)
+    ) != ForceDirectedLayout().place(radii, other_edges, 100, 100, (50, 50))
+
+
+def test_pack_circles_scaling():
+    def pack_time(num_circles):
+        rng = random.Random(1)
+        radii = sorted((rng.uniform(1, 10) for _ in range(num_circles)), reverse=True)
+        best = math.inf
+        for _ in range(3):
+            start = time.perf_counter()
+            centers = pack_circles(radii)
+            best = min(best, time.perf_counter() - start)
+        return best, centers
+
+    small, _ = pack_time(500)
+    large, centers = pack_time(4000)
+    assert len(centers) == 4000
+
+    # About n ** 1.5, so 8 times the circles take about 25-35 times as long.
+    # Quadratic packing would take 64 times as long
+    print(f"pack_circles: 500 circles {small:.3f}s, 4000 circles {large:.3f}s")
+    assert large / small < 48
+
+
+def test_concurrent_render():
+    graph = BubbleAndArrowGraph(width=400, height=400, title="Shared Graph")
+    for i in range(12):
+        graph.add_bubble(100 / (i + 1), 30 / (i + 1) if i % 2 else None, f"Bubble {i}")
+    for i in range(36):
+        graph.add_arrow(i % 12, (i * 5 + 3) % 12, i % 4 + 1)
+
+    expected = graph.render()
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(lambda _: graph.render(), range(100)))
+
+    assert all(result == expected for result in results)
+
+    # Layouts don't keep state unless asked to, so renders stay identical
+    for layout in [ForceDirectedLayout(iterations=20), PackLayout()]:
+        graph.layout = layout
+        expected = graph.render()
+        assert graph.render() == expected
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(lambda _: graph.render(), range(20)))
+        assert all(result == expected for result in results)
@@ -1,6 +1,24 @@
+import asyncio
+import math
+import threading
+import time
+import zlib
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
+
 import pytest
 
 from svgsimplegraph.categorical import CategoricalGraph
+from svgsimplegraph.utils import clip_polyline
+from svgsimplegraph.utils import clip_segment
+from svgsimplegraph.utils import hoist_styles
+from svgsimplegraph.utils import thin_labels
+from svgsimplegraph.series import ArraySeries
+from svgsimplegraph.series import RingSeries
+from svgsimplegraph.series import SeriesPyramid
+from svgsimplegraph.series import SparseSeries
+from svgsimplegraph.series import reduce_buckets
 
 
 def test_categorical_graph():
@@ -263,3 +281,569 @@ def test_categorical_graph():
     print(f"\n<img src='{stacked_base64}' />")
 
     print(svg_code)
+
+
+def test_concurrent_render():
+    graph = CategoricalGraph(
+        width=600,
+        height=400,
+        title="Shared Graph",
+        x_axis_label="X Axis",
+        primary_y_axis_label="Primary Y Axis",
+        secondary_y_axis_label="Secondary Y Axis",
+        legend_position="left",
+    )
+    graph.x_labels = [f"Label {i}" for i in range(20)]
+    graph.add_series([i % 7 - 2 for i in range(20)], "Bars", print_values=True)
+    graph.add_series([i % 5 for i in range(20)], "Dots", series_type="dot")
+    graph.add_series(
+        [None if i % 6 == 0 else i * 3 for i in range(20)],
+        "Line",
+        series_type="line",
+        secondary=True,
+    )
+    graph.add_vertical_line(4, label="Event", rotate_label=True)
+
+    expected = graph.render()
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(lambda _: graph.render(), range(200)))
+
+    # Rendering keeps its scratch state per call, so nothing leaks between threads
+    assert all(result == expected for result in results)
+    assert graph.render() == expected
+
+
+def test_render_async():
+    graph = CategoricalGraph(width=400, height=300, title="Async Graph")
+    graph.x_labels = ["A", "B", "C", "D"]
+    graph.add_series([1, 2, 3, 4], "Bars")
+    graph.add_series([4, 3, 2, 1], "Line", series_type="line")
+
+    async def render_all():
+        svgs = await asyncio.gather(*(graph.render_async() for _ in range(10)))
+        src = await graph.to_base64_src_async()
+        with ProcessPoolExecutor(max_workers=2) as executor:
+            svg = await graph.render_async(executor=executor)
+        return svgs, src, svg
+
+    svgs, src, svg = asyncio.run(render_all())
+    assert all(result == graph.render() for result in svgs)
+    assert src == graph.to_base64_src()
+    assert svg == graph.render()
+
+
+class SlowSpecGraph(CategoricalGraph):
+    # Stands in for a graph with so much data that its spec takes a while
+    def to_spec(self):
+        time.sleep(0.3)
+        return super().to_spec()
+
+
+def test_render_async_process_pool_spec():
+    graph = SlowSpecGraph()
+    graph.add_series([1, 2, 3])
+
+    async def render_while_ticking():
+        # The spec is built off the event loop, so other tasks keep running
+        ticks = []
+
+        async def tick():
+            while True:
+                ticks.append(time.perf_counter())
+                await asyncio.sleep(0.01)
+
+        ticker = asyncio.create_task(tick())
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            svg = await graph.render_async(executor=executor)
+            with pytest.raises(asyncio.TimeoutError):
+                await graph.render_async(executor=executor, timeout=0.05)
+        ticker.cancel()
+        ticks.append(time.perf_counter())
+        return svg, max(b - a for a, b in zip(ticks, ticks[1:]))
+
+    svg, longest_gap = asyncio.run(render_while_ticking())
+    assert svg == graph.render()
+    assert longest_gap < 0.2
+
+
+def test_render_async_timeout():
+    graph = CategoricalGraph()
+    graph.add_series([1, 2, 3])
+    release = threading.Event()
+
+    async def render_with_busy_pool():
+        semaphore = asyncio.Semaphore(1)
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            # Occupy the only worker so the render never starts
+            executor.submit(release.wait)
+            with pytest.raises(asyncio.TimeoutError):
+                await graph.render_async(
+                    executor=executor, timeout=0.05, semaphore=semaphore
+                )
+            release.set()
+            # The queued render was cancelled and gave back its slot
+            await asyncio.sleep(0.05)
+            assert not semaphore.locked()
+            return await graph.render_async(executor=executor, semaphore=semaphore)
+
+    assert asyncio.run(render_with_busy_pool()) == graph.render()
+
+    async def render_with_held_semaphore():
+        semaphore = asyncio.Semaphore(1)
+        await semaphore.acquire()
+        # Waiting for a slot counts against the timeout too
+        with pytest.raises(asyncio.TimeoutError):
+            await graph.render_async(timeout=0.05, semaphore=semaphore)
+        semaphore.release()
+        assert not semaphore.locked()
+
+    asyncio.run(render_with_held_semaphore())
+
+
+def test_series_from_file(tmp_path):
+    values = array("d", [math.sin(i / 50) * 100 for i in range(10000)])
+    values[103] = math.nan
+    raw_path = tmp_path / "series.f8"
+    with open(raw_path, "wb") as f:
+        values.tofile(f)
+
+    # A version 1.0 .npy file holding the same values as float64
+    header = "{'descr': '<f8', 'fortran_order': False, 'shape': (10000,), }"
+    header = header.ljust(64 - 10 - 1) + "\n"
+    npy_path = tmp_path / "series.npy"
+    with open(npy_path, "wb") as f:
+        f.write(b"\x93NUMPY\x01\x00" + len(header).to_bytes(2, "little"))
+        f.write(header.encode("latin1"))
+        values.tofile(f)
+
+    for path in [raw_path, npy_path]:
+        graph = CategoricalGraph(width=600, height=400, title="Memory-Mapped Series")
+        graph.add_series_from_file(path, offset=100, count=20, legend_label="Slice")
+        graph.add_series_from_file(
+            path,
+            bucket_size=500,
+            reducer="max",
+            series_type="line",
+            secondary=True,
+            legend_label="Maxima",
+        )
+        assert len(graph.data[0]) == 20
+        assert graph.data[0][3] is None
+        assert graph.data[0][4] == values[104]
+        assert graph.data[0][0] == values[100]
+        assert len(graph.data[1]) == 20
+        assert graph.data[1][0] == max(values[:500])
+
+        expected = CategoricalGraph(width=600, height=400, title="Memory-Mapped Series")
+        expected.add_series(values[100:120], legend_label="Slice")
+        expected.add_series(
+            [max(values[i : i + 500]) for i in range(0, 10000, 500)],
+            series_type="line",
+            secondary=True,
+            legend_label="Maxima",
+        )
+        assert graph.render() == expected.render()
+
+    print(f'<img src="{graph.to_base64_src()}" />')
+
+
+def test_from_csv(tmp_path):
+    csv_path = tmp_path / "export.csv"
+    with open(csv_path, "w") as f:
+        f.write("day,visits,signups,note\n")
+        for i in range(1000):
+            signups = "" if i % 10 == 0 else str(i % 17)
+            f.write(f"d{i},{i % 50 + 10},{signups},x\n")
+
+    graph = CategoricalGraph.from_csv(
+        str(csv_path),
+        "day",
+        ["visits", "signups"],
+        chunk_size=64,
+        series_types=["bar", "line"],
+        secondary=[False, True],
+        width=600,
+        title="From CSV",
+    )
+    assert len(graph.x_labels) == 1000
+    assert graph.x_labels[3] == "d3"
+    assert graph.data[1][10] is None
+    assert graph.data[0].value_range() == (10, 59)
+
+    expected = CategoricalGraph(width=600, title="From CSV")
+    expected.x_labels = [f"d{i}" for i in range(1000)]
+    expected.add_series([i % 50 + 10 for i in range(1000)], "visits")
+    expected.add_series(
+        [None if i % 10 == 0 else i % 17 for i in range(1000)],
+        "signups",
+        series_type="line",
+        secondary=True,
+    )
+    assert graph.render() == expected.render()
+
+    with open(csv_path, newline="") as f:
+        binned = CategoricalGraph.from_csv(
+            f, 0, [1], chunk_size=64, bucket_size=300, reducer="max"
+        )
+    assert binned.x_labels == ["d0–d299", "d300–d599", "d600–d899", "d900–d999"]
+    assert list(binned.data[0]) == [59, 59, 59, 59]
+    print(f'<img src="{binned.to_base64_src()}" />')
+
+
+def test_add_series_bulk():
+    rows = [[i % 7, None if i % 5 == 0 else i * 2, 20 - i] for i in range(20)]
+    graph = CategoricalGraph(width=600, title="Bulk Series")
+    graph.x_labels = [f"R{i}" for i in range(20)]
+    graph.add_series_bulk(
+        rows,
+        ["Cycle", "Double", "Countdown"],
+        series_types=["bar", "bar", "line"],
+        secondary=[False, False, True],
+    )
+    assert graph.data[1][5] is None
+    assert graph.data[1].value_range() == (2, 38)
+
+    expected = CategoricalGraph(width=600, title="Bulk Series")
+    expected.x_labels = graph.x_labels
+    expected.add_series([row[0] for row in rows], "Cycle")
+    expected.add_series([row[1] for row in rows], "Double")
+    expected.add_series(
+        [row[2] for row in rows], "Countdown", series_type="line", secondary=True
+    )
+    assert graph.render() == expected.render()
+    print(f'<img src="{graph.to_base64_src()}" />')
+
+
+def test_from_dataframe():
+    np = pytest.importorskip("numpy")
+    pd = pytest.importorskip("pandas")
+    matrix = np.arange(60, dtype=float).reshape(20, 3) % 13
+    matrix[4, 1] = np.nan
+    df = pd.DataFrame(matrix, index=[f"R{i}" for i in range(20)], columns=list("ABC"))
+
+    graph = CategoricalGraph.from_dataframe(df, series_types="line", width=600)
+    assert graph.x_labels == list(df.index)
+    assert graph.legend_labels == ["A", "B", "C"]
+    assert np.shares_memory(graph.data[0].values, df["A"].to_numpy())
+    assert graph.data[1][4] is None
+    assert list(graph.data[1].items())[4] == (5, 3.0)
+
+    expected = CategoricalGraph(width=600)
+    expected.x_labels = list(df.index)
+    for column in "ABC":
+        values = [None if v != v else v for v in df[column]]
+        expected.add_series(values, column, series_type="line")
+    assert graph.render() == expected.render()
+
+
+def test_live_series():
+    ring = RingSeries(5)
+    for i in range(12):
+        ring.append(None if i == 10 else (i * 7) % 11, f"t{i}")
+        window = [
+            None if j == 10 else (j * 7) % 11 for j in range(max(0, i - 4), i + 1)
+        ]
+        present = [value for value in window if value is not None]
+        assert list(ring) == window
+        assert ring.value_range() == (min(present), max(present))
+    assert list(ring.labels) == ["t7", "t8", "t9", "t10", "t11"]
+    assert ring[-1] == 0 and ring[3] is None
+
+    live = CategoricalGraph(width=600, stacked=True, title="Live")
+    live.add_series(RingSeries(30), "In")
+    live.add_series(RingSeries(30), "Out")
+    live.add_series(RingSeries(30), "Load", series_type="line", secondary=True)
+    rows = [(i % 9, -(i % 4), 50 + i % 13) for i in range(100)]
+    for i, row in enumerate(rows):
+        live.append(row, f"{i}s")
+        if i in (10, 99):
+            expected = CategoricalGraph(width=600, stacked=True, title="Live")
+            expected.x_labels = [f"{j}s" for j in range(max(0, i - 29), i + 1)]
+            window = rows[max(0, i - 29) : i + 1]
+            expected.add_series([row[0] for row in window], "In")
+            expected.add_series([row[1] for row in window], "Out")
+            expected.add_series(
+                [row[2] for row in window], "Load", series_type="line", secondary=True
+            )
+            assert live.render() == expected.render()
+
+    # Rendering reads the stacked sums that append keeps up to date, and
+    # rebuilds stale ones without writing them back to the graph
+    live_sums = dict(live._live_sums)
+    live.render()
+    assert live._live_sums == live_sums
+    live.data[0].append(100)
+    live.data[1].append(0)
+    stale = live.render()
+    assert live._live_sums == live_sums
+    live.append([None, None, None])
+    live.render()
+    assert live._live_sums[False][0] == live._live_versions(False)
+    assert "100" in stale
+    print(f'<img src="{live.to_base64_src()}" />')
+
+
+def test_sparse_series():
+    events = {3: 5, 40: -2, 41: 7, 365: 4, 900: 1}
+    sparse = SparseSeries.from_dict(events, length=1000)
+    dense = [events.get(i) for i in range(1000)]
+    assert list(sparse) == dense
+    assert sparse[40] == -2 and sparse[39] is None and sparse[-100] == 1
+    assert list(sparse[40:366].items()) == [(0, -2), (1, 7), (325, 4)]
+    assert sparse.value_range() == (-2, 7)
+
+    for kwargs in [{}, {"stacked": True}]:
+        graph = CategoricalGraph(width=600, title="Sparse Events", **kwargs)
+        graph.x_labels = [f"Day {i}" for i in range(1000)]
+        graph.add_series(sparse, "Events", print_values=True)
+        graph.add_series(SparseSeries([2, 3, 41, 500], [1, 2, 3, 4], 1000), "More")
+        graph.add_series(sparse, "Trend", series_type="line")
+        graph.add_series(sparse, "Points", series_type="dot", secondary=True)
+
+        expected = CategoricalGraph(width=600, title="Sparse Events", **kwargs)
+        expected.x_labels = graph.x_labels
+        expected.add_series(dense, "Events", print_values=True)
+        expected.add_series(
+            [{2: 1, 3: 2, 41: 3, 500: 4}.get(i) for i in range(1000)], "More"
+        )
+        expected.add_series(dense, "Trend", series_type="line")
+        expected.add_series(dense, "Points", series_type="dot", secondary=True)
+        assert graph.render() == expected.render()
+    print(f'<img src="{graph.to_base64_src()}" />')
+
+
+def test_line_gaps():
+    graph = CategoricalGraph()
+    graph.x_labels = list("ABCDEFG")
+    graph.add_series([1, None, None, 2, 3, None, 4], series_type="line")
+    path = graph._make_line_path([(0, 1), None, None, (3, 2), (4, 3), None, (6, 4)])
+    assert path == " M 0 1 M 3 2 L 4 3 M 6 4"
+    print(f'<img src="{graph.to_base64_src()}" />')
+
+
+def test_series_pyramid(tmp_path):
+    values = array("d", ((i * 37) % 101 - 20 for i in range(5000)))
+    for i in range(0, 5000, 7):
+        values[i] = math.nan
+    pyramid = SeriesPyramid.build(values, base_size=16)
+    path = tmp_path / "values.lod"
+    pyramid.save(path)
+    loaded = SeriesPyramid.load(path, values)
+
+    def same(a, b):
+        return all(x == y or (x != x and y != y) for x, y in zip(a, b))
+
+    for start, stop, bucket_size in [(0, 5000, 64), (5, 4999, 300), (123, 130, 3)]:
+        for reducer in ["sum", "mean", "min", "max", "first", "last", "count"]:
+            expected = reduce_buckets(values[start:stop], bucket_size, reducer)
+            assert same(pyramid.reduce(start, stop, bucket_size, reducer), expected)
+            assert same(loaded.reduce(start, stop, bucket_size, reducer), expected)
+
+    graph = CategoricalGraph(width=300, title="Zoomed")
+    graph.add_series_from_pyramid(
+        loaded,
+        1000,
+        4000,
+        reducer="max",
+        x_labels=[f"t{i}" for i in range(5000)],
+        series_type="line",
+    )
+    assert len(graph.data[0]) == 300
+    assert graph.x_labels[0] == "t1000–t1009"
+    print(f'<img src="{graph.to_base64_src()}" />')
+
+
+def test_view():
+    values = [(i * 13) % 17 - 4 if i % 6 else None for i in range(200)]
+    trend = [(i * 7) % 23 for i in range(200)]
+    graph = CategoricalGraph(width=600, title="Paged", stacked=True)
+    graph.x_labels = [f"P{i}" for i in range(200)]
+    graph.add_series(values, "Values", print_values=True)
+    graph.add_series(SparseSeries.from_dict({5: 3, 57: 9, 150: 2}, 200), "Events")
+    graph.add_series(
+        ArraySeries(array("d", trend)), "Trend", series_type="line", secondary=True
+    )
+    graph.add_vertical_line(55, label="Release")
+    graph.add_vertical_line(120, label="Outage")
+
+    page = graph.view(50, 75)
+    assert len(page.data[0]) == 25 and list(page.x_labels)[0] == "P50"
+    assert page.data[0].series is graph.data[0]
+    assert len(graph.vertical_lines) == 2 and len(page.vertical_lines) == 1
+
+    expected = CategoricalGraph(width=600, title="Paged", stacked=True)
+    expected.x_labels = graph.x_labels[50:75]
+    expected.add_series(values[50:75], "Values", print_values=True)
+    expected.add_series([9 if i == 57 else None for i in range(50, 75)], "Events")
+    expected.add_series(trend[50:75], "Trend", series_type="line", secondary=True)
+    expected.add_vertical_line(5, label="Release")
+    assert page.render() == expected.render()
+    assert graph.view(190, 400).render() == graph.view(190, 200).render()
+    print(f'<img src="{page.to_base64_src()}" />')
+
+
+def test_bin_categories():
+    size = 5000
+    columns = [
+        [i % 11 for i in range(size)],
+        [None if i % 3 else -(i % 5) for i in range(size)],
+        [1000 + i % 97 for i in range(size)],
+    ]
+    labels = [f"C{i}" for i in range(size)]
+
+    def build(cls_options, data, x_labels, vertical_line):
+        graph = CategoricalGraph(width=600, stacked=True, title="Binned", **cls_options)
+        graph.x_labels = x_labels
+        graph.add_series(data[0], "A")
+        graph.add_series(data[1], "B")
+        graph.add_series(data[2], "C", series_type="line", secondary=True)
+        graph.add_vertical_line(vertical_line, label="Here")
+        return graph
+
+    graph = build(
+        {"bin_categories": True, "bin_reducer": ["sum", "sum", "max"]},
+        columns,
+        labels,
+        4500,
+    )
+    binned = graph.binned()
+    assert len(binned.data[0]) == 556
+    assert binned.x_labels[0] == "C0–C8" and binned.x_labels[-1] == "C4995–C4999"
+
+    expected = build(
+        {},
+        [
+            list(reduce_buckets(columns[0], 9, "sum")),
+            list(reduce_buckets(columns[1], 9, "sum")),
+            list(reduce_buckets(columns[2], 9, "max")),
+        ],
+        binned.x_labels,
+        (4500 + 0.5) / 9 - 0.5,
+    )
+    assert graph.render() == expected.render()
+    print(f'<img src="{graph.to_base64_src()}" />')
+
+
+def test_culling():
+    assert clip_segment(-10, 50, 110, 50, 100, 100) == ((0, 50), (100, 50))
+    assert clip_segment(10, 10, 20, 20, 100, 100) == ((10, 10), (20, 20))
+    assert clip_segment(-10, -10, -5, 200, 100, 100) is None
+    points, clipped = clip_polyline(
+        [(0, 50), (50, 150), (100, 50), None, (120, 50), (150, 50)], 100, 100
+    )
+    assert points == [(0, 50), (25.0, 100.0), None, (75.0, 100.0), (100, 50)]
+    assert clipped == 3
+
+    graph = CategoricalGraph(width=400, height=200, title="Culled", cull_invisible=True)
+    graph.x_labels = [f"D{i}" for i in range(8)]
+    graph.add_series([3, 50, 0.0001, 0, 8, 12, 4, 5], "Bars", print_values=True)
+    graph.add_series([2, 4, 30, 40, 6, 2, 1, 3], "Line", series_type="line")
+    graph.add_series([1, 1.001, 1, 1, 1, 10, 2, 2], "Dots", series_type="dot")
+    graph.add_horizontal_line(500, label="Off the scale")
+    graph.add_vertical_line(20, label="Past the end")
+    graph.add_vertical_line(2, label="Shown")
+
+    ctx = graph.render_context()
+    assert ctx.stats["culled_bars"] == 2  # 0.0001 and 0 are less than a pixel
+    assert ctx.stats["culled_dots"] == 0
+    assert ctx.stats["culled_reference_lines"] == 2
+    assert "Off the scale" not in ctx.svg and "Shown" in ctx.svg
+
+    dense = CategoricalGraph(width=400, cull_invisible=True)
+    dense.add_series([1] * 2000, series_type="dot")
+    assert dense.render_context().stats["culled_dots"] == 1333
+    print(f'<img src="{graph.to_base64_src()}" />')
+
+    # Culling is off by default, so every element is drawn as before
+    graph.cull_invisible = False
+    ctx = graph.render_context()
+    assert not any(ctx.stats.values())
+    assert "Off the scale" in ctx.svg and "Past the end" in ctx.svg
+    assert graph.render().count(" h 30 v 0.0 h -30 z") == 1
+    dense.cull_invisible = False
+    assert dense.render().count("a 5,5") == 4000
+
+    # A stacked value that lands exactly on the scale maximum is kept whole
+    stacked = CategoricalGraph(stacked=True, cull_invisible=True)
+    stacked.add_series([1, 2, 3, 4], print_values=True)
+    stacked.add_series([2, -1, 2, 1], print_values=True)
+    ctx = stacked.render_context()
+    assert ctx.stats["clipped_bars"] == 0 and ctx.stats["culled_labels"] == 0
+    stacked.cull_invisible = False
+    assert stacked.render() == ctx.svg
+
+
+def test_thin_x_labels():
+    positions = [0, 5, 10, 15, 20, 25, 30]
+    assert thin_labels(positions, [8] * 7) == [0, 2, 4, 6]
+    assert thin_labels(positions, [8] * 7, priority=[3]) == [0, 3, 6]
+
+    graph = CategoricalGraph(
+        width=600, thin_x_labels=True, x_label_priority=["Day 500"]
+    )
+    graph.x_labels = [f"Day {i}" for i in range(1000)]
+    graph.add_series([i % 30 for i in range(1000)])
+    svg = graph.render()
+    assert "Day 0<" in svg and "Day 999<" in svg and "Day 500<" in svg
+    assert 30 < svg.count("Day ") < 50
+    print(f'<img src="{graph.to_base64_src()}" />')
+
+    graph.rotate_x_labels = False
+    assert 5 < graph.render().count("Day ") < 20
+    graph.thin_x_labels = False
+    assert graph.render().count("Day ") == 1000
+
+
+def test_value_label_overlap():
+    values = [50 + (i * 37) % 41 for i in range(500)]
+    values[123] = 200
+    values[321] = 3
+    graph = CategoricalGraph(
+        width=600, title="Crowded Values", avoid_value_overlap=True
+    )
+    graph.add_series(values, "Values", series_type="dot", print_values=True)
+    svg = graph.render()
+    assert ">200<" in svg and ">3<" in svg and f">{values[-1]}<" in svg
+
+    ctx = graph.render_context()
+    assert ctx.stats["culled_labels"] > 300
+    print(f'<img src="{graph.to_base64_src()}" />')
+
+    graph.avoid_value_overlap = False
+    ctx = graph.render_context()
+    assert ctx.stats["culled_labels"] == ctx.stats["nudged_labels"] == 0
+    assert len(ctx.svg) > len(svg) + 300 * 80
+
+
+def test_css_classes():
+    def build(**options):
+        graph = CategoricalGraph(width=600, title="Styled", **options)
+        graph.x_labels = [f"Week {i}" for i in range(30)]
+        graph.add_series([i % 7 for i in range(30)], "Bars", print_values=True)
+        graph.add_series([i % 5 for i in range(30)], "Line", series_type="line")
+        graph.add_horizontal_line(3, label="Target")
+        return graph
+
+    plain = build().render()
+    styled = build(css_classes=True).render()
+    assert len(styled) < 0.8 * len(plain)
+    assert "<style>" in styled and 'font-size="' not in styled
+    assert styled.count("<text") == plain.count("<text")
+
+    elements, style = hoist_styles(['<text x="1" font-size="10" fill="#000">A</text>'])
+    assert elements[0].startswith('<text class="s') and ' x="1">A</text>' in elements[0]
+    assert ";font-size:10px}" in style
+
+    # Rules with the same hash still get classes of their own
+    elements, style = hoist_styles(
+        [
+            '<rect fill="#80a93b" />',
+            '<rect fill="#2200408" />',
+            '<rect fill="#80a93b" />',
+        ]
+    )
+    assert zlib.crc32(b"fill:#80a93b") == zlib.crc32(b"fill:#2200408")
+    assert len({element.split('"')[1] for element in elements}) == 2
+    assert elements[0] == elements[2]
+    assert style.count("{") == 2
+    print(f'<img src="{build(css_classes=True).to_base64_src()}" />')
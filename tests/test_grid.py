@@ -0,0 +1,105 @@
+import re
+
+import pytest
+
+from svgsimplegraph.grid import GraphGrid
+from svgsimplegraph.categorical import CategoricalGraph
+from svgsimplegraph.spec import graph_from_spec
+
+
+def make_graph(offset):
+    graph = CategoricalGraph(
+        width=300, height=200, primary_tick_prefix="$", x_axis_label="Quarter"
+    )
+    graph.x_labels = ["Q1", "Q2", "Q3", "Q4"]
+    graph.add_series([10 + offset, 20, -5 * offset, 40], legend_label="Sales")
+    graph.add_series([5, 8, 12 * offset, 3], legend_label="Costs", series_type="line")
+    return graph
+
+
+def test_graph_grid():
+    grid = GraphGrid(columns=2, title="Sales by Region")
+    regions = ["North", "South", "East", "West", "Central"]
+    for offset, region in enumerate(regions):
+        grid.add_graph(make_graph(offset), label=region)
+
+    svg = grid.render()
+    print(f'<img src="{grid.to_base64_src()}" />')
+
+    # Every panel has the same scale, so the axes are written once
+    panels = grid.panels()
+    assert all(panel._shared_ticks == panels[0]._shared_ticks for panel in panels)
+    assert svg.count("<use ") == len(regions)
+    assert len(re.findall(r"<g id='grid_\w+_frame_", svg)) == 1
+    assert svg == grid.render()
+    assert svg.count(">$50<") == 1
+
+    # The legend is drawn once for the whole grid
+    assert svg.count(">Sales<") == 1
+    for region in regions:
+        assert f">{region}<" in svg
+
+    # Much smaller than the panels rendered separately
+    assert len(svg) < sum(len(graph.render()) for graph in grid.graphs) / 2
+
+    # Panels that look different get their own frame, and the grid new ids
+    grid_id = re.search(r"grid_(\w+)_frame_", svg).group(1)
+    grid.graphs[-1].primary_y_axis_label = "Revenue"
+    svg = grid.render()
+    assert len(re.findall(r"<g id='grid_\w+_frame_", svg)) == 2
+    assert grid_id not in svg
+
+    # Styles, watermark and defs are assembled as for a single graph
+    styled = GraphGrid()
+    for offset in range(2):
+        graph = make_graph(offset)
+        graph.css_classes = True
+        graph.watermark = "<text x='0' y='0' fill='#cccccc'>draft</text>"
+        styled.add_graph(graph)
+    svg = styled.render()
+    assert svg.count("draft</text>") == 1
+    assert svg.count("<defs>") == 1 and "<style>" in svg
+    assert 'class="s' in svg
+
+    with pytest.raises(AssertionError):
+        uneven = GraphGrid()
+        uneven.add_graph(make_graph(1))
+        short = CategoricalGraph()
+        short.add_series([1, 2])
+        uneven.add_graph(short)
+        uneven.render()
+
+
+def test_graph_grid_mixed_axes():
+    # Only one panel has a secondary axis, which moves its zero line
+    with_secondary = CategoricalGraph(primary_tick_prefix="$")
+    with_secondary.add_series([1, 7, 3], legend_label="Sales")
+    with_secondary.add_series(
+        [-5, 10, 20], legend_label="Growth", series_type="line", secondary=True
+    )
+    without_secondary = CategoricalGraph(primary_tick_prefix="$")
+    without_secondary.add_series([2, 5, 6], legend_label="Sales")
+
+    grid = GraphGrid(columns=2)
+    grid.add_graph(with_secondary, label="A")
+    grid.add_graph(without_secondary, label="B")
+    svg = grid.render()
+    print(f'<img src="{grid.to_base64_src()}" />')
+
+    # Both frames have the same primary ticks
+    frames = re.findall(r"<g id='grid_\w+_frame_\d+'>(.*?)</g>", svg, re.S)
+    assert len(frames) == 2
+    primary_ticks = [re.findall(r">\$(-?[\d.]+)<", frame) for frame in frames]
+    assert primary_ticks[0] == primary_ticks[1]
+    assert "-" in primary_ticks[0][0]
+
+
+def test_graph_grid_spec():
+    grid = GraphGrid(columns=1, label_font_size=10)
+    grid.add_graph(make_graph(1), label="North")
+    grid.add_graph(make_graph(2), label="South")
+
+    copy = graph_from_spec(grid.to_spec())
+    assert isinstance(copy, GraphGrid)
+    assert copy.to_spec() == grid.to_spec()
+    assert copy.render() == grid.render()
@@ -0,0 +1,109 @@
+import gzip
+import json
+import os
+
+import pytest
+
+from svgsimplegraph.__main__ import main
+from svgsimplegraph.spec import graph_from_spec
+from svgsimplegraph.spec import render_spec
+
+
+def test_render_command(tmp_path, capsys):
+    specs = []
+    for i in range(50):
+        specs.append(
+            {
+                "type": "CategoricalGraph",
+                "options": {"title": f"Graph {i}"},
+                "x_labels": ["A", "B", "C"],
+                "series": [{"series": [i, i + 1, i + 2]}],
+            }
+        )
+    specs[7]["name"] = "Named Graph"
+    specs[9]["name"] = ".."
+    lines = [json.dumps(spec) for spec in specs]
+    lines.insert(10, "")
+    lines.insert(20, '{"type": "PieGraph"}')
+    lines.insert(30, "not json")
+    spec_file = tmp_path / "specs.jsonl"
+    spec_file.write_text("\n".join(lines) + "\n")
+    out = tmp_path / "out"
+
+    status = main(
+        [
+            "render",
+            str(spec_file),
+            "--out",
+            str(out),
+            "--jobs",
+            "2",
+            "--format",
+            "svgz",
+            "--batch-size",
+            "4",
+        ]
+    )
+
+    assert status == 1
+    err = capsys.readouterr().err
+    print(err)
+    assert "Rendered 50 graphs (2 failed" in err
+    assert "line 21: ValueError" in err
+    assert "line 31: JSONDecodeError" in err
+    assert len(list(out.iterdir())) == 50
+    assert (
+        gzip.decompress((out / "named_graph.svgz").read_bytes()).decode("utf-8")
+        == graph_from_spec(specs[7]).render()
+    )
+    assert (out / "00000001.svgz").exists()
+    # Line 10 is named "..", which has nothing left in snake case
+    assert (out / "00000010.svgz").exists()
+    assert not (out / ".svgz").exists()
+
+
+def test_render_command_failures(tmp_path, capsys, monkeypatch):
+    def render_or_die(spec, output_format):
+        # Kills the worker process, as running out of memory would
+        if spec.get("die"):
+            os._exit(1)
+        return render_spec(spec, output_format)
+
+    # Worker processes are forked, so they see the patched function
+    monkeypatch.setattr("svgsimplegraph.__main__.render_spec", render_or_die)
+
+    specs = [
+        {"type": "CategoricalGraph", "series": [{"series": [i, i + 1]}]}
+        for i in range(20)
+    ]
+    specs[3]["name"] = "Same Name"
+    specs[4]["name"] = "same name"
+    specs[5]["name"] = "00000001"
+    specs[12]["die"] = True
+    spec_file = tmp_path / "specs.jsonl"
+    spec_file.write_text("\n".join(json.dumps(spec) for spec in specs) + "\n")
+    out = tmp_path / "out"
+
+    status = main(
+        [
+            "render",
+            str(spec_file),
+            "--out",
+            str(out),
+            "--jobs",
+            "2",
+            "--batch-size",
+            "4",
+        ]
+    )
+
+    # Only the row that killed its worker fails, not the rest of its batch
+    assert status == 1
+    err = capsys.readouterr().err
+    print(err)
+    assert "Rendered 17 graphs (3 failed" in err
+    assert "line 5: same_name is already the name of line 4" in err
+    assert "line 6: 00000001 is already the name of line 1" in err
+    assert "line 13: BrokenProcessPool" in err
+    assert len(list(out.iterdir())) == 17
+    assert (out / "00000012.svg").exists() and (out / "00000014.svg").exists()
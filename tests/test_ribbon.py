@@ -38,3 +38,51 @@ def test_ribbon_graph():
     svg_base64 = graph.to_base64_src()
 
     print(f"\n<img src='{svg_base64}' />")
+
+
+def test_ribbon_graph_color_buckets():
+    graph = RibbonGraph(
+        width=600,
+        height=400,
+        bar_width=10,
+        title="Bucketed Ribbon Graph",
+        num_colors=3,
+        color_buckets=4,
+    )
+
+    number_of_ribbons = 200
+    graph.add_series([i % 17 for i in range(number_of_ribbons)], legend_label="A")
+    graph.add_series([i % 13 for i in range(number_of_ribbons)], legend_label="B")
+    graph.add_series([i % 50 for i in range(number_of_ribbons)], legend_label="C")
+
+    svg = graph.render()
+
+    # One path per color bucket plus the legend ribbon
+    assert svg.count("<path") <= 4 + 1
+
+    print(f"\n<img src='{graph.to_base64_src()}' />")
+
+
+def test_ribbon_geometry_matches_without_numpy():
+    np = pytest.importorskip("numpy")
+    from svgsimplegraph.ribbon import ribbon_colors
+    from svgsimplegraph.ribbon import ribbon_geometry
+
+    first = np.linspace(-20, 80, 10000)
+    second = np.cos(first) * 50
+    color = np.sin(first)
+
+    assert ribbon_geometry(first, second, 0.05, 400, -50, 2.5) == ribbon_geometry(
+        first.tolist(), second.tolist(), 0.05, 400, -50, 2.5, use_numpy=False
+    )
+    colors = ["#73bed3", "#e8c170", "#a53030"]
+    for buckets in [None, 5]:
+        assert ribbon_colors(color, -0.8, 0.8, colors, buckets) == ribbon_colors(
+            color.tolist(), -0.8, 0.8, colors, buckets, use_numpy=False
+        )
+
+    graph = RibbonGraph(width=600, height=400, num_colors=3)
+    graph.add_series(first, legend_label="First")
+    graph.add_series(second, legend_label="Second")
+    graph.add_series(color, legend_label="Color")
+    assert graph.render().startswith("<svg")
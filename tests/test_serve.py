@@ -0,0 +1,123 @@
+import gzip
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from svgsimplegraph import serve
+from svgsimplegraph.serve import RenderService
+from svgsimplegraph.serve import make_server
+from svgsimplegraph.spec import graph_from_spec
+
+SPEC = {
+    "type": "RibbonGraph",
+    "options": {"width": 400, "height": 300, "title": "Served Graph"},
+    "x_labels": ["A", "B", "C"],
+    "series": [
+        {"series": [10, 20, 30], "legend_label": "First"},
+        {"series": [30, 10, 20], "legend_label": "Second"},
+    ],
+}
+
+
+def crash_or_render(spec, output_format="svg"):
+    # Kills the worker process, like a segfault or the OOM killer would
+    if spec.get("crash"):
+        os._exit(1)
+    return graph_from_spec(spec).render().encode("utf-8")
+
+
+def test_render_service_http():
+    service = RenderService(workers=1, cache_size=2)
+    service.warm_up()
+    server = make_server(service, port=0, max_body_size=10_000)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    url = f"http://127.0.0.1:{server.server_port}"
+
+    def post(spec, output_format):
+        request = urllib.request.Request(
+            f"{url}/render?format={output_format}",
+            data=json.dumps(spec).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+        )
+        with urllib.request.urlopen(request) as response:
+            return response.read()
+
+    try:
+        graph = graph_from_spec(SPEC)
+        assert post(SPEC, "svg").decode("utf-8") == graph.render()
+        assert post(SPEC, "svg").decode("utf-8") == graph.render()
+        assert gzip.decompress(post(SPEC, "svgz")).decode("utf-8") == graph.render()
+        assert post(SPEC, "b64").decode("ascii") == graph.to_base64_src()
+
+        for spec in [{"type": "PieGraph"}, [SPEC], {**SPEC, "version": "1"}]:
+            with pytest.raises(urllib.error.HTTPError) as error:
+                post(spec, "svg")
+            assert error.value.code == 400
+
+        # Bodies over the limit are turned away without being read
+        with pytest.raises(urllib.error.HTTPError) as error:
+            post({**SPEC, "x_labels": ["A" * 10_000] * 3}, "svg")
+        assert error.value.code == 413
+
+        with urllib.request.urlopen(f"{url}/metrics") as response:
+            metrics = response.read().decode("utf-8")
+        print(metrics)
+        assert "svgsimplegraph_cache_hits_total 1\n" in metrics
+        assert "svgsimplegraph_renders_total 3\n" in metrics
+        assert "svgsimplegraph_cache_entries 2\n" in metrics
+    finally:
+        server.shutdown()
+        server.server_close()
+        service.close()
+
+
+def test_render_service_coalescing():
+    release = threading.Event()
+    executor = ThreadPoolExecutor(max_workers=1)
+    service = RenderService(workers=1, executor=executor)
+    # Keep the only worker busy so both requests are in flight together
+    executor.submit(release.wait)
+
+    with ThreadPoolExecutor(max_workers=2) as clients:
+        results = [clients.submit(service.render, SPEC) for _ in range(2)]
+        while service.counters["coalesced_total"] < 1:
+            time.sleep(0.01)
+        release.set()
+        first, second = [result.result() for result in results]
+
+    assert first == second == graph_from_spec(SPEC).render().encode("utf-8")
+    assert service.counters["renders_total"] == 1
+    assert service.counters["cache_misses_total"] == 1
+    service.close()
+
+
+def test_render_service_broken_pool(monkeypatch):
+    monkeypatch.setattr(serve, "render_spec", crash_or_render)
+    service = RenderService(workers=1, cache_size=0)
+    expected = graph_from_spec(SPEC).render().encode("utf-8")
+    try:
+        assert service.render(SPEC) == expected
+
+        # Only the request that was rendering fails, and the pool is replaced
+        broken = service.executor
+        with pytest.raises(BrokenProcessPool):
+            service.render({"crash": True})
+        assert service.executor is not broken
+        assert service.render(SPEC) == expected
+
+        # A pool broken outside of render is replaced on the next request
+        with pytest.raises(BrokenProcessPool):
+            service.executor.submit(os._exit, 1).result()
+        assert service.render(SPEC) == expected
+        assert service.counters["errors_total"] == 1
+        assert service.counters["renders_total"] == 3
+    finally:
+        service.close()
@@ -0,0 +1,173 @@
+import asyncio
+import json
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from svgsimplegraph.spec import graph_from_spec
+from svgsimplegraph.bubble_and_arrow import BubbleAndArrowGraph
+from svgsimplegraph.categorical import CategoricalGraph
+from svgsimplegraph.layout import ForceDirectedLayout
+from svgsimplegraph.layout import PackLayout
+from svgsimplegraph.layout import RingLayout
+from svgsimplegraph.ribbon import RibbonGraph
+from svgsimplegraph.series import SparseSeries
+from svgsimplegraph.toggle import ToggleGraph
+
+
+class LayoutWithoutSpec:
+    # A custom layout that can't be described in a spec
+    def place(self, radii, edges, width, height, center):
+        return RingLayout().place(radii, edges, width, height, center)
+
+
+CATEGORICAL_SPEC = {
+    "type": "CategoricalGraph",
+    "options": {"width": 400, "height": 300, "title": "Spec Graph"},
+    "x_labels": ["A", "B", "C"],
+    "series": [
+        {"series": [1, 2, 3], "legend_label": "Bars"},
+        {"series": [3, 1, 2], "legend_label": "Line", "series_type": "line"},
+    ],
+    "horizontal_lines": [{"y": 2, "label": "Target"}],
+}
+
+
+def test_graph_from_spec():
+    graph = graph_from_spec(CATEGORICAL_SPEC)
+
+    expected = CategoricalGraph(width=400, height=300, title="Spec Graph")
+    expected.x_labels = ["A", "B", "C"]
+    expected.add_series([1, 2, 3], legend_label="Bars")
+    expected.add_series([3, 1, 2], legend_label="Line", series_type="line")
+    expected.add_horizontal_line(y=2, label="Target")
+    assert graph.render() == expected.render()
+
+    bubbles = graph_from_spec(
+        {
+            "type": "BubbleAndArrowGraph",
+            "options": {"layout": {"type": "PackLayout", "spacing": 0.2}},
+            "bubbles": [{"size": 10, "label": "a"}, {"size": 20, "label": "b"}],
+            "arrows": [{"origin": "a", "destination": "b", "size": 1}],
+        }
+    )
+    assert isinstance(bubbles.layout, PackLayout)
+    assert bubbles.layout.spacing == 0.2
+    print(f'<img src="{bubbles.to_base64_src()}" />')
+
+    toggle = graph_from_spec(
+        {
+            "type": "ToggleGraph",
+            "graphs": [
+                {"label": "One", "graph": CATEGORICAL_SPEC},
+                {"label": "Two", "graph": CATEGORICAL_SPEC, "is_default": True},
+            ],
+        }
+    )
+    assert isinstance(toggle, ToggleGraph)
+    assert toggle.default == 1
+
+    with pytest.raises(ValueError):
+        graph_from_spec({"type": "PieGraph"})
+    with pytest.raises(ValueError):
+        graph_from_spec([CATEGORICAL_SPEC])
+    with pytest.raises(ValueError):
+        graph_from_spec(
+            {"type": "BubbleAndArrowGraph", "options": {"layout": {"type": "Grid"}}}
+        )
+    with pytest.raises(ValueError):
+        graph_from_spec({"type": "RibbonGraph", "bubbles": [{"size": 1}]})
+
+
+def test_spec_round_trip():
+    categorical = CategoricalGraph(
+        width=500, title="Round Trip", stacked=True, legend_position="bottom"
+    )
+    categorical.x_labels = ["A", "B", "C", "D"]
+    categorical.add_series([1, None, 3.5, float("nan")], "Bars", print_values=True)
+    categorical.add_series([2, 2, 1, 4], "More Bars")
+    categorical.add_series([5, 3, 4, 1], "Line", series_type="line", secondary=True)
+    categorical.add_vertical_line(1, label="Event", rotate_label=True)
+    categorical.add_horizontal_line(2, label="Target")
+
+    ribbon = RibbonGraph(width=500, title="Round Trip", color_buckets=4)
+    ribbon.x_labels = ["A", "B", "C"]
+    ribbon.add_series([10, 20, 30], "First", True)
+    ribbon.add_series([30.5, 10, 20], "Second")
+    ribbon.add_series([-1, 0, 1], "Colors")
+
+    bubbles = BubbleAndArrowGraph(
+        width=400,
+        height=400,
+        dark_mode=True,
+        layout=ForceDirectedLayout(iterations=20),
+        min_arrow_width=1,
+    )
+    for i in range(8):
+        bubbles.add_bubble(10 * (i + 1), 3 * i if i % 2 else None, f"Bubble {i}")
+    bubbles.add_bubble(5, label="other")
+    for i in range(20):
+        bubbles.add_arrow(i % 8, (i * 3 + 1) % 9, i % 5 + 0.5)
+
+    for graph in [categorical, ribbon, bubbles]:
+        spec = graph.to_spec()
+        # Specs survive JSON and describe an equal graph
+        copy = graph_from_spec(json.loads(json.dumps(spec)))
+        assert copy.to_spec() == spec
+        assert type(graph).from_spec(spec).render() == graph.render()
+
+    assert "colors" not in categorical.to_spec()["options"]
+    # Options resolved by the constructor are only included when they differ
+    assert CategoricalGraph().to_spec()["options"] == {}
+    assert BubbleAndArrowGraph().to_spec()["options"] == {}
+    padded = CategoricalGraph(padding=30, y_top_padding=50)
+    assert padded.to_spec()["options"] == {
+        "y_top_padding": 50,
+        "y_bottom_padding": 30,
+        "x_left_padding": 30,
+        "x_right_padding": 30,
+    }
+    # Integers too big for a packed array are kept as a list
+    huge = CategoricalGraph()
+    huge.add_series([1, 2**70])
+    assert huge.to_spec()["series"][0]["series"] == [1, 2**70]
+    assert CategoricalGraph.from_spec(huge.to_spec()).to_spec() == huge.to_spec()
+    assert categorical.to_spec()["series"][0]["series"]["typecode"] == "d"
+    assert categorical.to_spec()["series"][1]["series"]["typecode"] == "q"
+
+    # Sparse series are sent as their present values only
+    sparse = CategoricalGraph(width=400)
+    sparse.add_series(SparseSeries([5, 70_000, 9_999_000], [1, -2, 3], 10_000_000))
+    spec = sparse.to_spec()
+    assert len(json.dumps(spec)) < 1000
+    copy = graph_from_spec(json.loads(json.dumps(spec)))
+    assert isinstance(copy.data[0], SparseSeries)
+    assert copy.to_spec() == spec
+
+    toggle = ToggleGraph(button_position="top")
+    toggle.add_graph(categorical, "One")
+    toggle.add_graph(categorical, "Two", is_default=True)
+    spec = toggle.to_spec()
+    assert ToggleGraph.from_spec(json.loads(json.dumps(spec))).to_spec() == spec
+
+    with pytest.raises(ValueError):
+        CategoricalGraph.from_spec(ribbon.to_spec())
+    with pytest.raises(ValueError):
+        CategoricalGraph.from_spec({"version": 99, "type": "CategoricalGraph"})
+
+
+def test_render_without_spec():
+    graph = BubbleAndArrowGraph(width=300, height=300, layout=LayoutWithoutSpec())
+    for i in range(5):
+        graph.add_bubble(i + 1, text=f"Bubble {i}")
+        graph.add_arrow(i, (i + 1) % 5, 1)
+
+    with pytest.raises(TypeError):
+        graph.to_spec()
+
+    async def render_in_process():
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            return await graph.render_async(executor=executor)
+
+    # The graph is pickled instead of sent as a spec
+    assert asyncio.run(render_in_process()) == graph.render()
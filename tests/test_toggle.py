@@ -1,3 +1,5 @@
+from concurrent.futures import ThreadPoolExecutor
+
 import pytest
 
 from svgsimplegraph.toggle import ToggleGraph
@@ -94,3 +96,19 @@ def test_toggle_graph():
     print(f"\n<object type='image/svg+xml' data='{svg_base64}' />")
 
     print(toggle2.render())
+
+
+def test_concurrent_render():
+    toggle = ToggleGraph()
+    for i in range(3):
+        graph = CategoricalGraph(width=400, height=300, title=f"Graph {i}")
+        graph.x_labels = ["A", "B", "C", "D"]
+        graph.add_series([i + 1, 2, 3, 4], "Series")
+        graph.add_series([4, 3, i, 1], "Line", series_type="line")
+        toggle.add_graph(graph, label=f"Graph {i}", is_default=i == 1)
+
+    expected = toggle.render()
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(lambda _: toggle.render(), range(100)))
+
+    assert all(result == expected for result in results)